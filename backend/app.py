@@ -1,14 +1,25 @@
 import eventlet
 eventlet.monkey_patch()
 
-from flask import Flask
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, request, send_from_directory
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
+from eventlet import tpool
 
 # Import utility functions and configurations
-from config import load_gopro_config, load_gopro_settings
-from gopro_utils import get_gopro_settings, get_gopro_status, set_gopro_settings, enable_usb, start_gopro_record, stop_gopro
-from audio_utils import get_audio_devices, start_audio_recording, stop_audio_recording
+from config import config_store, hls_dir
+from metrics import METRICS_LOG_FILE, instrument_socketio, registry
+from gopro_utils import arm_camera, fleet, set_discovered_ips, stop_camera, summarize_reconcile, TIMEOUT_STATUS
+from shards import CAMERA_SHARDS, ShardedFleet
+from camera_state import CameraStateCache
+from discovery import CameraDiscovery
+from preview import PreviewManager
+from stream_supervisor import StreamSupervisor
+from thumbnails import ThumbnailService
+from offload import MediaOffloader
+from session import SessionManager
+from telemetry import TelemetryRecorder, parse_query
+from audio_utils import get_audio_devices, MultiDeviceRecorder
 
 # Initialize the Flask application
 app = Flask(__name__)
@@ -19,15 +30,123 @@ CORS(app)
 # Initialize SocketIO with eventlet as the async_mode
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 
+# Time every event handler declared below and count running background tasks
+instrument_socketio(socketio)
+
 # Directory for storing audio recordings
 AUDIO_DIR = 'audio_recordings'
 
-# Load GoPro configuration and settings from configuration files
-gopro_ips = load_gopro_config()
-gopro_settings = load_gopro_settings()
+# Seconds between 'audio_stats' events while recording
+AUDIO_STATS_INTERVAL = 1
+
+# Seconds between 'audio_levels' events while recording
+AUDIO_LEVELS_INTERVAL = 0.1
+
+# Seconds between checks for finished FLAC encodes after recording stops
+AUDIO_ENCODE_POLL_INTERVAL = 0.2
+
+# Seconds between 'stream_stats' events while any ffmpeg stream is supervised
+STREAM_STATS_INTERVAL = 2
+
+# Seconds between checks for new thumbnails to push to viewers
+THUMBNAIL_POLL_INTERVAL = 0.1
+
+# Seconds between 'offload_progress' events while media is being offloaded
+OFFLOAD_PROGRESS_INTERVAL = 0.5
+
+# Seconds allowed for every camera to enable USB control and apply its settings
+ARM_TIMEOUT = 10
+
+# With CAMERA_SHARDS set, camera requests run in that many worker processes, each owning a share of the cameras
+if CAMERA_SHARDS:
+    fleet = ShardedFleet(fleet, CAMERA_SHARDS)
+
+# Status and settings are served from a cache kept fresh by a single background poller
+camera_cache = CameraStateCache(fleet)
+
+# Socket.IO room receiving status deltas pushed by the poller
+MONITOR_ROOM = 'gopro_monitor'
+
+# Battery, temperature and storage history, sampled from the camera states the poller fetches
+telemetry_recorder = TelemetryRecorder()
+camera_cache.state_listeners.append(telemetry_recorder.record_state)
+
+audio_recorder = MultiDeviceRecorder()
+
+# Camera and audio recordings started together share one session manifest
+session_manager = SessionManager()
+
+# Long-running ffmpeg processes are owned by the supervisor, off the eventlet hub
+stream_supervisor = StreamSupervisor()
+
+# Live HLS previews of the camera webcam streams
+preview_manager = PreviewManager(fleet, hls_dir, stream_supervisor)
+
+# Downscaled JPEGs of the newest preview frame, decoded only for watched cameras
+thumbnail_service = ThumbnailService(preview_manager)
+
+# Downloads recorded clips from the cameras' SD cards
+media_offloader = MediaOffloader(fleet)
+
+# Finds USB-attached GoPros that aren't listed in the config file
+camera_discovery = CameraDiscovery()
+
+# HTTP routes
+
+@app.route('/hls/<path:filename>')
+def serve_hls(filename):
+    """
+    Serve HLS playlists and segments written by the preview remuxers.
+
+    Args:
+        filename (str): Path of the file relative to the HLS directory.
+    """
+    response = send_from_directory(hls_dir, filename)
+    if filename.endswith('.m3u8'):
+        # Playlists change every segment, so they must never be cached
+        response.headers['Cache-Control'] = 'no-cache, no-store'
+    return response
+
+@app.route('/metrics')
+def serve_metrics():
+    """
+    Serve camera request latencies, handler durations and audio counters in the Prometheus text format.
+    """
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 # SocketIO event handlers
 
+@socketio.on('connect')
+def connect(auth=None):
+    """
+    Start the camera status poller and broadcaster when the first client connects.
+    """
+    if not camera_cache.running:
+        camera_cache.running = True
+        socketio.start_background_task(camera_cache.run)
+    if not config_store.running:
+        config_store.running = True
+        socketio.start_background_task(config_store.watch)
+    if not thumbnail_service.running:
+        thumbnail_service.running = True
+        socketio.start_background_task(emit_thumbnails)
+    if not camera_discovery.running:
+        camera_discovery.running = True
+        socketio.start_background_task(camera_discovery.run)
+    if telemetry_recorder.db and not telemetry_recorder.running:
+        telemetry_recorder.running = True
+        socketio.start_background_task(telemetry_recorder.run)
+
+@socketio.on('disconnect')
+def disconnect(reason=None):
+    """
+    Stop producing thumbnails for a client that went away.
+
+    Args:
+        reason (str): Why the client disconnected, as passed by python-socketio 5.
+    """
+    thumbnail_service.unwatch(request.sid)
+
 @socketio.on('update_all_gopro_settings')
 def update_all_gopro_settings(selected_ips):
     """
@@ -36,120 +155,351 @@ def update_all_gopro_settings(selected_ips):
     Args:
         selected_ips (list): List of IPs for which the settings should be updated.
     """
-    global gopro_settings
-    # Reload GoPro settings
-    gopro_settings = load_gopro_settings()
-    
-    # Iterate through selected IPs and update settings
-    for ip in selected_ips:
-        for setting in gopro_settings:
-            set_gopro_settings(ip, setting)
+    # Pick up an edit made since the watcher last looked; a no-op if the file is unchanged
+    config_store.reload()
+
+    # Push only the settings each camera doesn't already have
+    results = fleet.reconcile_settings(config_store.snapshot.gopro_settings, selected_ips)
+    summary = summarize_reconcile(results.values())
+    print(f"Settings reconciled: {summary['written']} written, {summary['skipped']} skipped, "
+          f"~{summary['saved_ms']:.0f} ms saved", flush=True)
+    emit('gopro_settings_updated', {
+        'results': [{'ip': ip, 'ok': bool(result and result['ok'])} for ip, result in results.items()],
+        **summary,
+    })
 
 @socketio.on('get_gopro_status')
 def refresh_gopro_status():
     """
     Emit the status of all GoPros.
     """
-    # Emit the status of all GoPros
-    emit('gopro_status', get_gopro_status())
+    # Emit the cached status of all GoPros
+    emit('gopro_status', camera_cache.get_status())
     
-    # Emit current settings for each GoPro
-    for ip in gopro_ips:
-        curr_settings = get_gopro_settings(ip)
+    # Emit cached settings for the same cameras, configured or discovered
+    for ip in fleet.ips:
+        curr_settings = camera_cache.get_settings(ip)
         if curr_settings:
-            settings = [
-                {'display_name': setting['display_name'], 
-                 'setting': setting['setting'], 
-                 'option': curr_settings.get(setting['setting'])} 
-                for setting in gopro_settings
-            ]
-            emit('gopro_settings', {'ip': ip, 'settings': settings})
+            emit('gopro_settings', {'ip': ip, 'settings': format_settings(curr_settings)})
+
+@socketio.on('get_camera_health')
+def get_camera_health():
+    """
+    Emit each GoPro's circuit breaker state, error rate and request latencies.
+    """
+    emit('camera_health', fleet.health())
+
+@socketio.on('get_telemetry')
+def get_telemetry(query=None):
+    """
+    Emit min/max/mean telemetry series downsampled over a time window.
+
+    Args:
+        query (dict): Optional 'ips', 'start' and 'end' in seconds since the epoch,
+            'buckets' for the number of points and 'fields' to include.
+    """
+    try:
+        arguments = parse_query({} if query is None else query)
+    except ValueError as e:
+        emit('telemetry_error', {'error': str(e)})
+        return
+    # A day of every camera takes a few hundred milliseconds; run it off the hub so sockets and the poller keep going
+    series = tpool.execute(telemetry_recorder.query, **arguments)
+    emit('telemetry', {'fields': telemetry_recorder.select_fields(arguments['fields']), 'series': series})
+
+@socketio.on('discover_gopros')
+def discover_gopros():
+    """
+    Sweep the wired GoPro address space now and emit what was found.
+    """
+    emit('gopros_discovered', camera_discovery.sweep())
+
+@socketio.on('subscribe_gopro_status')
+def subscribe_gopro_status():
+    """
+    Join the status monitor room and emit the current status as a baseline for later deltas.
+    """
+    join_room(MONITOR_ROOM)
+    refresh_gopro_status()
+
+@socketio.on('unsubscribe_gopro_status')
+def unsubscribe_gopro_status():
+    """
+    Leave the status monitor room.
+    """
+    leave_room(MONITOR_ROOM)
+
+def format_settings(curr_settings):
+    """
+    Pair a GoPro's current setting values with the configured settings.
+
+    Args:
+        curr_settings (dict): Settings reported by the GoPro, keyed by setting id.
+
+    Returns:
+        list: Display name, setting id and current option for each configured setting.
+    """
+    return [
+        {'display_name': setting['display_name'], 
+         'setting': setting['setting'], 
+         'option': curr_settings.get(str(setting['setting']))} 
+        for setting in config_store.snapshot.gopro_settings
+    ]
+
+def broadcast_camera_changes(changes):
+    """
+    Push camera status deltas from the poller to every subscribed client.
+
+    Args:
+        changes (list): Changed fields per camera, as produced by CameraStateCache.
+    """
+    deltas = []
+    for change in changes:
+        delta = dict(change)
+        if 'settings' in delta:
+            # Only report drift in the settings the interface manages
+            delta['settings'] = format_settings(delta['settings'])
+        deltas.append(delta)
+    socketio.emit('gopro_status_delta', deltas, to=MONITOR_ROOM)
+
+camera_cache.change_listeners.append(broadcast_camera_changes)
+
+def refresh_camera_list():
+    """
+    Drop cached state and previews of cameras no longer in the fleet and tell subscribed clients to refresh.
+    """
+    camera_cache.sync_cameras()
+    removed = [ip for ip in preview_manager.previewing() if ip not in fleet.ips]
+    if removed:
+        preview_manager.stop_all(removed)
+    # Clients re-request status, which is formatted against the new settings list
+    socketio.emit('config_updated', {'gopros': list(fleet.ips)}, to=MONITOR_ROOM)
+
+def apply_config(old, new):
+    """
+    Follow edits to the config file without a restart.
+
+    The fleet itself is updated by gopro_utils before this runs.
+
+    Args:
+        old (ConfigSnapshot): The previous config.
+        new (ConfigSnapshot): The config now in effect.
+    """
+    refresh_camera_list()
+
+config_store.subscribe(apply_config)
+
+def apply_discovery(ips):
+    """
+    Add newly discovered GoPros to the fleet and drop ones that stopped answering.
+
+    Args:
+        ips (list): IPs of every camera discovery currently knows about.
+    """
+    set_discovered_ips(ips)
+    refresh_camera_list()
+
+camera_discovery.change_listeners.append(apply_discovery)
 
 @socketio.on('start_gopros')
 def start_gopros(selected_ips):
     """
     Start recording on the selected GoPros.
 
+    Cameras are armed concurrently first, then all shutter requests are fired
+    together so the recordings start as close to each other as possible. A
+    'gopro_record_response' event is emitted for each camera as soon as its
+    result is known, followed by a final aggregate of every camera.
+
     Args:
         selected_ips (list): List of IPs for the GoPros to start recording.
     """
     responses = []
-    
-    # Start a background task for each selected GoPro
-    for ip in selected_ips:
-        socketio.start_background_task(start_gopro_thread, ip, responses)
-    
-    # Wait for a short period to allow all threads to complete
-    socketio.sleep(1)
-    
+    ready = []
+    reconciled = []
+
+    # Phase 1: enable USB control and apply settings on every camera at once
+    for ip, armed in fleet.iter_results(arm_camera, selected_ips, timeout=ARM_TIMEOUT, default=None):
+        reconciled.append(armed)
+        if armed and armed['ok']:
+            ready.append(ip)
+            continue
+        # None means the camera did not finish arming before the deadline
+        response = {'ip': ip, 'response': TIMEOUT_STATUS if armed is None else 404, 'sent': None, 'acked': None}
+        responses.append(response)
+        emit_record_response(response)
+
+    # Phase 2: release the shutter requests together
+    fired, skew = fleet.synchronized_start(ready, on_result=emit_record_response)
+    print(f"Shutter skew: send {skew['send_ms']:.1f} ms, ack {skew['ack_ms']:.1f} ms", flush=True)
+
+    # Only a take where some camera is recording gets a session
+    session = None
+    if any(response['response'] == 200 for response in fired):
+        session = session_manager.begin('cameras')
+
     # Emit the responses from all GoPros
-    emit('gopro_record_response', responses)
+    emit('gopro_record_response', {
+        'responses': responses + fired,
+        'skew': skew,
+        'settings': summarize_reconcile(reconciled),
+        'session_id': session.id if session else None,
+        'final': True,
+    })
+    if session:
+        for response in responses + fired:
+            session.record('shutter_start', **response)
 
-def start_gopro_thread(ip, responses):
+def emit_record_response(response):
     """
-    Thread function to start GoPro recording with settings.
+    Emit the recording result of a single GoPro.
 
     Args:
-        ip (str): The IP address of the GoPro.
-        responses (list): List to store responses from GoPro.
+        response (dict): The GoPro's result, including its IP.
     """
-    # Enable USB control for the GoPro
-    enable_usb(ip)
-    
-    # Set each configuration setting for the GoPro
-    for setting in gopro_settings:
-        set_gopro_settings(ip, setting)
-    
-    # Retrieve current settings and verify
-    curr_settings = get_gopro_settings(ip)
-    verify_settings = all(
-        curr_settings.get(setting['setting']) == int(setting['option']) 
-        for setting in gopro_settings
-    )
-    
-    if not verify_settings:
-        response = 404
-        print("Settings do not match", flush=True)
-    else:
-        # Start recording on the GoPro
-        response = start_gopro_record(ip)
-    
-    # Append the response to the list
-    responses.append({'ip': ip, 'response': response})
+    emit('gopro_record_response', {'responses': [response], 'final': False})
 
 @socketio.on('stop_gopros')
 def stop_gopros(selected_ips):
     """
     Stop recording on the selected GoPros.
 
+    Each camera's result is emitted as soon as it answers, followed by a final
+    aggregate once every camera has answered or missed the deadline.
+
     Args:
         selected_ips (list): List of IPs for the GoPros to stop recording.
     """
     responses = []
-    
-    # Start a background task for each selected GoPro
-    for ip in selected_ips:
-        socketio.start_background_task(stop_gopro_thread, ip, responses)
-    
-    # Wait for a short period to allow all threads to complete
-    socketio.sleep(1)
-    
+
+    # Stop every selected GoPro at once and report each one as it finishes
+    for ip, result in fleet.iter_results(stop_camera, selected_ips, default=None):
+        if result is None:
+            result = {'response': TIMEOUT_STATUS, 'sent': None, 'acked': None}
+        responses.append({'ip': ip, **result})
+        emit_record_response(responses[-1])
+
     # Emit the responses from all GoPros
-    emit('gopro_record_response', responses)
+    emit('gopro_record_response', {'responses': responses, 'final': True})
 
-def stop_gopro_thread(ip, responses):
+    session = session_manager.current
+    if session:
+        for response in responses:
+            session.record('shutter_stop', **response)
+    session_manager.end('cameras')
+
+@socketio.on('offload_media')
+def offload_media(selected_ips):
     """
-    Thread function to stop GoPro recording.
+    Download new media from the selected GoPros in the background.
 
     Args:
-        ip (str): The IP address of the GoPro.
-        responses (list): List to store responses from GoPro.
+        selected_ips (list): List of IPs for the GoPros to offload.
     """
-    # Stop recording on the GoPro
-    response = stop_gopro(ip)
-    
-    # Append the response to the list
-    responses.append({'ip': ip, 'response': response})
+    if media_offloader.running:
+        emit('offload_error', {'error': 'An offload is already running'})
+        return
+    # Set here so the progress task doesn't exit before the offload task starts
+    media_offloader.running = True
+    socketio.start_background_task(run_offload, selected_ips)
+    socketio.start_background_task(emit_offload_progress)
+
+def run_offload(selected_ips):
+    """
+    Offload the selected GoPros, emitting 'offload_file' per file and 'offload_complete' at the end.
+
+    Args:
+        selected_ips (list): List of IPs for the GoPros to offload.
+    """
+    try:
+        summary = media_offloader.offload(selected_ips, on_file=lambda result: socketio.emit('offload_file', result))
+    except Exception as e:
+        print(f"Error offloading media: {e}", flush=True)
+        socketio.emit('offload_error', {'error': str(e)})
+        return
+    socketio.emit('offload_complete', {'cameras': summary})
+
+def emit_offload_progress():
+    """
+    Periodically emit each camera's files and bytes transferred while an offload runs.
+    """
+    while media_offloader.running:
+        socketio.emit('offload_progress', {'cameras': media_offloader.snapshot()})
+        socketio.sleep(OFFLOAD_PROGRESS_INTERVAL)
+
+@socketio.on('start_preview')
+def start_preview(selected_ips):
+    """
+    Start the live HLS preview for the selected GoPros.
+
+    Args:
+        selected_ips (list): List of IPs for the GoPros to preview.
+    """
+    supervising = bool(stream_supervisor.workers)
+    emit('preview_started', preview_manager.start_all(selected_ips))
+    if not supervising and stream_supervisor.workers:
+        socketio.start_background_task(emit_stream_stats)
+
+@socketio.on('stop_preview')
+def stop_preview(selected_ips=None):
+    """
+    Stop the live HLS preview for the selected GoPros, or all of them.
+
+    Args:
+        selected_ips (list): List of IPs for the GoPros to stop previewing.
+    """
+    preview_manager.stop_all(selected_ips)
+    emit('preview_stopped', preview_manager.active())
+
+def thumbnail_room(ip):
+    return f'thumbnails:{ip}'
+
+@socketio.on('subscribe_thumbnails')
+def subscribe_thumbnails(selected_ips):
+    """
+    Start receiving 'thumbnail' events for the selected GoPros, beginning with the cached ones.
+
+    Args:
+        selected_ips (list): List of IPs for the GoPros to watch.
+    """
+    for ip in selected_ips:
+        join_room(thumbnail_room(ip))
+    thumbnail_service.watch(request.sid, selected_ips)
+    for ip in selected_ips:
+        thumbnail = thumbnail_service.get(ip)
+        if thumbnail:
+            emit('thumbnail', {'ip': ip, 'jpeg': thumbnail['jpeg'], 'captured_at': thumbnail['captured_at']})
+
+@socketio.on('unsubscribe_thumbnails')
+def unsubscribe_thumbnails(selected_ips=None):
+    """
+    Stop receiving 'thumbnail' events for the selected GoPros, or all of them.
+
+    Args:
+        selected_ips (list): List of IPs for the GoPros to stop watching.
+    """
+    for ip in selected_ips or thumbnail_service.watched():
+        leave_room(thumbnail_room(ip))
+    thumbnail_service.unwatch(request.sid, selected_ips)
+
+def emit_thumbnails():
+    """
+    Schedule thumbnail decodes and push each new thumbnail to the camera's viewers.
+    """
+    while thumbnail_service.running:
+        thumbnail_service.schedule()
+        for thumbnail in thumbnail_service.take_fresh():
+            socketio.emit('thumbnail', thumbnail, to=thumbnail_room(thumbnail['ip']))
+        socketio.sleep(THUMBNAIL_POLL_INTERVAL)
+
+def emit_stream_stats():
+    """
+    Periodically emit each ffmpeg stream's state, restarts, CPU and RSS while any is supervised.
+    """
+    while stream_supervisor.workers:
+        socketio.emit('stream_stats', {'streams': stream_supervisor.stats()})
+        socketio.sleep(STREAM_STATS_INTERVAL)
+    socketio.emit('stream_stats', {'streams': []})
 
 @socketio.on('get_audio_devices')
 def get_audio_devices_event():
@@ -165,25 +515,91 @@ def get_audio_devices_event():
 @socketio.on('start_audio')
 def start_audio(device_index):
     """
-    Start audio recording on the selected device.
+    Start audio recording on the selected device or devices.
 
     Args:
-        device_index (int): The index of the audio device to start recording from.
+        device_index (int or list): The index of the audio device to start
+            recording from, or a list of indexes to record simultaneously.
     """
-    # Start audio recording in a background task
-    socketio.start_background_task(start_audio_recording, device_index, socketio)
+    device_indexes = device_index if isinstance(device_index, list) else [device_index]
+    
+    # Capture runs on PyAudio's callback threads, so this returns immediately
+    if audio_recorder.start(device_indexes):
+        session_manager.begin('audio').record(
+            'audio_start', device_indexes=list(audio_recorder.recorders), requested=audio_recorder.start_time)
+        socketio.start_background_task(emit_audio_stats)
+        socketio.start_background_task(emit_audio_levels)
+
+def emit_audio_stats():
+    """
+    Periodically emit each device's overrun and dropped frame counters while recording.
+    """
+    while audio_recorder.recording:
+        socketio.emit('audio_stats', {'devices': audio_recorder.stats()})
+        socketio.sleep(AUDIO_STATS_INTERVAL)
+
+def emit_audio_levels():
+    """
+    Emit each device's RMS, peak, clipping and waveform preview while recording.
+    """
+    while audio_recorder.recording:
+        socketio.emit('audio_levels', {'devices': audio_recorder.levels()})
+        socketio.sleep(AUDIO_LEVELS_INTERVAL)
 
 @socketio.on('stop_audio')
 def stop_audio():
     """
-    Stop audio recording and emit the file path.
+    Stop audio recording and emit the file paths.
     """
-    # Stop audio recording and get the file path
-    filepath = stop_audio_recording()
+    # Stop audio recording on every device and get the saved files
+    files = audio_recorder.stop()
     
-    # Emit the path of the saved audio file
-    emit('audio_saved', {'filepath': filepath})
+    # Emit the saved files with their offsets from the shared start time
+    emit('audio_saved', {
+        'filepath': files[0]['filepath'] if files else None,
+        'files': files,
+        'start_time': audio_recorder.start_time,
+    })
+    emit('audio_stats', {'devices': audio_recorder.stats()})
+
+    session = session_manager.current
+    if session:
+        for result in files:
+            session.record('audio_stop', device_index=result['device_index'], filepath=result['filepath'],
+                           first_sample=result['first_sample_time'], last_sample=result['last_sample_time'],
+                           frames=result['frames'], sample_rate=result['sample_rate'])
+    session_manager.end('audio')
+
+    # FLAC files finish encoding in the background and are reported separately
+    encode_jobs = audio_recorder.encode_jobs()
+    if encode_jobs:
+        socketio.start_background_task(emit_audio_encoded, encode_jobs, session)
+
+def emit_audio_encoded(encode_jobs, session=None):
+    """
+    Emit 'audio_encoded' for each device as its FLAC file finishes encoding.
+
+    Args:
+        encode_jobs (list): (device_index, EncodeJob) pairs from the recorder.
+        session (RecordingSession): Session the recording belongs to, which
+            is told the final file paths.
+    """
+    pending = list(encode_jobs)
+    while pending:
+        for device_index, job in list(pending):
+            if job.done.is_set():
+                pending.remove((device_index, job))
+                socketio.emit('audio_encoded', {'device_index': device_index, 'error': job.error, **(job.result or {})})
+                if session and job.result:
+                    session.record('audio_encoded', device_index=device_index, filepath=job.result.get('filepath'))
+        socketio.sleep(AUDIO_ENCODE_POLL_INTERVAL)
 
 if __name__ == '__main__':
-    # Run the Flask application with SocketIO on host 0.0.0.0 and port 5000
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    if METRICS_LOG_FILE:
+        socketio.start_background_task(registry.log_loop)
+    try:
+        # Run the Flask application with SocketIO on host 0.0.0.0 and port 5000
+        socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    finally:
+        # Write the samples recorded since the last flush
+        telemetry_recorder.stop()
@@ -1,12 +1,29 @@
 import pyaudio
 import wave
 import datetime
+import json
 import os
+import ffmpeg
+import numpy as np
+from config import load_audio_config
+from metrics import AUDIO_DROPPED_FRAMES, AUDIO_OVERRUNS
+from os_threads import os_queue, os_subprocess, os_threading, os_time
 
 pyAud = pyaudio.PyAudio()
 AUDIO_DIR = 'audio_recordings'
-audio_stream = None
-frames = []
+
+FORMAT = pyaudio.paInt24
+CHANNELS = 1
+RATE = 44100
+CHUNK = 1024
+# Seconds of audio the ring buffer holds before capture starts dropping frames
+BUFFER_SECONDS = 5
+# Seconds the writer sleeps when the ring buffer is empty
+WRITER_INTERVAL = 0.02
+# Number of min/max pairs in the waveform preview sent with each level update
+PREVIEW_POINTS = 50
+# Samples at or above this fraction of full scale count as clipped
+CLIP_LEVEL = 0.999
 
 def get_audio_devices():
     device_count = pyAud.get_device_count()
@@ -14,45 +31,653 @@ def get_audio_devices():
     audio_devices = [{'name': device['name'], 'index': device['index']} for device in devices if device['maxInputChannels'] > 0]
     return audio_devices
 
-def start_audio_recording(device_index, socketio):
-    global audio_stream, frames
-    frames = []
-    
-    format = pyaudio.paInt24
-    channels = 1
-    rate = 44100
-    chunk = 1024
-
-    audio_stream = pyAud.open(format=format, channels=channels,
-                              rate=rate, input=True, input_device_index=device_index,
-                              frames_per_buffer=chunk)
-    
-    print(f'Audio recording started on device {device_index}')
-
-    while audio_stream:
-        data = audio_stream.read(chunk)
-        frames.append(data)
-        socketio.sleep(0.01)
-    print('Audio recording stopped')
-
-def stop_audio_recording():
-    try:
-        global audio_stream, frames
-        if audio_stream is not None:
-            audio_stream.close()
-            audio_stream = None
-            
-            filename = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + '.wav'
-            filepath = os.path.join(AUDIO_DIR, filename)
-            
-            with wave.open(filepath, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(pyAud.get_sample_size(pyaudio.paInt24))
-                wf.setframerate(44100)
-                wf.writeframes(b''.join(frames))
-            
-            print(f'Audio file saved: {filepath}')
+class RingBuffer:
+    """
+    Fixed-size byte ring buffer for one producer and one consumer.
+
+    The producer only advances 'written' and the consumer only advances 'read',
+    so neither side needs a lock.
+
+    Args:
+        capacity (int): Size of the buffer in bytes.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.written = 0
+        self.read = 0
+
+    def free(self):
+        return self.capacity - (self.written - self.read)
+
+    def write(self, data):
+        """
+        Copy data into the buffer.
+
+        Returns:
+            bool: False if there was not enough room and the data was dropped.
+        """
+        data = memoryview(data)
+        size = len(data)
+        if size > self.free():
+            return False
+        start = self.written % self.capacity
+        first = min(size, self.capacity - start)
+        self.view[start:start + first] = data[:first]
+        self.view[:size - first] = data[first:]
+        self.written += size
+        return True
+
+    def read_available(self):
+        """
+        Return and consume everything written since the last read.
+        """
+        size = self.written - self.read
+        start = self.read % self.capacity
+        first = min(size, self.capacity - start)
+        data = bytes(self.view[start:start + first]) + bytes(self.view[:size - first])
+        self.read += size
+        return data
+
+def decode_int24(data):
+    """
+    Convert packed little-endian 24-bit samples to floats in [-1, 1).
+    """
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+    # Sign-extend from 24 to 32 bits
+    samples = (samples << 8) >> 8
+    return samples.astype(np.float32) / (1 << 23)
+
+def to_db(value):
+    return round(20 * np.log10(value), 1) if value > 0 else None
+
+class LevelMeter:
+    """
+    Accumulates RMS, peak and clipping statistics between snapshots.
+
+    update() runs on the writer thread with each drained block; snapshot() is
+    called at the emit rate and resets the accumulators.
+    """
+
+    def __init__(self):
+        self.lock = os_threading.Lock()
+        self.reset()
+        self.latest = np.zeros(0, dtype=np.float32)
+
+    def reset(self):
+        self.sum_squares = 0.0
+        self.count = 0
+        self.peak = 0.0
+        self.clipped = 0
+
+    def update(self, data):
+        samples = decode_int24(data)
+        if not samples.size:
+            return
+        magnitude = np.abs(samples)
+        sum_squares = float(np.dot(samples, samples))
+        peak = float(magnitude.max())
+        clipped = int(np.count_nonzero(magnitude >= CLIP_LEVEL))
+        with self.lock:
+            self.sum_squares += sum_squares
+            self.count += samples.size
+            self.peak = max(self.peak, peak)
+            self.clipped += clipped
+            self.latest = samples
+
+    def snapshot(self):
+        """
+        Return levels since the last snapshot and a decimated preview of the latest block.
+
+        Returns:
+            dict: RMS and peak in dBFS (None for silence), clipped sample count,
+            and a list of [min, max] pairs.
+        """
+        with self.lock:
+            rms = (self.sum_squares / self.count) ** 0.5 if self.count else 0.0
+            peak, clipped, latest = self.peak, self.clipped, self.latest
+            self.reset()
+
+        preview = []
+        if latest.size >= PREVIEW_POINTS:
+            bins = latest[:latest.size - latest.size % PREVIEW_POINTS].reshape(PREVIEW_POINTS, -1)
+            preview = np.round(np.stack([bins.min(axis=1), bins.max(axis=1)], axis=1), 3).tolist()
+        return {'rms_db': to_db(rms), 'peak_db': to_db(peak), 'clipped': clipped, 'preview': preview}
+
+class EncodeJob:
+    """
+    A unit of work for the encoder pool. 'done' is set once it has run.
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.done = os_threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error encoding audio: {e}")
+        finally:
+            self.done.set()
+
+class EncoderPool:
+    """
+    OS worker threads that run encode jobs in submission order.
+
+    Args:
+        workers (int): Number of jobs, and so ffmpeg processes, run at once.
+    """
+
+    def __init__(self, workers):
+        self.jobs = os_queue.Queue()
+        self.threads = [os_threading.Thread(target=self.work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def work(self):
+        while True:
+            self.jobs.get().run()
+
+    def submit(self, func, *args):
+        job = EncodeJob(func, *args)
+        self.jobs.put(job)
+        return job
+
+encoder_pool = None
+
+def get_encoder_pool(workers):
+    global encoder_pool
+    if encoder_pool is None:
+        encoder_pool = EncoderPool(workers)
+    return encoder_pool
+
+def run_ffmpeg(stream):
+    args = stream.overwrite_output().global_args('-loglevel', 'error').compile()
+    os_subprocess.run(args, check=True, capture_output=True)
+
+def encode_flac(wav_path):
+    """
+    Encode a WAV file to FLAC next to it and remove the WAV.
+
+    Returns:
+        tuple: The FLAC path and the size of the WAV it replaced, in bytes.
+    """
+    flac_path = os.path.splitext(wav_path)[0] + '.flac'
+    run_ffmpeg(ffmpeg.input(wav_path).output(flac_path, acodec='flac'))
+    wav_size = os.path.getsize(wav_path)
+    os.remove(wav_path)
+    return flac_path, wav_size
+
+class FlacRecording:
+    """
+    Encodes a recording's WAV segments to FLAC as each one is closed, then joins them.
+
+    Segments are encoded while recording continues, so at stop only the last
+    segment is still waiting to be encoded.
+
+    Args:
+        pool (EncoderPool): Pool that runs the encode jobs.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.segments = []
+
+    def add_segment(self, wav_path):
+        self.segments.append(self.pool.submit(encode_flac, wav_path))
+
+    def finish(self, filepath):
+        """
+        Queue joining the encoded segments into filepath.
+
+        Returns:
+            EncodeJob: Job whose result has the final path, size and compression ratio.
+        """
+        return self.pool.submit(self.join, filepath)
+
+    def join(self, filepath):
+        # Segment jobs were queued first, so they are running or done by now
+        for job in self.segments:
+            job.done.wait()
+        encoded = [job.result for job in self.segments if job.result]
+        if not encoded:
+            raise Exception(f"No segments were encoded for {filepath}")
+
+        if len(encoded) == 1:
+            os.replace(encoded[0][0], filepath)
+        else:
+            list_path = os.path.splitext(encoded[0][0])[0] + '.txt'
+            with open(list_path, 'w') as f:
+                f.writelines(f"file '{os.path.abspath(path)}'\n" for path, _ in encoded)
+            run_ffmpeg(ffmpeg.input(list_path, format='concat', safe=0).output(filepath, acodec='copy'))
+            for path, _ in encoded:
+                os.remove(path)
+            os.remove(list_path)
+
+        size = os.path.getsize(filepath)
+        wav_size = sum(wav_size for _, wav_size in encoded)
+        print(f'Audio encoded: {filepath} ({size} bytes, compression ratio {wav_size / size:.2f})')
+        return {'filepath': filepath, 'size': size, 'compression_ratio': wav_size / size}
+
+class SegmentManifest:
+    """
+    JSON manifest of a rotating recording's segments, rewritten atomically on every change.
+
+    Each segment lists its first frame's offset from the start of the recording,
+    so segments can be placed sample-accurately without reading them.
+
+    Args:
+        path (str): Path of the manifest file.
+        device_index (int): The index of the recorded audio device.
+    """
+
+    def __init__(self, path, device_index):
+        self.path = path
+        self.data = {
+            'device_index': device_index,
+            'started': datetime.datetime.now().isoformat(),
+            'first_sample_time': None,
+            'sample_rate': RATE,
+            'channels': CHANNELS,
+            'sample_width': pyAud.get_sample_size(FORMAT),
+            'complete': False,
+            'segments': [],
+        }
+
+    def save(self):
+        partial_path = self.path + '.tmp'
+        with open(partial_path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(partial_path, self.path)
+
+    def add_segment(self, path, start_frame):
+        self.data['segments'].append({
+            'path': os.path.basename(path),
+            'start_frame': start_frame,
+            'frames': 0,
+            'complete': False,
+        })
+        self.save()
+
+    def complete_segment(self, frames, first_sample_time):
+        self.data['segments'][-1].update(frames=frames, complete=True)
+        self.data['first_sample_time'] = first_sample_time
+        self.save()
+
+    def finish(self):
+        self.data['complete'] = True
+        self.save()
+
+class AudioRecorder:
+    """
+    Records one input device to a WAV or FLAC file.
+
+    PyAudio delivers audio through a callback on its own thread, which copies
+    it into a preallocated ring buffer; a writer OS thread drains the buffer to
+    disk. Neither side runs on the eventlet hub. In FLAC mode the writer closes
+    a WAV segment every segment_seconds and hands it to the encoder pool. In WAV
+    mode with rotation, segments are kept as separate files listed in a manifest.
+
+    Args:
+        output_format (str): 'wav' or 'flac'.
+        segment_seconds (float): Length of the segments encoded during recording in FLAC mode.
+        encoder_workers (int): Size of the encoder pool in FLAC mode.
+        rotate_seconds (float): Start a new WAV file after this many seconds.
+        rotate_megabytes (float): Start a new WAV file after this many megabytes of audio.
+    """
+
+    def __init__(self, output_format='wav', segment_seconds=60, encoder_workers=2,
+                 rotate_seconds=None, rotate_megabytes=None):
+        self.output_format = output_format
+        self.frame_bytes = pyAud.get_sample_size(FORMAT) * CHANNELS
+        self.rotating = output_format == 'wav' and bool(rotate_seconds or rotate_megabytes)
+        if output_format == 'flac':
+            self.segment_frames = int(segment_seconds * RATE)
+        elif self.rotating:
+            limits = []
+            if rotate_seconds:
+                limits.append(int(rotate_seconds * RATE))
+            if rotate_megabytes:
+                limits.append(int(rotate_megabytes * 1024 * 1024) // self.frame_bytes)
+            self.segment_frames = min(limits)
+        else:
+            self.segment_frames = None
+        self.encoder_workers = encoder_workers
+        self.segment_base = None
+        self.manifest = None
+        self.stream = None
+        self.ring = None
+        self.writer = None
+        self.running = False
+        self.partial_path = None
+        self.wf = None
+        self.segment_path = None
+        self.segment_count = 0
+        self.segment_frames_written = 0
+        self.flac = None
+        self.encode_job = None
+        self.device_index = None
+        self.overruns = 0
+        self.dropped_frames = 0
+        self.frames_written = 0
+        self.meter = LevelMeter()
+        # Monotonic time at which the first captured sample was recorded
+        self.first_sample_time = None
+
+    @property
+    def recording(self):
+        return self.stream is not None
+
+    def stats(self):
+        """
+        Return capture counters for the current or last recording.
+        """
+        return {
+            'recording': self.recording,
+            'device_index': self.device_index,
+            'overruns': self.overruns,
+            'dropped_frames': self.dropped_frames,
+            'frames_written': self.frames_written,
+            'first_sample_time': self.first_sample_time,
+            'buffered_frames': (self.ring.written - self.ring.read) // self.frame_bytes if self.ring else 0,
+        }
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if self.first_sample_time is None:
+            # The buffer was filled over the last frame_count samples
+            self.first_sample_time = os_time.monotonic() - frame_count / RATE
+        if status & pyaudio.paInputOverflow:
+            self.overruns += 1
+            AUDIO_OVERRUNS.inc(self.device_index)
+        if not self.ring.write(in_data):
+            self.dropped_frames += frame_count
+            AUDIO_DROPPED_FRAMES.inc(self.device_index, amount=frame_count)
+        return None, pyaudio.paContinue
+
+    def open_segment(self):
+        if self.segment_frames:
+            path = f'{self.segment_base}_{self.segment_count:04d}.wav'
+        else:
+            path = self.partial_path
+        self.wf = wave.open(path, 'wb')
+        self.wf.setnchannels(CHANNELS)
+        self.wf.setsampwidth(pyAud.get_sample_size(FORMAT))
+        self.wf.setframerate(RATE)
+        self.segment_path = path
+        self.segment_count += 1
+        self.segment_frames_written = 0
+        if self.manifest:
+            self.manifest.add_segment(path, self.frames_written)
+
+    def close_segment(self):
+        self.wf.close()
+        self.wf = None
+        if self.manifest:
+            self.manifest.complete_segment(self.segment_frames_written, self.first_sample_time)
+        if self.flac:
+            self.flac.add_segment(self.segment_path)
+
+    def write_block(self, data):
+        view = memoryview(data)
+        while view:
+            if self.wf is None:
+                self.open_segment()
+            if self.segment_frames:
+                # Split the block exactly at the segment boundary
+                room = (self.segment_frames - self.segment_frames_written) * self.frame_bytes
+                part, view = view[:room], view[room:]
+            else:
+                part, view = view, view[:0]
+            self.wf.writeframes(part)
+            frames = len(part) // self.frame_bytes
+            self.frames_written += frames
+            self.segment_frames_written += frames
+            if self.segment_frames and self.segment_frames_written >= self.segment_frames:
+                self.close_segment()
+        self.meter.update(data)
+
+    def write_loop(self):
+        # writeframes rewrites the header sizes on every call, so the file on disk
+        # stays playable up to the last chunk written even if the process dies
+        try:
+            while self.running:
+                data = self.ring.read_available()
+                if data:
+                    self.write_block(data)
+                else:
+                    os_time.sleep(WRITER_INTERVAL)
+            # Flush whatever arrived before the stream stopped
+            self.write_block(self.ring.read_available())
+        except Exception as e:
+            print(f"Error writing audio file: {e}")
+        finally:
+            if self.wf is not None:
+                self.close_segment()
+
+    def start(self, device_index):
+        """
+        Start recording from an input device.
+
+        Args:
+            device_index (int): The index of the audio device to record from.
+
+        Returns:
+            bool: False if a recording was already in progress.
+        """
+        if self.recording:
+            print('Audio recording already in progress')
+            return False
+
+        self.device_index = device_index
+        self.overruns = 0
+        self.dropped_frames = 0
+        self.frames_written = 0
+        self.first_sample_time = None
+        self.meter = LevelMeter()
+        self.ring = RingBuffer(BUFFER_SECONDS * RATE * self.frame_bytes)
+
+        # Open the device before creating any file, so a bad index or busy device leaves nothing
+        # behind; the ring buffer holds what it captures until the writer starts
+        self.stream = pyAud.open(format=FORMAT, channels=CHANNELS,
+                                 rate=RATE, input=True, input_device_index=device_index,
+                                 frames_per_buffer=CHUNK, stream_callback=self.callback)
+        try:
+            self.start_writer(device_index)
+        except Exception:
+            self.halt()
+            raise
+
+        print(f'Audio recording started on device {device_index}')
+        return True
+
+    def start_writer(self, device_index):
+        # Record into a hidden file and rename it to the stop time once finished
+        started = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.partial_path = os.path.join(AUDIO_DIR, f'.recording_{started}_{device_index}.wav')
+        self.segment_base = self.partial_path[:-4]
+        self.manifest = None
+        if self.rotating:
+            # Rotated segments are final as soon as they are closed, so they get visible names
+            self.segment_base = os.path.join(AUDIO_DIR, f'{started}_device{device_index}')
+            self.manifest = SegmentManifest(f'{self.segment_base}.json', device_index)
+        self.segment_count = 0
+        self.encode_job = None
+        self.flac = FlacRecording(get_encoder_pool(self.encoder_workers)) if self.output_format == 'flac' else None
+        self.open_segment()
+
+        self.running = True
+        self.writer = os_threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def halt(self):
+        """
+        Stop capturing without finalizing the file, so several devices can stop together.
+        """
+        if self.stream is not None:
+            stream, self.stream = self.stream, None
+            stream.stop_stream()
+            stream.close()
+
+    def finalize(self, filename=None):
+        """
+        Flush the buffered audio and move the file to its final name.
+
+        In FLAC mode this only queues the last segment and the join on the
+        encoder pool; encode_job reports the result once they finish.
+
+        Args:
+            filename (str): Name of the file in AUDIO_DIR without extension, defaults to the current time.
+
+        Returns:
+            str: Path of the saved (or, for FLAC, soon to be saved) file, or of the
+            segment manifest when rotating, or None if saving failed.
+        """
+        try:
+            self.running = False
+            self.writer.join()
+
+            filename = filename or datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            filepath = os.path.join(AUDIO_DIR, f'{filename}.{self.output_format}')
+            if self.flac:
+                self.encode_job = self.flac.finish(filepath)
+                print(f'Audio recording stopped, encoding to: {filepath}')
+            elif self.manifest:
+                # Segments already have their final names; the manifest is the recording
+                self.manifest.finish()
+                filepath = self.manifest.path
+                print(f'Audio recording stopped, {self.segment_count} segments listed in: {filepath}')
+            else:
+                os.replace(self.partial_path, filepath)
+                print(f'Audio recording stopped, file saved: {filepath}')
+
+            if self.overruns or self.dropped_frames:
+                print(f'Audio overruns: {self.overruns}, dropped frames: {self.dropped_frames}')
             return filepath
-    except Exception as e:
-        print(f"Error saving audio file: {e}")
-        return None
+        except Exception as e:
+            print(f"Error saving audio file: {e}")
+            return None
+
+    def stop(self):
+        """
+        Stop recording and finalize the file.
+
+        Returns:
+            str: Path of the saved file, or None if nothing was recording or saving failed.
+        """
+        if not self.recording:
+            return None
+        try:
+            self.halt()
+        except Exception as e:
+            print(f"Error stopping audio stream: {e}")
+        return self.finalize()
+
+class MultiDeviceRecorder:
+    """
+    Records several input devices at once, one AudioRecorder and file per device.
+
+    All devices share a monotonic start time, and each device's first sample is
+    reported relative to it so the tracks can be lined up with each other and
+    with camera shutter times, which use the same clock.
+    """
+
+    def __init__(self):
+        self.recorders = {}
+        self.start_time = None
+
+    @property
+    def recording(self):
+        return any(recorder.recording for recorder in self.recorders.values())
+
+    def stats(self):
+        return [recorder.stats() for recorder in self.recorders.values()]
+
+    def levels(self):
+        return [{'device_index': device_index, **recorder.meter.snapshot()}
+                for device_index, recorder in self.recorders.items()]
+
+    def start(self, device_indexes):
+        """
+        Start recording from every device.
+
+        Args:
+            device_indexes (list): Indexes of the audio devices to record from.
+
+        Returns:
+            bool: False if a recording was already in progress or no device started.
+        """
+        if self.recording:
+            print('Audio recording already in progress')
+            return False
+
+        audio_config = load_audio_config()
+        self.recorders = {}
+        self.start_time = os_time.monotonic()
+        for device_index in device_indexes:
+            recorder = AudioRecorder(audio_config['format'], audio_config['segment_seconds'],
+                                     audio_config['encoder_workers'], audio_config['rotate_seconds'],
+                                     audio_config['rotate_megabytes'])
+            try:
+                recorder.start(device_index)
+            except Exception as e:
+                print(f"Error starting audio device {device_index}: {e}")
+                continue
+            self.recorders[device_index] = recorder
+        return bool(self.recorders)
+
+    def stop(self):
+        """
+        Stop every device and finalize their files.
+
+        Returns:
+            list: Per device, the saved file path, the first sample's offset from
+            the shared start time in seconds, the monotonic times of the first
+            and last samples, the number of frames written, and whether the
+            file is still being encoded.
+        """
+        if not self.recording:
+            return []
+
+        # Stop all streams back to back before the slower file finalization
+        for recorder in self.recorders.values():
+            try:
+                recorder.halt()
+            except Exception as e:
+                print(f"Error stopping audio device {recorder.device_index}: {e}")
+
+        stopped = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        results = []
+        for device_index, recorder in self.recorders.items():
+            # Keep the single-device file name unchanged
+            suffix = f'_device{device_index}' if len(self.recorders) > 1 else ''
+            filepath = recorder.finalize(f'{stopped}{suffix}')
+            offset = last_sample_time = None
+            if recorder.first_sample_time is not None:
+                offset = recorder.first_sample_time - self.start_time
+                last_sample_time = recorder.first_sample_time + recorder.frames_written / RATE
+            results.append({
+                'device_index': device_index,
+                'filepath': filepath,
+                'start_offset': offset,
+                'first_sample_time': recorder.first_sample_time,
+                'last_sample_time': last_sample_time,
+                'frames': recorder.frames_written,
+                'sample_rate': RATE,
+                'encoding': recorder.encode_job is not None,
+            })
+        return results
+
+    def encode_jobs(self):
+        """
+        Return (device_index, EncodeJob) for every device whose file is still being encoded.
+        """
+        return [(device_index, recorder.encode_job) for device_index, recorder in self.recorders.items()
+                if recorder.encode_job is not None]
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import ffmpeg
+import numpy as np
+
+# Offline tool: finds where each camera clip starts relative to a reference
+# audio recording by cross-correlating their loudness envelopes.
+#
+#   python av_sync.py --session sessions/<id> clip1.MP4 clip2.MP4 ...
+#   python av_sync.py --reference audio_recordings/take.wav --output offsets.json clips...
+
+# Rate ffmpeg resamples audio to before the envelope is taken
+DECODE_RATE = 8000
+# Envelope samples per second; offsets are resolved to a fraction of 1 / ENVELOPE_RATE
+ENVELOPE_RATE = 200
+# Seconds of decoded audio processed at a time, bounding memory for long files
+CHUNK_SECONDS = 10
+# Seconds of the moving average removed from the envelope, so slow level changes don't dominate
+DETREND_SECONDS = 1
+# Shortest overlap, in seconds, a lag's correlation is averaged over; shorter
+# overlaps are too noisy to trust
+MIN_OVERLAP_SECONDS = 10
+# Lags within this many seconds of the best one are skipped when finding the runner-up peak
+PEAK_EXCLUSION_SECONDS = 1
+OFFSETS_FILE = 'sync_offsets.json'
+
+def recording_files(path):
+    """
+    Return the audio files making up a recording, in order.
+
+    A rotating recording is saved as a JSON manifest listing its WAV
+    segments, which sit next to it; any other path is a single file.
+    """
+    if not path.endswith('.json'):
+        return [path]
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    return [os.path.join(os.path.dirname(path), segment['path']) for segment in manifest['segments']]
+
+def audio_envelope(path):
+    """
+    Decode a file's audio with ffmpeg and return its loudness envelope.
+
+    The audio is streamed as mono DECODE_RATE samples and reduced to the mean
+    absolute level per 1 / ENVELOPE_RATE seconds, CHUNK_SECONDS at a time, so
+    memory use depends on the envelope length only. The segments of a
+    rotating recording's manifest are decoded back to back as one track.
+
+    Args:
+        path (str): Audio file, video file with an audio track, or segment manifest.
+
+    Returns:
+        numpy.ndarray: Detrended, unit-variance envelope at ENVELOPE_RATE.
+    """
+    hop = DECODE_RATE // ENVELOPE_RATE
+    blocks = []
+    leftover = np.empty(0, dtype=np.float32)
+    chunk_bytes = DECODE_RATE * CHUNK_SECONDS * 2
+    for file_path in recording_files(path):
+        args = ffmpeg.input(file_path).output('pipe:', vn=None, ac=1, ar=DECODE_RATE, format='s16le',
+                                              acodec='pcm_s16le') \
+            .global_args('-loglevel', 'error', '-nostdin').compile()
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            samples = np.concatenate([leftover, np.abs(np.frombuffer(data, dtype=np.int16).astype(np.float32))])
+            usable = len(samples) // hop * hop
+            blocks.append(samples[:usable].reshape(-1, hop).mean(axis=1))
+            leftover = samples[usable:]
+        error = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {file_path}: {error.decode(errors='replace').strip()}")
+    if not blocks:
+        raise ValueError(f"No audio in {path}")
+
+    envelope = np.log1p(np.concatenate(blocks)).astype(np.float64)
+    # Subtract a moving average computed with a cumulative sum
+    window = DETREND_SECONDS * ENVELOPE_RATE
+    padded = np.concatenate([[0.0], np.cumsum(np.pad(envelope, (window // 2, window - window // 2 - 1), mode='edge'))])
+    envelope -= (padded[window:] - padded[:-window]) / window
+    std = envelope.std()
+    return envelope / std if std > 0 else envelope
+
+def cross_correlate(reference, clip):
+    """
+    Cross-correlate two envelopes with real FFTs.
+
+    Returns:
+        tuple: (correlation, lags) where lags[i] is the number of envelope
+        samples the clip starts after the reference for correlation[i].
+    """
+    size = len(reference) + len(clip) - 1
+    fft_size = 1 << (size - 1).bit_length()
+    correlation = np.fft.irfft(np.fft.rfft(reference, fft_size) * np.conj(np.fft.rfft(clip, fft_size)), fft_size)
+    # Reorder the circular result: negative lags (clip starts before the reference), then the rest
+    correlation = np.concatenate([correlation[-(len(clip) - 1):], correlation[:len(reference)]]) if len(clip) > 1 \
+        else correlation[:len(reference)]
+    lags = np.arange(-(len(clip) - 1), len(reference))
+    return correlation, lags
+
+def find_offset(reference, clip):
+    """
+    Find where a clip's envelope best lines up with the reference envelope.
+
+    Returns:
+        dict: 'offset_seconds', the time in the reference at which the clip
+        starts (negative if it starts earlier), and 'confidence', the ratio of
+        the best correlation peak to the runner-up (None if there is none).
+    """
+    correlation, lags = cross_correlate(reference, clip)
+    # Normalize by the overlap so barely-overlapping lags aren't favoured or penalized
+    overlap = np.minimum(len(reference), lags + len(clip)) - np.maximum(0, lags)
+    correlation = correlation / np.maximum(overlap, min(MIN_OVERLAP_SECONDS * ENVELOPE_RATE, len(clip)))
+    best = int(np.argmax(correlation))
+
+    # Parabolic interpolation around the peak for a sub-sample offset
+    shift = 0.0
+    if 0 < best < len(correlation) - 1:
+        left, peak, right = correlation[best - 1:best + 2]
+        denominator = left - 2 * peak + right
+        if denominator:
+            shift = 0.5 * (left - right) / denominator
+
+    exclusion = PEAK_EXCLUSION_SECONDS * ENVELOPE_RATE
+    others = np.concatenate([correlation[:max(best - exclusion, 0)], correlation[best + exclusion + 1:]])
+    runner_up = others.max() if len(others) else 0.0
+    return {
+        'offset_seconds': (lags[best] + shift) / ENVELOPE_RATE,
+        'confidence': round(float(correlation[best] / runner_up), 2) if runner_up > 0 else None,
+    }
+
+def align_clip(reference, clip_path):
+    """
+    Compute one clip's offset to the reference envelope. Runs in a worker process.
+    """
+    try:
+        return {'clip': clip_path, **find_offset(reference, audio_envelope(clip_path))}
+    except Exception as e:
+        return {'clip': clip_path, 'error': str(e)}
+
+def align_clips(reference_path, clip_paths, workers=None):
+    """
+    Compute every clip's offset to the reference recording in parallel.
+
+    The reference envelope is computed once and shared with the worker
+    processes, which each decode and correlate one clip at a time.
+
+    Args:
+        reference_path (str): Reference audio file, e.g. a lavalier WAV.
+        clip_paths (list): Camera clips or other recordings to align.
+        workers (int): Number of worker processes, defaults to the number of cores.
+
+    Returns:
+        list: 'clip' plus 'offset_seconds' and 'confidence', or 'error', per clip.
+    """
+    reference = audio_envelope(reference_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(align_clip, [reference] * len(clip_paths), clip_paths))
+
+def session_reference(session_dir):
+    """
+    Return the audio file of the lowest-numbered device recorded in a session, or None.
+
+    For a rotating recording this is its segment manifest, which audio_envelope
+    decodes segment by segment.
+    """
+    # Imported here so the tool doesn't need eventlet unless a session is given
+    from session import MANIFEST_FILE, load_manifest
+    paths = {}
+    for event in load_manifest(os.path.join(session_dir, MANIFEST_FILE)):
+        # A finished FLAC encode replaces the WAV recorded at stop
+        if event['event'] in ('audio_stop', 'audio_encoded') and event.get('filepath'):
+            paths[event['device_index']] = event['filepath']
+    return paths[min(paths)] if paths else None
+
+def write_offsets(path, reference_path, results):
+    data = {
+        'reference': reference_path,
+        'envelope_rate': ENVELOPE_RATE,
+        'clips': {result.pop('clip'): result for result in results},
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute audio/video sync offsets by cross-correlation.")
+    parser.add_argument('clips', nargs='+', help="Camera clips or recordings to align")
+    parser.add_argument('--reference', help="Reference audio file; defaults to the session's audio")
+    parser.add_argument('--session', help="Session directory to read the reference from and write offsets to")
+    parser.add_argument('--output', help=f"Offsets file; defaults to <session>/{OFFSETS_FILE}")
+    parser.add_argument('--workers', type=int, help="Worker processes; defaults to the number of cores")
+    args = parser.parse_args()
+
+    reference_path = args.reference or (args.session and session_reference(args.session))
+    if not reference_path:
+        parser.error("No reference audio: pass --reference or a --session with recorded audio")
+    output = args.output or (args.session and os.path.join(args.session, OFFSETS_FILE))
+    if not output:
+        parser.error("Pass --output or --session")
+
+    data = write_offsets(output, reference_path, align_clips(reference_path, args.clips, args.workers))
+    for clip, result in data['clips'].items():
+        if 'error' in result:
+            print(f"{clip}: {result['error']}")
+        else:
+            print(f"{clip}: {result['offset_seconds']:+.3f}s (confidence {result['confidence']})")
+    print(f"Offsets written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import deque
+from gopro_utils import GoProClient, STATUS_TIMEOUT
+
+# Default seconds before a cached webcam status or camera state is refreshed
+STATUS_TTL = 5
+STATE_TTL = 10
+# Seconds between polls of a camera that is recording or flapping
+ACTIVE_TTL = 0.5
+# A camera whose status changed within this many seconds counts as flapping
+FLAP_WINDOW = 30
+
+# GoPro status id reporting whether the camera is encoding video
+ENCODING_STATUS = '10'
+
+class CameraEntry:
+    """
+    Cached status and state of a single GoPro.
+    """
+
+    def __init__(self):
+        self.status = None
+        self.state = None
+        self.status_expires = 0.0
+        self.state_expires = 0.0
+        # Bumped on every invalidation so a poll that raced a write doesn't mark stale data fresh
+        self.generation = 0
+        self.status_changes = deque(maxlen=8)
+        # Last values passed to change listeners
+        self.reported = {}
+
+    @property
+    def recording(self):
+        if not self.state:
+            return None
+        return self.state.get('status', {}).get(ENCODING_STATUS) == 1
+
+    @property
+    def settings(self):
+        return self.state.get('settings') if self.state else None
+
+    def is_active(self, now):
+        flapping = bool(self.status_changes) and now - self.status_changes[-1] < FLAP_WINDOW
+        return flapping or bool(self.recording)
+
+class CameraStateCache:
+    """
+    In-process cache of GoPro status and state, refreshed by a single poller.
+
+    Socket handlers read from the cache instead of calling the cameras, so
+    camera traffic depends only on the TTLs, not on how many clients ask.
+    Cameras that are recording or flapping are polled every ACTIVE_TTL seconds,
+    idle ones at the default TTLs. After each poll, change listeners receive
+    only the fields that changed.
+
+    Args:
+        fleet (GoProFleet): Fleet used to poll the cameras.
+        status_ttl (float): Default seconds a webcam status stays fresh.
+        state_ttl (float): Default seconds a camera state stays fresh.
+    """
+
+    def __init__(self, fleet, status_ttl=STATUS_TTL, state_ttl=STATE_TTL):
+        self.fleet = fleet
+        self.status_ttl = status_ttl
+        self.state_ttl = state_ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.ready = threading.Event()
+        self.running = False
+        # Called with a list of {'ip', <changed fields>} after each poll that changed something
+        self.change_listeners = []
+        # Called with (ip, state) for every camera state fetched, changed or not
+        self.state_listeners = []
+        fleet.write_listeners.append(self.invalidate)
+
+    def entry(self, ip):
+        with self.lock:
+            if ip not in self.entries:
+                self.entries[ip] = CameraEntry()
+            return self.entries[ip]
+
+    def ttl(self, ip, now):
+        """
+        Return the (status, state) TTLs for a camera given how active it is.
+        """
+        if self.entry(ip).is_active(now):
+            return ACTIVE_TTL, ACTIVE_TTL
+        return self.status_ttl, self.state_ttl
+
+    def invalidate(self, ip):
+        """
+        Mark a camera's cached data as stale and wake the poller to refresh it.
+
+        Args:
+            ip (str): The IP address of the GoPro.
+        """
+        entry = self.entry(ip)
+        entry.generation += 1
+        entry.status_expires = 0.0
+        entry.state_expires = 0.0
+        self.wakeup.set()
+
+    def sync_cameras(self):
+        """
+        Drop cached entries of cameras no longer in the fleet and poll new ones right away.
+        """
+        with self.lock:
+            for ip in set(self.entries) - set(self.fleet.ips):
+                del self.entries[ip]
+        self.wakeup.set()
+
+    def get_status(self):
+        """
+        Return the cached status of every GoPro in the fleet.
+
+        Returns:
+            list: {'ip', 'status'} per camera, 400 for cameras not yet polled.
+        """
+        self.ready.wait(timeout=STATUS_TIMEOUT)
+        return [{'ip': ip, 'status': self.entry(ip).status or 400} for ip in self.fleet.ips]
+
+    def get_settings(self, ip):
+        """
+        Return the cached settings of a GoPro, or False if it has no cached state or is offline.
+
+        Args:
+            ip (str): The IP address of the GoPro.
+        """
+        entry = self.entry(ip)
+        return entry.status == 200 and entry.settings or False
+
+    def refresh(self):
+        """
+        Poll every camera whose cached status or state has expired.
+
+        Returns:
+            float: Seconds until the next entry expires.
+        """
+        now = time.monotonic()
+        ips = list(self.fleet.ips)
+        generations = {ip: self.entry(ip).generation for ip in ips}
+
+        stale_status = [ip for ip in ips if self.entry(ip).status_expires <= now]
+        if stale_status:
+            for result in self.fleet.status(stale_status):
+                entry = self.entry(result['ip'])
+                if entry.status is not None and entry.status != result['status']:
+                    entry.status_changes.append(time.monotonic())
+                entry.status = result['status']
+                if entry.status != 200:
+                    # An unreachable camera's settings are unknown, not what they were when last seen
+                    entry.state = None
+                    entry.state_expires = 0.0
+
+        # Only fetch state from cameras that answered the status check
+        stale_state = [ip for ip in ips
+                       if self.entry(ip).state_expires <= now and self.entry(ip).status == 200]
+        if stale_state:
+            for ip, state in self.fleet.map(GoProClient.get_state, stale_state, default=False).items():
+                self.entry(ip).state = state or None
+                if state:
+                    for listener in self.state_listeners:
+                        listener(ip, state)
+
+        # Expiries are set once both fetches are in, so a camera that just started
+        # recording is immediately polled at the active rate
+        now = time.monotonic()
+        for ip in stale_status:
+            if self.entry(ip).generation == generations[ip]:
+                self.entry(ip).status_expires = now + self.ttl(ip, now)[0]
+        for ip in stale_state:
+            if self.entry(ip).generation == generations[ip]:
+                self.entry(ip).state_expires = now + self.ttl(ip, now)[1]
+
+        changes = [change for change in map(self.diff, set(stale_status) | set(stale_state)) if change]
+        if changes:
+            for listener in self.change_listeners:
+                listener(changes)
+
+        self.ready.set()
+        now = time.monotonic()
+        expiries = [self.entry(ip).status_expires for ip in ips]
+        expiries += [self.entry(ip).state_expires for ip in ips if self.entry(ip).status == 200]
+        return max(min(expiries, default=now + self.status_ttl) - now, 0.05)
+
+    def diff(self, ip):
+        """
+        Compare a camera's cached values against those last reported to listeners.
+
+        Args:
+            ip (str): The IP address of the GoPro.
+
+        Returns:
+            dict: 'ip' plus every field that changed, or None if nothing did.
+        """
+        entry = self.entry(ip)
+        current = {'status': entry.status, 'recording': entry.recording, 'settings': entry.settings}
+        changed = {key: value for key, value in current.items()
+                   if value is not None and entry.reported.get(key) != value}
+        if not changed:
+            return None
+        entry.reported.update(changed)
+        return {'ip': ip, **changed}
+
+    def run(self):
+        """
+        Poll the cameras until stop() is called. Meant to run as a background task.
+        """
+        self.running = True
+        while self.running:
+            self.wakeup.clear()
+            try:
+                delay = self.refresh()
+            except Exception as e:
+                print(f"Error refreshing camera state: {e}", flush=True)
+                delay = self.status_ttl
+            self.wakeup.wait(timeout=delay)
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
@@ -1,27 +1,175 @@
 import os
 import json
+import time
+from collections import namedtuple
+from types import MappingProxyType
 
 # Determine the path to the config file, defaulting to config/gopro_config.json
 config_file_path = os.getenv("GOPRO_CONFIG_FILE", "./config/gopro_config.json")
 
+# Seconds between checks of the config file for changes
+CONFIG_POLL_INTERVAL = 1
+
+AUDIO_DEFAULTS = {"format": "wav", "segment_seconds": 60, "encoder_workers": 2,
+                  "rotate_seconds": None, "rotate_megabytes": None}
+# File formats AudioRecorder can write
+AUDIO_FORMATS = ("wav", "flac")
+
+# An immutable, validated view of the config file. gopro_settings holds
+# read-only mappings with 'display_name', 'setting' and 'option'.
+ConfigSnapshot = namedtuple('ConfigSnapshot', ['gopros', 'gopro_settings', 'audio'])
+
+def parse_config(config):
+    """
+    Validate a parsed config file and freeze it into a ConfigSnapshot.
+
+    Args:
+        config (dict): Contents of the config file.
+
+    Returns:
+        ConfigSnapshot: The validated config.
+
+    Raises:
+        ValueError: If a section has the wrong shape.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("Config must be a JSON object")
+
+    gopros = config.get("gopros", [])
+    if not isinstance(gopros, list) or not all(isinstance(ip, str) and ip for ip in gopros):
+        raise ValueError("'gopros' must be a list of IP addresses")
+
+    gopro_settings = config.get("gopro_settings", [])
+    if not isinstance(gopro_settings, list):
+        raise ValueError("'gopro_settings' must be a list")
+    for setting in gopro_settings:
+        if not isinstance(setting, dict) or not {"setting", "option"} <= set(setting):
+            raise ValueError(f"Invalid GoPro setting {setting!r}: needs 'setting' and 'option'")
+        try:
+            # Cameras report settings as integers, which the options are compared against
+            int(setting["setting"]), int(setting["option"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid GoPro setting {setting!r}: 'setting' and 'option' must be integers")
+
+    audio = config.get("audio", {})
+    if not isinstance(audio, dict):
+        raise ValueError("'audio' must be an object")
+    unknown = set(audio) - set(AUDIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown audio options: {sorted(unknown)}")
+    if audio.get("format", AUDIO_DEFAULTS["format"]) not in AUDIO_FORMATS:
+        raise ValueError(f"Invalid audio format {audio['format']!r}: must be one of {list(AUDIO_FORMATS)}")
+    for key in ("segment_seconds", "encoder_workers", "rotate_seconds", "rotate_megabytes"):
+        value = audio.get(key, AUDIO_DEFAULTS[key])
+        if value is None and AUDIO_DEFAULTS[key] is None:
+            continue
+        kind, types = ("integer", int) if key == "encoder_workers" else ("number", (int, float))
+        if not isinstance(value, types) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"Invalid audio option {key!r}: {value!r} is not a positive {kind}")
+    rotating = [key for key in ("rotate_seconds", "rotate_megabytes") if audio.get(key) is not None]
+    if rotating and audio.get("format") == "flac":
+        # FLAC recordings are already split into segment_seconds pieces and joined at stop
+        raise ValueError(f"Invalid audio options {rotating}: rotation only applies to the 'wav' format")
+
+    return ConfigSnapshot(
+        gopros=tuple(dict.fromkeys(gopros)),
+        gopro_settings=tuple(MappingProxyType({"display_name": setting.get("display_name", setting["setting"]),
+                                               **setting}) for setting in gopro_settings),
+        audio=MappingProxyType({**AUDIO_DEFAULTS, **audio}),
+    )
+
+class ConfigStore:
+    """
+    Parses the config file once and keeps the current snapshot in memory.
+
+    The file's modification time and size are polled, and a changed file is
+    re-parsed and validated before its snapshot replaces the current one, so
+    readers always see a complete config. An invalid edit or a missing file
+    is reported and the last good snapshot is kept. Subscribers are called with the old and
+    new snapshots after every change.
+
+    Args:
+        path (str): Path of the config file.
+        poll_interval (float): Seconds between checks of the file.
+    """
+
+    def __init__(self, path=config_file_path, poll_interval=CONFIG_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.subscribers = []
+        self.signature = None
+        self.running = False
+        self.snapshot = parse_config({})
+        self.reload()
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """
+        Re-read the config file if it changed since the last read.
+
+        Returns:
+            bool: True if a new snapshot was installed.
+        """
+        signature = self.file_signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+
+        if signature is None:
+            # Editors may delete or rename the file while saving; an empty rig is never what was meant
+            print(f"Config {self.path} is missing, keeping the last good config", flush=True)
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = parse_config(json.load(f))
+        except (OSError, ValueError) as e:
+            # json.JSONDecodeError is a ValueError too
+            print(f"Ignoring invalid config {self.path}: {e}", flush=True)
+            return False
+
+        if snapshot == self.snapshot:
+            return False
+        old, self.snapshot = self.snapshot, snapshot
+        for callback in self.subscribers:
+            try:
+                callback(old, snapshot)
+            except Exception as e:
+                print(f"Error applying config change: {e}", flush=True)
+        return True
+
+    def watch(self):
+        """
+        Poll the config file until stop() is called. Meant to run as a background task.
+        """
+        self.running = True
+        while self.running:
+            if self.reload():
+                print(f"Reloaded config from {self.path}", flush=True)
+            time.sleep(self.poll_interval)
+
+    def stop(self):
+        self.running = False
+
+config_store = ConfigStore()
+
 def load_gopro_config():
-    if os.path.exists(config_file_path):
-        with open(config_file_path, 'r') as f:
-            config = json.load(f)
-            gopro_ips = config.get("gopros", [])
-    else:
-        gopro_ips = []
-        
-    return gopro_ips
+    return list(config_store.snapshot.gopros)
 
 def load_gopro_settings():
-    if os.path.exists(config_file_path):
-        with open(config_file_path, 'r') as f:
-            config = json.load(f)
-            gopro_params = config.get("gopro_settings", {})
-    else:
-        gopro_params = {}
+    return list(config_store.snapshot.gopro_settings)
 
-    return gopro_params
+def load_audio_config():
+    return dict(config_store.snapshot.audio)
 
 hls_dir = os.getenv("HLS_DIR", "./hls_streams")
+media_dir = os.getenv("MEDIA_DIR", "./media")
+sessions_dir = os.getenv("SESSIONS_DIR", "./sessions")
@@ -0,0 +1,150 @@
+import http.client
+import ipaddress
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from gopro_utils import GOPRO_PORT
+
+# Wired GoPros take the address 172.2X.1YZ.51, where X, Y and Z are the last
+# three digits of the camera's serial number
+CANDIDATE_TEMPLATE = '172.2{x}.1{yz:02d}.51'
+# Host part of the camera's address on its own /24 subnet
+CAMERA_HOST = 51
+# Seconds a probe may take; cameras answer on the local USB link in milliseconds
+PROBE_TIMEOUT = 0.5
+# Probes in flight at once
+PROBE_WORKERS = 256
+# Seconds a discovered camera stays listed after it last answered
+DISCOVERY_TTL = 60
+# Seconds between background sweeps
+DISCOVERY_INTERVAL = 30
+
+def candidate_ips(template=CANDIDATE_TEMPLATE):
+    """
+    Return every address a wired GoPro can have, one per serial number suffix.
+    """
+    return [template.format(x=x, yz=yz) for x in range(10) for yz in range(100)]
+
+def local_camera_subnets(route_path='/proc/net/route'):
+    """
+    Return the camera address on each private 172.16.0.0/12 /24 subnet this host routes to.
+
+    A GoPro plugged in over USB shows up as a network interface on its own
+    /24, so this finds cameras whose subnet doesn't follow the template.
+    Returns an empty list where the routing table can't be read.
+    """
+    private = ipaddress.ip_network('172.16.0.0/12')
+    ips = []
+    try:
+        with open(route_path) as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return ips
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        # Destination and mask are little-endian hex
+        destination = ipaddress.ip_address(bytes.fromhex(fields[1])[::-1])
+        mask = ipaddress.ip_address(bytes.fromhex(fields[7])[::-1])
+        if str(mask) == '255.255.255.0' and destination in private:
+            ips.append(str(destination + CAMERA_HOST))
+    return ips
+
+def probe(ip, port=GOPRO_PORT, timeout=PROBE_TIMEOUT):
+    """
+    Check whether a GoPro answers at an address.
+
+    Returns:
+        bool: True if /gopro/webcam/status answered with a webcam status.
+    """
+    connection = http.client.HTTPConnection(ip, port, timeout=timeout)
+    try:
+        connection.request('GET', '/gopro/webcam/status')
+        response = connection.getresponse()
+        return response.status == 200 and 'status' in json.loads(response.read())
+    except (OSError, ValueError, http.client.HTTPException):
+        return False
+    finally:
+        connection.close()
+
+class CameraDiscovery:
+    """
+    Finds wired GoPros by probing every candidate address concurrently.
+
+    Cameras that answer are cached for DISCOVERY_TTL seconds, so a camera
+    that misses a single sweep doesn't drop out of the camera list. Change
+    listeners are called with the new list of discovered cameras whenever
+    it changes.
+
+    Args:
+        candidates (list): Addresses to probe, defaults to the whole 172.2X.1YZ.51 space.
+        port (int): Port the cameras' HTTP API listens on.
+        timeout (float): Seconds each probe may take.
+        workers (int): Probes in flight at once.
+    """
+
+    def __init__(self, candidates=None, port=GOPRO_PORT, timeout=PROBE_TIMEOUT, workers=PROBE_WORKERS):
+        self.candidates = candidates
+        self.port = port
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Monotonic expiry per discovered IP
+        self.expiries = {}
+        self.lock = threading.Lock()
+        self.change_listeners = []
+        self.running = False
+        self.last_sweep = None
+
+    def cameras(self):
+        now = time.monotonic()
+        with self.lock:
+            return sorted(ip for ip, expires in self.expiries.items() if expires > now)
+
+    def sweep(self):
+        """
+        Probe every candidate address once and update the cache.
+
+        Returns:
+            dict: 'cameras' currently discovered, 'found' in this sweep,
+            'probed' address count and 'seconds' taken.
+        """
+        started = time.monotonic()
+        candidates = self.candidates if self.candidates is not None else candidate_ips()
+        candidates = list(dict.fromkeys(local_camera_subnets() + list(candidates)))
+        before = self.cameras()
+
+        results = self.executor.map(lambda ip: probe(ip, self.port, self.timeout), candidates)
+        found = [ip for ip, alive in zip(candidates, results) if alive]
+
+        now = time.monotonic()
+        with self.lock:
+            for ip in found:
+                self.expiries[ip] = now + DISCOVERY_TTL
+            for ip in [ip for ip, expires in self.expiries.items() if expires <= now]:
+                del self.expiries[ip]
+
+        cameras = self.cameras()
+        if cameras != before:
+            for listener in self.change_listeners:
+                listener(cameras)
+        self.last_sweep = {'cameras': cameras, 'found': found, 'probed': len(candidates),
+                           'seconds': round(time.monotonic() - started, 3)}
+        return self.last_sweep
+
+    def run(self, interval=DISCOVERY_INTERVAL):
+        """
+        Sweep every interval seconds until stop() is called. Meant to run as a background task.
+        """
+        self.running = True
+        while self.running:
+            try:
+                result = self.sweep()
+                print(f"Discovery found {len(result['found'])} GoPros in {result['seconds']}s", flush=True)
+            except Exception as e:
+                print(f"Error discovering GoPros: {e}", flush=True)
+            time.sleep(interval)
+
+    def stop(self):
+        self.running = False
@@ -1,80 +1,517 @@
+import threading
+import time
 import requests
-from config import load_gopro_config, load_gopro_settings
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from requests.adapters import HTTPAdapter
+from config import config_store
+from health import CameraHealth, CircuitOpenError
+from metrics import CAMERA_REQUEST_ERRORS, CAMERA_REQUEST_SECONDS, FLEET_SWEEP_SECONDS, endpoint_name
 
-gopro_ips = load_gopro_config()
-gopro_settings = load_gopro_settings()
+GOPRO_PORT = 8080
+STATUS_TIMEOUT = 1
+COMMAND_TIMEOUT = 5
+# Status code reported for a camera that did not answer before the deadline
+TIMEOUT_STATUS = 408
+# Seconds a setting write is assumed to take until one has been timed, for the savings estimate
+NOMINAL_WRITE_SECONDS = 0.5
+# Media downloads share one latency history and metric series rather than one per file
+MEDIA_PREFIX = '/videos/DCIM/'
+# Seconds the shutter workers of a synchronized start wait for each other before firing anyway
+RELEASE_TIMEOUT = 1
+
+class GoProClient:
+    """
+    HTTP client for a single GoPro with a pooled keep-alive session.
+
+    Args:
+        ip (str): The IP address of the GoPro, optionally as 'host:port'.
+        pool_size (int): Number of connections kept open to the camera.
+        on_write (callable): Called with the IP after a request that changes camera state.
+    """
+
+    def __init__(self, ip, pool_size=4, on_write=None):
+        self.ip = ip
+        self.on_write = on_write
+        host = ip if ':' in ip else f'{ip}:{GOPRO_PORT}'
+        self.base_url = f'http://{host}'
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.health = CameraHealth(ip)
+        # Running totals of setting writes, used to estimate the time a skipped write saves
+        self.write_count = 0
+        self.write_seconds = 0.0
+
+    def get(self, path, params=None, timeout=COMMAND_TIMEOUT, **kwargs):
+        """
+        Send a GET request to the camera through its circuit breaker.
+
+        Fails at once with CircuitOpenError while the camera is known to be
+        down, and tightens the timeout to the path's observed latency.
+        Further keyword arguments, such as headers or stream, are passed to requests.
+        """
+        route = MEDIA_PREFIX if path.startswith(MEDIA_PREFIX) else path
+        endpoint = endpoint_name(route)
+        try:
+            self.health.before_request()
+        except CircuitOpenError:
+            CAMERA_REQUEST_ERRORS.inc(self.ip, endpoint)
+            raise
+        started = time.monotonic()
+        try:
+            response = self.session.get(self.base_url + path, params=params,
+                                        timeout=self.health.timeout(route, timeout), **kwargs)
+        except Exception:
+            self.health.record_failure()
+            CAMERA_REQUEST_ERRORS.inc(self.ip, endpoint)
+            raise
+        latency = time.monotonic() - started
+        CAMERA_REQUEST_SECONDS.observe(latency, self.ip, endpoint)
+        if response.status_code >= 500:
+            self.health.record_failure()
+            CAMERA_REQUEST_ERRORS.inc(self.ip, endpoint)
+        else:
+            self.health.record_success(route, latency)
+        return response
+
+    def close(self):
+        self.session.close()
+
+    def report(self, message, error):
+        # Requests refused by an open circuit are expected; the breaker logs when it opens and closes
+        if not isinstance(error, CircuitOpenError):
+            print(f"{message}: {error}", flush=True)
+
+    def notify_write(self):
+        if self.on_write:
+            self.on_write(self.ip)
+
+    def webcam_status(self, timeout=STATUS_TIMEOUT):
+        try:
+            response = self.get('/gopro/webcam/status', timeout=timeout)
+            # 0/1 are off/idle, 2/3 mean the webcam preview is streaming
+            return 200 if response.json().get('status') in [0, 1, 2, 3] else 400
+        except Exception as e:
+            self.report(f"Error getting status for {self.ip}", e)
+            return 400
+
+    def get_state(self, timeout=COMMAND_TIMEOUT):
+        try:
+            response = self.get('/gopro/camera/state', timeout=timeout)
+        except Exception as e:
+            self.report(f"Error getting state for {self.ip}", e)
+            return False
+        if response.status_code != 200:
+            return False
+        return response.json()
+
+    def get_settings(self, timeout=COMMAND_TIMEOUT):
+        state = self.get_state(timeout=timeout)
+        if not state:
+            return False
+        return state.get('settings')
+
+    def set_setting(self, setting, timeout=COMMAND_TIMEOUT):
+        query_string = {"setting": setting['setting'], "option": setting['option']}
+        try:
+            response = self.get('/gopro/camera/setting', params=query_string, timeout=timeout)
+            self.notify_write()
+            if response.status_code != 200:
+                raise Exception(f"Failed to set setting: {response.json()}")
+            print(f"GoPro setting set to {setting}:", response.json())
+            return response.status_code
+        except Exception as e:
+            self.report(f"Error setting setting for {self.ip}", e)
+            return 400
+
+    def reconcile_settings(self, desired, timeout=COMMAND_TIMEOUT):
+        """
+        Bring the camera's settings in line with the desired config, writing only what differs.
+
+        Args:
+            desired (list): Settings as returned by load_gopro_settings.
+            timeout (float): Timeout in seconds for each request.
+
+        Returns:
+            dict: Whether the camera now matches, how many writes were sent and
+            skipped, and the estimated milliseconds saved by skipping.
+        """
+        current = self.get_settings(timeout=timeout)
+        if current is False:
+            return {'ok': False, 'written': 0, 'skipped': 0, 'saved_ms': 0.0}
+
+        changed = [setting for setting in desired
+                   if current.get(str(setting['setting'])) != int(setting['option'])]
+        for setting in changed:
+            start = time.monotonic()
+            self.set_setting(setting, timeout=timeout)
+            self.write_seconds += time.monotonic() - start
+            self.write_count += 1
+
+        # Only read back when something was written; otherwise the first read already verified
+        if changed:
+            current = self.get_settings(timeout=timeout) or {}
+        ok = all(current.get(str(setting['setting'])) == int(setting['option']) for setting in desired)
+
+        skipped = len(desired) - len(changed)
+        average_write = self.write_seconds / self.write_count if self.write_count else NOMINAL_WRITE_SECONDS
+        return {'ok': ok, 'written': len(changed), 'skipped': skipped,
+                'saved_ms': skipped * average_write * 1000}
+
+    def enable_usb(self, timeout=COMMAND_TIMEOUT):
+        try:
+            response = self.get('/gopro/camera/control/wired_usb', params={"p": "1"}, timeout=timeout)
+            if response.status_code != 200:
+                raise Exception(f"Failed to enable USB: {response.text}")
+            print(f"GoPro USB enabled: {response.status_code}", flush=True)
+            return response.status_code
+        except Exception as e:
+            self.report(f"Error enabling USB for {self.ip}", e)
+            return 400
+
+    def start_record(self, timeout=COMMAND_TIMEOUT):
+        try:
+            response = self.get('/gopro/camera/shutter/start', timeout=timeout)
+            self.notify_write()
+            if response.status_code != 200:
+                print(f"Failed to start GoPro webcam {self.ip}: {response.text}", flush=True)
+            else:
+                print(f'GoPro webcam {self.ip} started: {response.status_code}', flush=True)
+            return response.status_code
+        except Exception as e:
+            self.report(f"Error starting webcam for {self.ip}", e)
+            return 400
+
+    def stop_record(self, timeout=COMMAND_TIMEOUT):
+        try:
+            response = self.get('/gopro/camera/shutter/stop', timeout=timeout)
+            self.notify_write()
+            if response.status_code != 200:
+                print(f"Failed to stop GoPro webcam {self.ip}: {response.text}", flush=True)
+            else:
+                print(f"GoPro webcam {self.ip} stopped:", response.json(), flush=True)
+            return response.status_code
+        except Exception as e:
+            self.report(f"Error stopping webcam for {self.ip}", e)
+            return 400
+
+    def start_webcam(self, port, res=7, fov=0, timeout=COMMAND_TIMEOUT):
+        params = {"res": res, "fov": fov, "port": port, "protocol": "ts"}
+        try:
+            response = self.get('/gopro/webcam/start', params=params, timeout=timeout)
+            if response.status_code != 200:
+                print(f"Failed to start webcam stream for {self.ip}: {response.text}", flush=True)
+            else:
+                print(f"GoPro webcam stream {self.ip} started on port {port}", flush=True)
+            return response.status_code
+        except Exception as e:
+            self.report(f"Error starting webcam stream for {self.ip}", e)
+            return 400
+
+    def stop_webcam(self, timeout=COMMAND_TIMEOUT):
+        try:
+            response = self.get('/gopro/webcam/stop', timeout=timeout)
+            if response.status_code != 200:
+                print(f"Failed to stop webcam stream for {self.ip}: {response.text}", flush=True)
+            return response.status_code
+        except Exception as e:
+            self.report(f"Error stopping webcam stream for {self.ip}", e)
+            return 400
+
+    def media_list(self, timeout=COMMAND_TIMEOUT):
+        """
+        List the media files on the camera's SD card.
+
+        Returns:
+            list: {'folder', 'name', 'size', 'created'} per file, or False on error.
+        """
+        try:
+            response = self.get('/gopro/media/list', timeout=timeout)
+        except Exception as e:
+            self.report(f"Error listing media for {self.ip}", e)
+            return False
+        if response.status_code != 200:
+            return False
+        return [{'folder': folder['d'], 'name': item['n'], 'size': int(item['s']), 'created': item.get('cre')}
+                for folder in response.json().get('media', []) for item in folder.get('fs', [])]
+
+    def media_path(self, folder, name):
+        return f'{MEDIA_PREFIX}{folder}/{name}'
+
+class GoProFleet:
+    """
+    Runs camera calls against many GoPros in parallel, one client per camera.
+
+    Args:
+        ips (list): IPs of the GoPros in the fleet.
+        max_workers (int): Maximum number of camera calls in flight at once.
+    """
+
+    def __init__(self, ips=(), max_workers=64):
+        self.ips = list(ips)
+        self.clients = {}
+        # Called with a camera's IP whenever a request changes that camera's state
+        self.write_listeners = []
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def client(self, ip):
+        if ip not in self.clients:
+            self.clients[ip] = GoProClient(ip, on_write=self.notify_write)
+        return self.clients[ip]
+
+    def notify_write(self, ip):
+        for listener in self.write_listeners:
+            listener(ip)
+
+    def set_ips(self, ips):
+        """
+        Replace the fleet's camera list, closing sessions for removed cameras.
+        """
+        self.ips = list(ips)
+        for ip in list(self.clients):
+            if ip not in self.ips:
+                self.clients.pop(ip).close()
+
+    def iter_results(self, func, ips=None, timeout=COMMAND_TIMEOUT, default=TIMEOUT_STATUS, executor=None):
+        """
+        Call func(client) for every camera concurrently, yielding results as they finish.
+
+        Cameras that miss the deadline or raise are yielded last with the default
+        result, so every camera is accounted for exactly once.
+
+        Args:
+            func (callable): Function taking a GoProClient.
+            ips (list): IPs to call, defaults to the whole fleet.
+            timeout (float): Deadline in seconds for the whole fan-out.
+            default: Result recorded for cameras that miss the deadline or raise.
+            executor (Executor): Pool to run the calls on, defaults to the fleet's.
+
+        Yields:
+            tuple: (ip, result) in completion order.
+        """
+        ips = self.ips if ips is None else ips
+        executor = executor or self.executor
+        futures = {executor.submit(func, self.client(ip)): ip for ip in ips}
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                pending.discard(future)
+                if future.exception() is None:
+                    yield futures[future], future.result()
+                else:
+                    print(f"Error calling {futures[future]}: {future.exception()}", flush=True)
+                    yield futures[future], default
+        except FuturesTimeoutError:
+            pass
+
+        for future in pending:
+            future.cancel()
+            print(f"Timed out waiting for {futures[future]}", flush=True)
+            yield futures[future], default
+
+    def map(self, func, ips=None, timeout=COMMAND_TIMEOUT, default=TIMEOUT_STATUS):
+        """
+        Call func(client) for every camera concurrently and wait for all of them.
+
+        Returns:
+            dict: Result per IP, in the order the IPs were given.
+        """
+        ips = self.ips if ips is None else ips
+        results = dict(self.iter_results(func, ips, timeout=timeout, default=default))
+        return {ip: results[ip] for ip in ips}
+
+    def health(self, ips=None):
+        ips = self.ips if ips is None else ips
+        return [self.client(ip).health.snapshot() for ip in ips]
+
+    def status(self, ips=None, timeout=STATUS_TIMEOUT):
+        with FLEET_SWEEP_SECONDS.time('status'):
+            results = self.map(lambda c: c.webcam_status(timeout=timeout), ips, timeout=timeout, default=400)
+        return [{'ip': ip, 'status': status} for ip, status in results.items()]
+
+    def settings(self, ips=None, timeout=COMMAND_TIMEOUT):
+        with FLEET_SWEEP_SECONDS.time('settings'):
+            return self.map(lambda c: c.get_settings(timeout=timeout), ips, timeout=timeout, default=False)
+
+    def set_setting(self, setting, ips=None, timeout=COMMAND_TIMEOUT):
+        return self.map(lambda c: c.set_setting(setting, timeout=timeout), ips, timeout=timeout)
+
+    def reconcile_settings(self, desired, ips=None, timeout=COMMAND_TIMEOUT):
+        return self.map(lambda c: c.reconcile_settings(desired, timeout=timeout), ips,
+                        timeout=timeout * (len(desired) + 2), default=None)
+
+    def enable_usb(self, ips=None, timeout=COMMAND_TIMEOUT):
+        return self.map(lambda c: c.enable_usb(timeout=timeout), ips, timeout=timeout)
+
+    def start_record(self, ips=None, timeout=COMMAND_TIMEOUT):
+        return self.map(lambda c: c.start_record(timeout=timeout), ips, timeout=timeout)
+
+    def stop_record(self, ips=None, timeout=COMMAND_TIMEOUT):
+        return self.map(lambda c: c.stop_record(timeout=timeout), ips, timeout=timeout)
+
+    def synchronized_start(self, ips, timeout=COMMAND_TIMEOUT, on_result=None, release_at=None):
+        """
+        Start recording on already-armed cameras with all shutter requests released at once.
+
+        Every camera gets its own worker thread, which waits on a barrier before
+        sending, so the requests leave together instead of trickling out as each
+        worker is scheduled. The threads are not taken from the fleet's pool,
+        where they could queue behind status polls or, past max_workers
+        cameras, never all reach the barrier.
+
+        Args:
+            ips (list): IPs of the armed GoPros.
+            timeout (float): Timeout in seconds for each shutter request, counted from its release.
+            on_result (callable): Called with each camera's result as soon as it is known.
+            release_at (float): Monotonic time to hold the requests until, so fleets in
+                other processes can release theirs at the same moment.
+
+        Returns:
+            tuple: Per-camera results with monotonic send/ack times, and the
+            send/ack skew across cameras in milliseconds.
+        """
+        ips = list(ips)
+        if not ips:
+            return [], {'send_ms': 0.0, 'ack_ms': 0.0}
+
+        barrier = threading.Barrier(len(ips))
+
+        def fire(client):
+            try:
+                barrier.wait(timeout=RELEASE_TIMEOUT)
+            except threading.BrokenBarrierError:
+                # Better to record late than not at all
+                pass
+            if release_at is not None:
+                time.sleep(max(release_at - time.monotonic(), 0))
+            sent = time.monotonic()
+            response = client.start_record(timeout=timeout)
+            return {'response': response, 'sent': sent, 'acked': time.monotonic()}
+
+        # The shutter calls get their full timeout after the barrier and any hold
+        hold = max(release_at - time.monotonic(), 0) if release_at is not None else 0
+        deadline = RELEASE_TIMEOUT + hold + timeout
+        executor = ThreadPoolExecutor(max_workers=len(ips))
+        responses = []
+        try:
+            with FLEET_SWEEP_SECONDS.time('synchronized_start'):
+                for ip, result in self.iter_results(fire, ips, timeout=deadline, default=None, executor=executor):
+                    if result is None:
+                        result = {'response': TIMEOUT_STATUS, 'sent': None, 'acked': None}
+                    responses.append({'ip': ip, **result})
+                    if on_result:
+                        on_result(responses[-1])
+        finally:
+            # Don't wait for shutter requests that already missed the deadline
+            executor.shutdown(wait=False)
+
+        return responses, shutter_skew(responses)
+
+def shutter_skew(responses):
+    """
+    Spread of the send and ack times of the successful shutter requests, in milliseconds.
+    """
+    sent = [r['sent'] for r in responses if r['response'] == 200]
+    acked = [r['acked'] for r in responses if r['response'] == 200]
+    return {
+        'send_ms': (max(sent) - min(sent)) * 1000 if sent else 0.0,
+        'ack_ms': (max(acked) - min(acked)) * 1000 if acked else 0.0,
+    }
+
+def arm_camera(client):
+    """
+    Prepare a GoPro for recording by enabling USB control and applying settings.
+
+    Args:
+        client (GoProClient): Client for the GoPro.
+
+    Returns:
+        dict: The settings reconcile result; 'ok' is True if the camera
+        reports the configured settings.
+    """
+    # Enable USB control for the GoPro
+    client.enable_usb()
+
+    # Write only the settings that differ, then verify
+    result = client.reconcile_settings(config_store.snapshot.gopro_settings)
+    if not result['ok']:
+        print(f"Settings do not match for {client.ip}", flush=True)
+    return result
+
+def stop_camera(client):
+    """
+    Stop recording on a GoPro, timing the request on the monotonic clock.
+
+    Args:
+        client (GoProClient): Client for the GoPro.
+
+    Returns:
+        dict: The response status and the monotonic send and ack times.
+    """
+    sent = time.monotonic()
+    response = client.stop_record()
+    return {'response': response, 'sent': sent, 'acked': time.monotonic()}
+
+def summarize_reconcile(results):
+    """
+    Total up the per-camera results of GoProFleet.reconcile_settings.
+
+    Args:
+        results (iterable): Per-camera results, None for cameras that timed out.
+
+    Returns:
+        dict: Total writes sent and skipped and the estimated milliseconds saved.
+    """
+    results = [result for result in results if result]
+    return {
+        'written': sum(result['written'] for result in results),
+        'skipped': sum(result['skipped'] for result in results),
+        'saved_ms': sum(result['saved_ms'] for result in results),
+    }
+
+fleet = GoProFleet(config_store.snapshot.gopros)
+
+# Cameras found by discovery, kept in the fleet alongside the configured ones
+discovered_ips = []
+
+def live_camera_ips():
+    """
+    Return the configured cameras followed by any discovered ones not in the config.
+    """
+    return list(dict.fromkeys([*config_store.snapshot.gopros, *discovered_ips]))
+
+def set_discovered_ips(ips):
+    discovered_ips[:] = ips
+    fleet.set_ips(live_camera_ips())
+
+def apply_config(old, new):
+    # Add or drop cameras, closing the pooled connections of removed ones
+    if new.gopros != old.gopros:
+        fleet.set_ips(live_camera_ips())
+
+config_store.subscribe(apply_config)
 
 def update_gopro_ips():
-    global gopro_ips
-    gopro_ips = load_gopro_config()
+    config_store.reload()
 
 def update_gopro_settings():
-    global gopro_settings
-    gopro_settings = load_gopro_settings()
+    config_store.reload()
 
 def get_gopro_status():
-    responses = []
-    for ip in gopro_ips:
-        url = f'http://{ip}:8080/gopro/webcam/status'
-        try:
-            response = requests.get(url, timeout=1)
-            status = 200 if response.json().get('status') in [0, 1] else 400
-            responses.append({'ip': ip, 'status': status})
-        except Exception as e:
-            responses.append({'ip': ip, 'status': 400})
-            print(f"Error getting status for {ip}: {e}", flush=True)
-    return responses
+    return fleet.status()
 
 def set_gopro_settings(ip, setting):
-    url = f"http://{ip}:8080/gopro/camera/setting"
-    query_string = {"setting": setting['setting'], "option": setting['option']}
-    try:
-        response = requests.get(url, params=query_string)
-        if response.status_code == 200:
-            print(f"GoPro setting set to {setting}:", response.json())
-        else:
-            raise Exception(f"Failed to set setting: {response.json()}")
-    except Exception as e:
-        print(f"Error setting setting: {e}")
+    return fleet.client(ip).set_setting(setting)
 
 def get_gopro_settings(ip):
-    url = f'http://{ip}:8080/gopro/camera/state'
-    response = requests.get(url)
-    if response.status_code != 200:
-        return False
-    return response.json().get('settings')
+    return fleet.client(ip).get_settings()
 
 def enable_usb(ip):
-    url = f"http://{ip}:8080/gopro/camera/control/wired_usb"
-    querystring = {"p": "1"}
-    try:
-        response = requests.get(url, params=querystring)
-        if response.status_code != 200:
-            raise Exception(f"Failed to enable USB: {response.text}")
-        print(f"GoPro USB enabled: {response.status_code}", flush=True)
-    except Exception as e:
-        print(f"Error enabling USB for {ip}: {e}", flush=True)
+    return fleet.client(ip).enable_usb()
 
 def start_gopro_record(ip):
-    url = f'http://{ip}:8080/gopro/camera/shutter/start'
-    try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to start GoPro webcam: {response.text}")
-        print(f'GoPro webcam {ip} started: {response.status_code}', flush=True)
-        return response.status_code
-    except Exception as e:
-        print(f"Error starting webcam for {ip}: {e}", flush=True)
-        return response.status_code
+    return fleet.client(ip).start_record()
 
 def stop_gopro(ip):
-    url = f'http://{ip}:8080/gopro/camera/shutter/stop'
-    try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to stop GoPro webcam: {response.text}")
-        print(f"GoPro webcam {ip} stopped:", response.json(), flush=True)
-        return response.status_code
-    except Exception as e:
-        print(f"Error stopping webcam for {ip}: {e}", flush=True)
-        return response.status_code
+    return fleet.client(ip).stop_record()
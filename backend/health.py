@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+# Consecutive failed requests that open a camera's circuit
+FAILURE_THRESHOLD = 3
+# Seconds an open circuit waits before letting a probe through, doubling after
+# each failed probe up to MAX_OPEN_SECONDS
+OPEN_SECONDS = 1
+MAX_OPEN_SECONDS = 30
+# Recent requests kept per path for latency percentiles, and per camera for the error rate
+LATENCY_WINDOW = 100
+OUTCOME_WINDOW = 50
+# Requests on a path needed before its timeout adapts to the observed latency
+MIN_SAMPLES = 20
+# Adaptive timeouts are this multiple of the path's p99 latency, never below MIN_TIMEOUT
+TIMEOUT_FACTOR = 3
+MIN_TIMEOUT = 0.25
+# Read-only paths whose timeouts adapt. Writes keep the caller's timeout: a resolution change
+# or a shutter on a busy camera takes far longer than the fast history of the same path
+ADAPTIVE_PATHS = ('/gopro/webcam/status', '/gopro/camera/state')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to a camera whose circuit is open.
+    """
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+class CameraHealth:
+    """
+    Rolling latency and error statistics for one camera, with a circuit breaker.
+
+    After FAILURE_THRESHOLD consecutive failures the circuit opens and
+    requests fail at once with CircuitOpenError. Once the open period ends a
+    single probe request is let through: success closes the circuit, failure
+    reopens it for twice as long.
+
+    Args:
+        ip (str): The IP address of the GoPro, used in log messages.
+    """
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = OPEN_SECONDS
+        self.open_until = 0.0
+        self.latencies = {}
+        self.outcomes = deque(maxlen=OUTCOME_WINDOW)
+
+    def before_request(self):
+        """
+        Let a request through, or raise CircuitOpenError if the camera is known to be down.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() >= self.open_until:
+                # This request becomes the probe; others keep failing fast until it returns
+                self.state = HALF_OPEN
+                return
+        raise CircuitOpenError(f"Circuit open for {self.ip}")
+
+    def record_success(self, path, latency):
+        with self.lock:
+            self.latencies.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                print(f"Circuit closed for {self.ip}", flush=True)
+            self.state = CLOSED
+            self.open_seconds = OPEN_SECONDS
+
+    def record_failure(self):
+        with self.lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                self.open_seconds = min(self.open_seconds * 2, MAX_OPEN_SECONDS)
+            elif self.consecutive_failures < FAILURE_THRESHOLD:
+                return
+            if self.state == CLOSED:
+                print(f"Circuit opened for {self.ip} after {self.consecutive_failures} failures", flush=True)
+            self.state = OPEN
+            self.open_until = time.monotonic() + self.open_seconds
+
+    def timeout(self, path, requested):
+        """
+        Return the timeout to use for a request, tightened to the path's observed latency
+        for the read-only paths in ADAPTIVE_PATHS.
+
+        Args:
+            path (str): API path of the request.
+            requested (float): Timeout asked for by the caller, used as the upper bound.
+        """
+        latencies = self.latencies.get(path)
+        if path not in ADAPTIVE_PATHS or not latencies or len(latencies) < MIN_SAMPLES:
+            return requested
+        return min(requested, max(MIN_TIMEOUT, percentile(latencies, 0.99) * TIMEOUT_FACTOR))
+
+    def snapshot(self):
+        """
+        Return the camera's circuit state, error rate and per-path latency percentiles.
+        """
+        with self.lock:
+            latencies = {path: {'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+                                'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+                                # None for paths that don't adapt, or don't have enough samples yet
+                                'timeout_ms': round(self.timeout(path, float('inf')) * 1000, 1)
+                                if path in ADAPTIVE_PATHS and len(values) >= MIN_SAMPLES else None}
+                         for path, values in self.latencies.items() if values}
+            return {
+                'ip': self.ip,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'error_rate': round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0.0,
+                'retry_in': round(max(self.open_until - time.monotonic(), 0.0), 2) if self.state == OPEN else 0.0,
+                'latency': latencies,
+            }
@@ -0,0 +1,307 @@
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from os_threads import os_threading
+
+# Histogram bucket upper bounds in seconds, from a fast status poll to a slow arm
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# File receiving a JSON line with every metric each METRICS_LOG_INTERVAL seconds, off when unset
+METRICS_LOG_FILE = os.getenv("METRICS_LOG_FILE")
+METRICS_LOG_INTERVAL = 10
+
+def format_labels(labelnames, labels):
+    if not labelnames:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labelnames, labels)) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    Base of the metric types: a name, help text and one series per label combination.
+
+    Labels are passed positionally, in the order of labelnames, so recording
+    a value costs a tuple lookup and a lock rather than a dict of keywords.
+
+    Args:
+        name (str): Metric name as exposed at /metrics.
+        documentation (str): Help text.
+        labelnames (tuple): Names of the labels every series carries.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        # Series reported by other processes, by source, merged in whenever the metric is read
+        self.remote = {}
+        self.lock = os_threading.Lock()
+
+    def samples(self):
+        """
+        Yield (suffix, labels text, value) for every sample of the metric.
+        """
+        raise NotImplementedError
+
+    def set_remote(self, source, series):
+        with self.lock:
+            self.remote[source] = series
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines += [f'{self.name}{suffix}{labels} {format_value(value)}' for suffix, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def copy_series(self):
+        with self.lock:
+            series = dict(self.series)
+            for remote in self.remote.values():
+                for labels, value in remote.items():
+                    series[labels] = series.get(labels, 0) + value
+        return series
+
+    def samples(self):
+        for labels, value in self.copy_series().items():
+            yield '', format_labels(self.labelnames, labels), value
+
+    def snapshot(self):
+        return {','.join(map(str, labels)): value for labels, value in self.copy_series().items()}
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, either set directly or read from a function at scrape time.
+
+    Args:
+        function (callable): Returns the gauge's value, or a dict of label tuple to value.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.series[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def current(self):
+        if self.function is None:
+            with self.lock:
+                return dict(self.series)
+        value = self.function()
+        return value if isinstance(value, dict) else {(): value}
+
+    def samples(self):
+        for labels, value in self.current().items():
+            yield '', format_labels(self.labelnames, labels), value
+
+    def snapshot(self):
+        return {','.join(map(str, labels)): value for labels, value in self.current().items()}
+
+class Histogram(Metric):
+    """
+    Counts observations into fixed buckets, plus their sum and count.
+
+    Args:
+        buckets (tuple): Ascending bucket upper bounds; +Inf is implied.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts with a final +Inf bucket, then sum
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def copy_series(self):
+        with self.lock:
+            merged = {labels: list(series) for labels, series in self.series.items()}
+            for remote in self.remote.values():
+                for labels, series in remote.items():
+                    if labels in merged:
+                        merged[labels] = [a + b for a, b in zip(merged[labels], series)]
+                    else:
+                        merged[labels] = list(series)
+        return merged
+
+    def samples(self):
+        for labels, series in self.copy_series().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                yield '_bucket', format_labels(self.labelnames + ('le',), labels + (format_value(bound),)), cumulative
+            yield '_sum', format_labels(self.labelnames, labels), series[-1]
+            yield '_count', format_labels(self.labelnames, labels), cumulative
+
+    def quantile(self, series, q):
+        # Upper bound of the bucket holding the q-th observation, '+Inf' past the last bucket
+        count = sum(series[:-1])
+        if not count:
+            return None
+        rank, cumulative = q * count, 0
+        for bound, bucket_count in zip(self.buckets, series):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return '+Inf'
+
+    def snapshot(self):
+        return {','.join(map(str, labels)): {'count': sum(series[:-1]), 'sum': round(series[-1], 6),
+                                             'p50': self.quantile(series, 0.5), 'p95': self.quantile(series, 0.95),
+                                             'p99': self.quantile(series, 0.99)}
+                for labels, series in self.copy_series().items()}
+
+class Registry:
+    """
+    Every metric the process exposes, rendered for /metrics or the JSON log.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def export(self, names):
+        """
+        Return the raw series of the named counters and histograms, as JSON for another process.
+        """
+        return {name: [[list(labels), series] for labels, series in self.metrics[name].copy_series().items()]
+                for name in names}
+
+    def merge(self, source, exported):
+        """
+        Install series exported by another process, replacing what that source reported before.
+
+        Args:
+            source (str): Name of the reporting process, e.g. 'shard0'.
+            exported (dict): The output of export() in that process.
+        """
+        for name, series in exported.items():
+            if name in self.metrics:
+                self.metrics[name].set_remote(source, {tuple(labels): value for labels, value in series})
+
+    def log_loop(self, path=METRICS_LOG_FILE, interval=METRICS_LOG_INTERVAL):
+        """
+        Append a JSON snapshot of every metric to path each interval seconds. Meant to run as a background task.
+        """
+        while True:
+            time.sleep(interval)
+            try:
+                with open(path, 'a') as f:
+                    f.write(json.dumps({'time': time.time(), 'metrics': self.snapshot()}) + '\n')
+            except OSError as e:
+                print(f"Error writing metrics log {path}: {e}", flush=True)
+
+registry = Registry()
+
+CAMERA_REQUEST_SECONDS = registry.register(Histogram(
+    'gopro_request_seconds', 'Latency of HTTP requests to the cameras', ('camera', 'endpoint')))
+CAMERA_REQUEST_ERRORS = registry.register(Counter(
+    'gopro_request_errors_total', 'Camera requests that failed, timed out or were refused by an open circuit',
+    ('camera', 'endpoint')))
+FLEET_SWEEP_SECONDS = registry.register(Histogram(
+    'gopro_fleet_sweep_seconds', 'Time for a fan-out across every selected camera to finish', ('operation',)))
+SOCKET_HANDLER_SECONDS = registry.register(Histogram(
+    'socketio_handler_seconds', 'Duration of Socket.IO event handlers', ('event',)))
+SOCKET_HANDLER_ERRORS = registry.register(Counter(
+    'socketio_handler_errors_total', 'Socket.IO event handlers that raised', ('event',)))
+BACKGROUND_TASKS = registry.register(Gauge(
+    'background_tasks', 'Background tasks currently running, by target function', ('task',)))
+AUDIO_OVERRUNS = registry.register(Counter(
+    'audio_overruns_total', 'Input overflows reported by the audio driver', ('device',)))
+AUDIO_DROPPED_FRAMES = registry.register(Counter(
+    'audio_dropped_frames_total', 'Captured audio frames dropped because the ring buffer was full', ('device',)))
+
+def endpoint_name(path):
+    # '/gopro/camera/shutter/start' -> 'camera/shutter/start', '/videos/DCIM/' -> 'videos/DCIM'
+    return path[len('/gopro/'):] if path.startswith('/gopro/') else path.strip('/')
+
+def instrument_socketio(socketio):
+    """
+    Time every handler registered with socketio.on from now on, and count running background tasks.
+
+    Must be called before the handlers are declared.
+
+    Args:
+        socketio (SocketIO): The application's Socket.IO server.
+    """
+    register = socketio.on
+
+    def on(message, namespace=None):
+        decorator = register(message, namespace)
+
+        def instrumented(handler):
+            @wraps(handler)
+            def timed(*args):
+                started = time.perf_counter()
+                try:
+                    return handler(*args)
+                except Exception:
+                    SOCKET_HANDLER_ERRORS.inc(message)
+                    raise
+                finally:
+                    SOCKET_HANDLER_SECONDS.observe(time.perf_counter() - started, message)
+            decorator(timed)
+            return handler
+        return instrumented
+
+    start_background_task = socketio.start_background_task
+
+    def counted(target, *args, **kwargs):
+        # 'CameraStateCache.run' rather than just 'run' for bound methods
+        task = getattr(target, '__qualname__', repr(target))
+
+        def run():
+            BACKGROUND_TASKS.inc(task)
+            try:
+                return target(*args, **kwargs)
+            finally:
+                BACKGROUND_TASKS.inc(task, amount=-1)
+        return start_background_task(run)
+
+    socketio.on = on
+    socketio.start_background_task = counted
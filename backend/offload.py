@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import media_dir
+from gopro_utils import COMMAND_TIMEOUT
+from os_threads import run_off_hub
+from preview import camera_dir_name
+
+# Bytes read from the camera and written to disk at a time
+CHUNK_SIZE = 1024 * 1024
+# Files downloaded from the same camera at once
+FILES_PER_CAMERA = 2
+# Seconds a media transfer may go without receiving any data
+READ_TIMEOUT = 30
+# Attempts per file; each retry resumes from the bytes already on disk
+DOWNLOAD_ATTEMPTS = 3
+# Name of the file, in the media directory, recording what has been offloaded
+STATE_FILE = 'offload_state.json'
+
+def hash_file(path, hasher):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher
+
+def write_chunk(f, hasher, chunk):
+    f.write(chunk)
+    hasher.update(chunk)
+
+def content_range_start(header):
+    # 'bytes 1000-1999/2000' -> 1000, None when missing or malformed
+    try:
+        unit, byte_range = header.split(' ', 1)
+        return int(byte_range.split('-', 1)[0]) if unit == 'bytes' else None
+    except (AttributeError, ValueError):
+        return None
+
+def download_media(client, item, path, on_progress=None):
+    """
+    Stream one media file from a GoPro to disk, resuming a partial download.
+
+    The file is written to '<path>.part' and renamed once complete. If a
+    partial file is already on disk, only the remaining bytes are requested
+    with an HTTP Range header, and the bytes received are only appended if
+    the camera's Content-Range starts exactly where the partial file ends.
+    The request goes through the client, so it passes the camera's circuit
+    breaker and is counted in its metrics.
+
+    Args:
+        client (GoProClient): Client of the camera holding the file.
+        item (dict): The file as returned by GoProClient.media_list.
+        path (str): Path to save the file to.
+        on_progress (callable): Called with the number of bytes received after each chunk.
+
+    Returns:
+        str: SHA-256 of the file.
+    """
+    part_path = path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset > item['size']:
+        os.remove(part_path)
+        offset = 0
+    # Reading the socket yields to the hub, but hashing and disk writes don't, so they run off it
+    hasher = run_off_hub(hash_file, part_path, hashlib.sha256()) if offset else hashlib.sha256()
+    if on_progress and offset:
+        on_progress(offset)
+
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    media_path = client.media_path(item['folder'], item['name'])
+    with client.get(media_path, headers=headers, stream=True, timeout=(COMMAND_TIMEOUT, READ_TIMEOUT)) as response:
+        if response.status_code == 200 and offset:
+            # The camera ignored the range, so start over
+            if on_progress:
+                on_progress(-offset)
+            offset = 0
+            hasher = hashlib.sha256()
+        elif response.status_code == 206:
+            start = content_range_start(response.headers.get('Content-Range'))
+            if start != offset:
+                # Appending a shifted range would corrupt the file; the next attempt starts over
+                os.remove(part_path)
+                raise IOError(f"Content-Range {response.headers.get('Content-Range')!r} of {item['name']} "
+                              f"does not start at byte {offset}")
+        elif response.status_code != 200:
+            raise IOError(f"HTTP {response.status_code} downloading {item['name']}")
+
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                run_off_hub(write_chunk, f, hasher, chunk)
+                if on_progress:
+                    on_progress(len(chunk))
+
+    size = os.path.getsize(part_path)
+    if size != item['size']:
+        raise IOError(f"Incomplete download of {item['name']}: {size} of {item['size']} bytes")
+    os.replace(part_path, path)
+    checksum = hasher.hexdigest()
+    with open(path + '.sha256', 'w') as f:
+        f.write(f"{checksum}  {item['name']}\n")
+    return checksum
+
+class CameraProgress:
+    """
+    Transfer counters for one camera's offload.
+    """
+
+    def __init__(self, files):
+        self.files_total = len(files)
+        self.files_done = 0
+        self.bytes_total = sum(item['size'] for item in files)
+        self.bytes_done = 0
+        self.errors = []
+
+    def snapshot(self, elapsed):
+        return {
+            'files_total': self.files_total,
+            'files_done': self.files_done,
+            'bytes_total': self.bytes_total,
+            'bytes_done': self.bytes_done,
+            'mb_per_second': round(self.bytes_done / 2**20 / elapsed, 2) if elapsed > 0 else 0.0,
+            'errors': list(self.errors),
+        }
+
+class MediaOffloader:
+    """
+    Downloads new media from many GoPros at once.
+
+    Every camera is offloaded in parallel, with at most files_per_camera
+    transfers per camera so a camera's link is kept busy without
+    thrashing its SD card. Files already offloaded in an earlier session
+    are recorded in the state file and skipped.
+
+    Args:
+        fleet (GoProFleet): Fleet whose clients the media is downloaded with.
+        output_dir (str): Directory media is saved under, one folder per camera.
+        files_per_camera (int): Most transfers from the same camera at once.
+    """
+
+    def __init__(self, fleet, output_dir=media_dir, files_per_camera=FILES_PER_CAMERA):
+        self.fleet = fleet
+        self.output_dir = output_dir
+        self.files_per_camera = files_per_camera
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        self.state = self.load_state()
+        self.lock = threading.Lock()
+        self.progress = {}
+        self.started_at = None
+        self.running = False
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_state(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def media_path(self, ip, item):
+        return os.path.join(self.output_dir, camera_dir_name(ip), item['folder'], item['name'])
+
+    def new_media(self, ip, media):
+        offloaded = self.state.get(ip, {})
+        return [item for item in media if f"{item['folder']}/{item['name']}" not in offloaded]
+
+    def offload(self, ips, on_file=None):
+        """
+        Download every camera's new media, blocking until all transfers finish.
+
+        Args:
+            ips (list): IPs of the GoPros to offload.
+            on_file (callable): Called with a dict describing each file as it
+                completes or fails.
+
+        Returns:
+            dict: Final progress per IP.
+        """
+        self.running = True
+        self.started_at = time.monotonic()
+        self.progress = {}
+        try:
+            listings = self.fleet.map(lambda client: client.media_list(), ips, default=False)
+            queues = {}
+            for ip, media in listings.items():
+                queues[ip] = self.new_media(ip, media) if media is not False else []
+                self.progress[ip] = CameraProgress(queues[ip])
+                if media is False:
+                    self.progress[ip].errors.append('Could not list media')
+
+            workers = [(ip, queues[ip]) for ip in ips for _ in range(min(self.files_per_camera, len(queues[ip])))]
+            if workers:
+                with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+                    wait([executor.submit(self.drain, ip, queue, on_file) for ip, queue in workers])
+            return self.snapshot()
+        finally:
+            self.running = False
+
+    def drain(self, ip, queue, on_file):
+        # Workers for the same camera share its queue, so each takes the next file as it frees up
+        while True:
+            with self.lock:
+                if not queue:
+                    return
+                item = queue.pop(0)
+            result = self.download(ip, item)
+            if on_file:
+                on_file(result)
+
+    def download(self, ip, item):
+        progress = self.progress[ip]
+        path = self.media_path(ip, item)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        received = 0
+        def on_progress(count):
+            nonlocal received
+            received += count
+            with self.lock:
+                progress.bytes_done += count
+
+        result = {'ip': ip, 'folder': item['folder'], 'name': item['name'], 'path': path, 'size': item['size']}
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                checksum = download_media(self.fleet.client(ip), item, path, on_progress)
+                break
+            except Exception as e:
+                print(f"Error downloading {item['name']} from {ip} (attempt {attempt}): {e}", flush=True)
+                # Resumed attempts report the bytes already on disk again
+                with self.lock:
+                    progress.bytes_done -= received
+                received = 0
+        else:
+            progress.errors.append(item['name'])
+            return {**result, 'error': 'Download failed'}
+
+        with self.lock:
+            progress.files_done += 1
+            self.state.setdefault(ip, {})[f"{item['folder']}/{item['name']}"] = {
+                'path': path, 'size': item['size'], 'sha256': checksum, 'offloaded_at': time.time(),
+            }
+            self.save_state()
+        return {**result, 'sha256': checksum}
+
+    def snapshot(self):
+        """
+        Return the transfer progress of every camera in the current or last offload.
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {ip: progress.snapshot(elapsed) for ip, progress in self.progress.items()}
@@ -0,0 +1,28 @@
+from eventlet import tpool
+from eventlet.patcher import is_monkey_patched, original
+
+# The app monkey-patches the standard library for eventlet. Work that must never
+# run on, or wait for, the hub (audio capture and encoding, manifest writes,
+# ffmpeg supervision and decoding) uses these unpatched modules for its OS
+# threads, locks, queues, clocks and subprocesses. So does any state shared with
+# such a thread: a patched lock would block an OS thread forever if a greenlet
+# held it, so those locks are real ones and no critical section yields.
+os_threading = original('threading')
+os_time = original('time')
+os_queue = original('queue')
+os_subprocess = original('subprocess')
+
+def run_off_hub(func, *args):
+    """
+    Run a blocking call so it doesn't stall the eventlet hub.
+
+    Under the app's monkey-patching the call goes to eventlet's pool of OS
+    threads and only the calling greenlet waits for it. Without patching the
+    caller is already a real thread and the call runs in place.
+
+    Returns:
+        The call's result.
+    """
+    if is_monkey_patched('thread'):
+        return tpool.execute(func, *args)
+    return func(*args)
@@ -0,0 +1,136 @@
+import os
+import shutil
+import ffmpeg
+from config import hls_dir
+from gopro_utils import TIMEOUT_STATUS
+from stream_supervisor import StreamSupervisor
+
+# First UDP port a camera's webcam stream is sent to; each camera gets the next one
+BASE_PORT = 8554
+# Seconds of video per HLS segment and number of segments kept on disk per camera
+HLS_SEGMENT_SECONDS = 1
+HLS_LIST_SIZE = 4
+
+def camera_dir_name(ip):
+    return ip.replace(':', '_').replace('.', '_')
+
+def build_remux_command(port, playlist_path):
+    """
+    Build the ffmpeg command that remuxes a camera's MPEG-TS UDP stream into HLS.
+
+    The video is copied, not transcoded, so each process costs little CPU.
+
+    Args:
+        port (int): UDP port the camera streams to.
+        playlist_path (str): Path of the HLS playlist to write.
+
+    Returns:
+        list: The ffmpeg command line.
+    """
+    segment_path = os.path.join(os.path.dirname(playlist_path), 'segment_%05d.ts')
+    stream = ffmpeg.input(
+        f'udp://0.0.0.0:{port}?overrun_nonfatal=1&fifo_size=1000000',
+        format='mpegts', fflags='nobuffer',
+    ).output(
+        playlist_path,
+        format='hls',
+        c='copy',
+        hls_time=HLS_SEGMENT_SECONDS,
+        hls_list_size=HLS_LIST_SIZE,
+        # Delete segments that fall out of the playlist so disk use stays bounded
+        hls_flags='delete_segments+independent_segments+omit_endlist',
+        hls_segment_filename=segment_path,
+    )
+    return stream.overwrite_output().global_args('-loglevel', 'error', '-nostdin').compile()
+
+class PreviewManager:
+    """
+    Runs the live HLS preview for each selected GoPro.
+
+    Each camera streams MPEG-TS over UDP to its own port, and one ffmpeg
+    process per camera remuxes it into HLS segments under hls_dir. The
+    processes are owned by a StreamSupervisor, which restarts them if they
+    exit or stop writing the playlist.
+
+    Args:
+        fleet (GoProFleet): Fleet used to start and stop the webcam streams.
+        output_dir (str): Directory the HLS playlists and segments are written to.
+        supervisor (StreamSupervisor): Supervisor running the remux processes.
+    """
+
+    def __init__(self, fleet, output_dir=hls_dir, supervisor=None):
+        self.fleet = fleet
+        self.output_dir = output_dir
+        self.supervisor = supervisor or StreamSupervisor()
+        self.ports = {}
+
+    def port_for(self, ip):
+        if ip not in self.ports:
+            used = set(self.ports.values())
+            port = BASE_PORT
+            while port in used:
+                port += 1
+            self.ports[ip] = port
+        return self.ports[ip]
+
+    def playlist_url(self, ip):
+        return f'/hls/{camera_dir_name(ip)}/index.m3u8'
+
+    def playlist_path(self, ip):
+        return os.path.join(self.output_dir, camera_dir_name(ip), 'index.m3u8')
+
+    def stream_name(self, ip):
+        return f'preview:{ip}'
+
+    def start(self, ip):
+        """
+        Start the remux process and the camera's webcam stream.
+
+        Args:
+            ip (str): The IP address of the GoPro.
+
+        Returns:
+            dict: The camera's IP, UDP port, playlist URL and webcam start status.
+        """
+        port = self.port_for(ip)
+        if self.stream_name(ip) not in self.supervisor.workers:
+            playlist_path = self.playlist_path(ip)
+            camera_dir = os.path.dirname(playlist_path)
+            shutil.rmtree(camera_dir, ignore_errors=True)
+            os.makedirs(camera_dir)
+            # Listen before the camera starts sending so the first keyframe isn't missed
+            command = build_remux_command(port, playlist_path)
+            self.supervisor.start(self.stream_name(ip), command, watch_path=playlist_path)
+            print(f"Preview remux for {ip} listening on UDP port {port}", flush=True)
+
+        status = self.fleet.client(ip).start_webcam(port)
+        return {'ip': ip, 'port': port, 'url': self.playlist_url(ip), 'status': status}
+
+    def stop(self, ip):
+        """
+        Stop the camera's webcam stream and its remux process.
+
+        Args:
+            ip (str): The IP address of the GoPro.
+        """
+        self.fleet.client(ip).stop_webcam()
+        self.supervisor.stop(self.stream_name(ip))
+        shutil.rmtree(os.path.join(self.output_dir, camera_dir_name(ip)), ignore_errors=True)
+
+    def start_all(self, ips):
+        # Assign ports up front so the parallel starts don't race for them
+        for ip in ips:
+            self.port_for(ip)
+        results = self.fleet.map(lambda client: self.start(client.ip), ips, default=None)
+        return [result or {'ip': ip, 'port': self.ports[ip], 'url': self.playlist_url(ip), 'status': TIMEOUT_STATUS}
+                for ip, result in results.items()]
+
+    def stop_all(self, ips=None):
+        ips = self.previewing() if ips is None else ips
+        self.fleet.map(lambda client: self.stop(client.ip), ips, default=None)
+
+    def previewing(self):
+        return [ip for ip in self.ports if self.stream_name(ip) in self.supervisor.workers]
+
+    def active(self):
+        return [ip for ip in self.previewing() if self.supervisor.is_running(self.stream_name(ip))]
@@ -0,0 +1,156 @@
+import datetime
+import json
+import os
+from config import sessions_dir
+from os_threads import os_queue, os_threading, os_time
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+def clock_pair():
+    """
+    Read the monotonic and wall clocks back to back.
+
+    Returns:
+        dict: 'monotonic' and 'wall' (Unix time) in seconds.
+    """
+    return {'monotonic': os_time.monotonic(), 'wall': os_time.time()}
+
+class RecordingSession:
+    """
+    One recording session: every camera and audio track started while it is open.
+
+    Events are appended to the session's JSON Lines manifest. Each line holds
+    the event name, the monotonic and wall time it was recorded at, and the
+    event's fields. Times inside the fields are monotonic, the clock used for
+    shutter acks and audio samples, and the first line stores a clock pair
+    for converting them to wall time.
+
+    Args:
+        session_id (str): Name of the session and of its directory.
+        path (str): Path of the manifest file.
+        writes (Queue): Queue of (path, event) pairs drained by the writer thread.
+    """
+
+    def __init__(self, session_id, path, writes):
+        self.id = session_id
+        self.path = path
+        self.writes = writes
+        self.reference = clock_pair()
+
+    def record(self, event, **fields):
+        """
+        Append an event to the manifest.
+
+        Args:
+            event (str): Name of the event, e.g. 'shutter_start'.
+            **fields: JSON-serializable details of the event.
+        """
+        self.writes.put((self.path, {'event': event, **clock_pair(), **fields}))
+
+class SessionManager:
+    """
+    Opens a session when the first track starts and closes it when the last one stops.
+
+    Tracks are named by what records them, e.g. 'cameras' and 'audio', so
+    cameras and audio started in either order share one session.
+
+    Args:
+        output_dir (str): Directory the session directories are created in.
+    """
+
+    def __init__(self, output_dir=sessions_dir):
+        self.output_dir = output_dir
+        self.current = None
+        self.tracks = set()
+        self.writes = os_queue.Queue()
+        self.writer = None
+
+    def begin(self, track):
+        """
+        Mark a track as recording, opening a new session if none is open.
+
+        Args:
+            track (str): Name of the track.
+
+        Returns:
+            RecordingSession: The open session.
+        """
+        if self.writer is None:
+            self.writer = os_threading.Thread(target=self.write_loop, daemon=True)
+            self.writer.start()
+        if self.current is None:
+            session_id = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            path = os.path.join(self.output_dir, session_id, MANIFEST_FILE)
+            self.current = RecordingSession(session_id, path, self.writes)
+            self.current.record('session_started', reference=self.current.reference)
+        self.tracks.add(track)
+        return self.current
+
+    def end(self, track):
+        """
+        Mark a track as stopped, closing the session once no track is recording.
+
+        Args:
+            track (str): Name of the track.
+
+        Returns:
+            RecordingSession: The session the track belonged to, or None if none was open.
+        """
+        session = self.current
+        self.tracks.discard(track)
+        if session is not None and not self.tracks:
+            session.record('session_stopped')
+            self.current = None
+        return session
+
+    def write_loop(self):
+        while True:
+            path, event = self.writes.get()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'a') as f:
+                    f.write(json.dumps(event) + '\n')
+            except Exception as e:
+                print(f"Error writing session manifest {path}: {e}", flush=True)
+            finally:
+                self.writes.task_done()
+
+    def flush(self, timeout=5):
+        """
+        Wait until every recorded event has been written. Meant for tests and shutdown.
+        """
+        deadline = os_time.monotonic() + timeout
+        while self.writes.unfinished_tasks:
+            if os_time.monotonic() > deadline:
+                return False
+            os_time.sleep(0.01)
+        return True
+
+def load_manifest(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def track_offsets(events):
+    """
+    Work out where each camera and audio track starts relative to the session's first one.
+
+    Cameras start when their shutter start was acknowledged and audio tracks
+    at their first sample, all on the monotonic clock.
+
+    Args:
+        events (list): Events loaded from a session manifest.
+
+    Returns:
+        dict: Seconds from the earliest track start, keyed by 'camera:<ip>'
+        or 'audio:<device_index>'.
+    """
+    starts = {}
+    for event in events:
+        if event['event'] == 'shutter_start' and event.get('acked') is not None:
+            starts[f"camera:{event['ip']}"] = event['acked']
+        elif event['event'] == 'audio_stop' and event.get('first_sample') is not None:
+            starts[f"audio:{event['device_index']}"] = event['first_sample']
+    if not starts:
+        return {}
+    origin = min(starts.values())
+    return {track: start - origin for track, start in starts.items()}
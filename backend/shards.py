@@ -0,0 +1,401 @@
+import importlib
+import itertools
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from gopro_utils import (COMMAND_TIMEOUT, RELEASE_TIMEOUT, STATUS_TIMEOUT, TIMEOUT_STATUS, GoProFleet,
+                         shutter_skew)
+from health import CLOSED, OPEN
+from metrics import CAMERA_REQUEST_ERRORS, CAMERA_REQUEST_SECONDS, FLEET_SWEEP_SECONDS, registry
+
+# Worker processes the cameras' HTTP I/O is split across; 0 keeps every camera in the app process
+CAMERA_SHARDS = int(os.getenv("CAMERA_SHARDS", "0"))
+# Seconds the app waits for a shard beyond the call's own deadline, covering the pipe round trip
+SHARD_MARGIN = 1
+# Seconds ahead of now that every shard is told to release a synchronized start,
+# enough for the request to reach all of them
+RELEASE_DELAY = 0.05
+# Fleet methods a shard runs on request with its own share of the IPs
+SHARD_METHODS = ('status', 'settings', 'reconcile_settings', 'health', 'set_ips')
+# Seconds between the camera request metrics a shard sends to the app, merged into its /metrics
+METRICS_RELAY_INTERVAL = 2
+# Metrics recorded in the shards rather than the app
+RELAYED_METRICS = (CAMERA_REQUEST_SECONDS.name, CAMERA_REQUEST_ERRORS.name)
+
+def shard_of(ip, shards):
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(ip.encode()) % shards
+
+def partition(ips, shards):
+    """
+    Split IPs by owning shard. A camera always lands on the same shard, so its
+    pooled connections and health history survive changes to the camera list.
+
+    Returns:
+        dict: Shard index to the list of its IPs, in the order given.
+    """
+    parts = {}
+    for ip in ips:
+        parts.setdefault(shard_of(ip, shards), []).append(ip)
+    return parts
+
+def function_name(func):
+    """
+    Return 'module:qualname' for a function a worker can import, or None for lambdas and closures.
+    """
+    module = getattr(func, '__module__', None)
+    qualname = getattr(func, '__qualname__', '<unknown>')
+    if not module or module == '__main__' or '<' in qualname:
+        return None
+    return f'{module}:{qualname}'
+
+def resolve(name):
+    module, qualname = name.split(':')
+    target = importlib.import_module(module)
+    for attribute in qualname.split('.'):
+        target = getattr(target, attribute)
+    return target
+
+class ShardWorker:
+    """
+    The worker side of a shard: runs fleet calls for its cameras as requests arrive on stdin.
+
+    Requests and replies are JSON lines. Every request is handled on its own
+    thread, so a slow arm doesn't hold up status polls. Per-camera results
+    are streamed back as 'item' messages and every request ends with a
+    'done' message carrying its result or error. Camera request metrics are
+    sent every METRICS_RELAY_INTERVAL seconds as 'metrics' messages.
+
+    Args:
+        output (file): Where replies are written, the pipe back to the app.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.lock = threading.Lock()
+        self.fleet = GoProFleet()
+        # Lets the app invalidate its cached state of cameras this shard wrote to
+        self.fleet.write_listeners.append(lambda ip: self.send({'write': ip}))
+
+    def send(self, message):
+        with self.lock:
+            self.output.write(json.dumps(message) + '\n')
+            self.output.flush()
+
+    def handle(self, request):
+        request_id = request['id']
+        result, error = None, None
+        try:
+            if request['op'] == 'iter_results':
+                for ip, item in self.fleet.iter_results(resolve(request['func']), request['ips'],
+                                                        timeout=request['timeout'], default=request['default']):
+                    self.send({'id': request_id, 'item': [ip, item]})
+            elif request['op'] == 'synchronized_start':
+                self.fleet.synchronized_start(request['ips'], timeout=request['timeout'],
+                                              on_result=lambda item: self.send({'id': request_id, 'item': item}),
+                                              release_at=request['release_at'])
+            elif request['method'] in SHARD_METHODS:
+                result = getattr(self.fleet, request['method'])(ips=request['ips'], **request['kwargs'])
+            else:
+                raise ValueError(f"Unknown shard method {request['method']!r}")
+        except Exception as e:
+            error = str(e)
+        self.send({'id': request_id, 'done': True, 'result': result, 'error': error})
+
+    def relay_metrics(self, interval=METRICS_RELAY_INTERVAL):
+        while True:
+            time.sleep(interval)
+            self.send({'metrics': registry.export(RELAYED_METRICS)})
+
+    def run(self, requests):
+        threading.Thread(target=self.relay_metrics, daemon=True).start()
+        for line in requests:
+            threading.Thread(target=self.handle, args=(json.loads(line),), daemon=True).start()
+
+class Shard:
+    """
+    The app side of a shard: a worker process and the requests in flight to it.
+
+    Args:
+        index (int): Position of the shard, used in log messages.
+        on_write (callable): Called with a camera's IP when the worker changed that camera's state.
+    """
+
+    def __init__(self, index, on_write):
+        self.index = index
+        self.on_write = on_write
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        # Request ID to the queue its replies go to, for the current process only
+        self.pending = {}
+        self.process = None
+        self.start()
+
+    def start(self):
+        """
+        Start a worker process, failing the requests still waiting on the one it replaces.
+        """
+        self.fail(self.pending)
+        self.pending = {}
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        threading.Thread(target=self.read, args=(self.process, self.pending), daemon=True).start()
+        print(f"Camera shard {self.index} started with pid {self.process.pid}", flush=True)
+
+    def fail(self, pending):
+        # Called with the lock held; the replies can no longer arrive, so callers
+        # get an error now rather than waiting out their deadline
+        for replies in pending.values():
+            replies.put((self.index, {'done': True, 'result': None, 'error': 'shard exited'}))
+        pending.clear()
+
+    def send(self, request, replies=None):
+        """
+        Send a request to the worker, restarting it first if it died.
+
+        Args:
+            request (dict): The request, without its ID.
+            replies (queue.Queue): Receives (shard index, message) for every reply; None to ignore them.
+        """
+        with self.lock:
+            if self.process.poll() is not None:
+                print(f"Camera shard {self.index} exited with code {self.process.returncode}, restarting",
+                      flush=True)
+                self.start()
+            request_id = next(self.ids)
+            if replies is not None:
+                self.pending[request_id] = replies
+            self.process.stdin.write(json.dumps({'id': request_id, **request}) + '\n')
+            self.process.stdin.flush()
+
+    def read(self, process, pending):
+        for line in process.stdout:
+            message = json.loads(line)
+            if 'write' in message:
+                self.on_write(message['write'])
+                continue
+            if 'metrics' in message:
+                registry.merge(f'shard{self.index}', message['metrics'])
+                continue
+            with self.lock:
+                replies = pending.pop(message['id'], None) if message.get('done') else pending.get(message['id'])
+            if replies is not None:
+                replies.put((self.index, message))
+
+        # The worker is gone; fail whatever it was still working on, unless a restart already did
+        with self.lock:
+            self.fail(pending)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+class ShardedFleet:
+    """
+    A GoProFleet whose camera requests run in worker processes, each owning a share of the cameras.
+
+    Fleet-wide calls are split by shard, sent to every shard at once and
+    merged back into a single result, so callers use it exactly like a
+    GoProFleet. Functions passed to iter_results or map are sent by name;
+    lambdas and closures, which can't be, run in this process on the local
+    fleet, as do single-camera calls through client().
+
+    Args:
+        local (GoProFleet): The app's fleet, which keeps the camera list and local clients.
+        shards (int): Number of worker processes.
+    """
+
+    def __init__(self, local, shards=CAMERA_SHARDS):
+        self.local = local
+        self.write_listeners = local.write_listeners
+        self.shards = [Shard(index, local.notify_write) for index in range(shards)]
+        self.synced_ips = None
+
+    @property
+    def ips(self):
+        return self.local.ips
+
+    def client(self, ip):
+        return self.local.client(ip)
+
+    def set_ips(self, ips):
+        # Shards are told on their next request
+        self.local.set_ips(ips)
+
+    def sync(self):
+        # Let shards close the connections of cameras that were removed
+        if self.synced_ips != self.local.ips:
+            self.synced_ips = list(self.local.ips)
+            parts = partition(self.synced_ips, len(self.shards))
+            for index, shard in enumerate(self.shards):
+                shard.send({'op': 'call', 'method': 'set_ips', 'ips': parts.get(index, []), 'kwargs': {}})
+
+    def fan_out(self, request, ips):
+        """
+        Send a request to every shard owning some of the IPs, each with its share.
+
+        Returns:
+            tuple: The queue the replies arrive on and the number of shards asked.
+        """
+        self.sync()
+        replies = queue.Queue()
+        parts = partition(ips, len(self.shards))
+        for index, part in parts.items():
+            self.shards[index].send({**request, 'ips': part}, replies)
+        return replies, len(parts)
+
+    def collect(self, replies, count, timeout):
+        """
+        Yield reply messages until every shard is done or the deadline passes.
+        """
+        deadline = time.monotonic() + timeout + SHARD_MARGIN
+        done = 0
+        while done < count:
+            try:
+                index, message = replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                print(f"Timed out waiting for {count - done} camera shards", flush=True)
+                return
+            if message.get('error'):
+                print(f"Error in camera shard {index}: {message['error']}", flush=True)
+            if message.get('done'):
+                done += 1
+            yield message
+
+    def call(self, method, ips, deadline, **kwargs):
+        """
+        Run a fleet method on every shard owning some of the IPs.
+
+        Args:
+            method (str): Name of the GoProFleet method, one of SHARD_METHODS.
+            ips (list): IPs to run it for.
+            deadline (float): Seconds to wait for the shards.
+            **kwargs: Further arguments of the method.
+
+        Returns:
+            list: Each answering shard's result.
+        """
+        replies, count = self.fan_out({'op': 'call', 'method': method, 'kwargs': kwargs}, ips)
+        return [message['result'] for message in self.collect(replies, count, deadline)
+                if message.get('done') and message['result'] is not None]
+
+    def iter_results(self, func, ips=None, timeout=COMMAND_TIMEOUT, default=TIMEOUT_STATUS):
+        ips = self.ips if ips is None else ips
+        name = function_name(func)
+        if name is None:
+            yield from self.local.iter_results(func, ips, timeout=timeout, default=default)
+            return
+
+        replies, count = self.fan_out({'op': 'iter_results', 'func': name, 'timeout': timeout,
+                                       'default': default}, ips)
+        answered = set()
+        for message in self.collect(replies, count, timeout):
+            if 'item' in message:
+                ip, result = message['item']
+                answered.add(ip)
+                yield ip, result
+        for ip in ips:
+            if ip not in answered:
+                print(f"Timed out waiting for {ip}", flush=True)
+                yield ip, default
+
+    def map(self, func, ips=None, timeout=COMMAND_TIMEOUT, default=TIMEOUT_STATUS):
+        ips = self.ips if ips is None else ips
+        results = dict(self.iter_results(func, ips, timeout=timeout, default=default))
+        return {ip: results[ip] for ip in ips}
+
+    def status(self, ips=None, timeout=STATUS_TIMEOUT):
+        ips = self.ips if ips is None else ips
+        with FLEET_SWEEP_SECONDS.time('status'):
+            statuses = {status['ip']: status for result in self.call('status', ips, timeout, timeout=timeout)
+                        for status in result}
+        return [statuses.get(ip, {'ip': ip, 'status': 400}) for ip in ips]
+
+    def settings(self, ips=None, timeout=COMMAND_TIMEOUT):
+        ips = self.ips if ips is None else ips
+        merged = {}
+        with FLEET_SWEEP_SECONDS.time('settings'):
+            for result in self.call('settings', ips, timeout, timeout=timeout):
+                merged.update(result)
+        return {ip: merged.get(ip, False) for ip in ips}
+
+    def reconcile_settings(self, desired, ips=None, timeout=COMMAND_TIMEOUT):
+        ips = self.ips if ips is None else ips
+        merged = {}
+        for result in self.call('reconcile_settings', ips, timeout * (len(desired) + 2),
+                                desired=[dict(setting) for setting in desired], timeout=timeout):
+            merged.update(result)
+        return {ip: merged.get(ip) for ip in ips}
+
+    def health(self, ips=None):
+        """
+        Return every camera's health as seen by its shard, with the app process's own view added.
+
+        Previews and offloads reach cameras through clients in the app process,
+        whose breakers are separate from the shard's. Their snapshot is included
+        as 'app', and 'state' is the worse of the two.
+        """
+        ips = self.ips if ips is None else ips
+        snapshots = {snapshot['ip']: snapshot for result in self.call('health', ips, STATUS_TIMEOUT)
+                     for snapshot in result}
+        merged = []
+        for ip in ips:
+            snapshot = snapshots.get(ip)
+            local = self.local.clients.get(ip)
+            if local is not None:
+                app = local.health.snapshot()
+                if snapshot is None:
+                    snapshot = {**app, 'app': app}
+                else:
+                    snapshot = {**snapshot, 'app': app}
+                    if app['state'] == OPEN or snapshot['state'] == CLOSED:
+                        snapshot['state'] = app['state']
+            if snapshot is not None:
+                merged.append(snapshot)
+        return merged
+
+    def synchronized_start(self, ips, timeout=COMMAND_TIMEOUT, on_result=None):
+        """
+        Start recording on already-armed cameras in every shard at the same moment.
+
+        Each shard holds its requests until a shared monotonic release time,
+        which all processes on the machine read from the same clock.
+        """
+        ips = list(ips)
+        if not ips:
+            return [], {'send_ms': 0.0, 'ack_ms': 0.0}
+
+        replies, count = self.fan_out({'op': 'synchronized_start', 'timeout': timeout,
+                                       'release_at': time.monotonic() + RELEASE_DELAY}, ips)
+        responses = []
+        with FLEET_SWEEP_SECONDS.time('synchronized_start'):
+            for message in self.collect(replies, count, RELEASE_DELAY + RELEASE_TIMEOUT + timeout):
+                if 'item' in message:
+                    responses.append(message['item'])
+                    if on_result:
+                        on_result(responses[-1])
+        answered = {response['ip'] for response in responses}
+        for ip in ips:
+            if ip not in answered:
+                responses.append({'ip': ip, 'response': TIMEOUT_STATUS, 'sent': None, 'acked': None})
+                if on_result:
+                    on_result(responses[-1])
+        return responses, shutter_skew(responses)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+if __name__ == "__main__":
+    # Replies go over the original stdout; everything the fleet prints goes to stderr
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    from config import config_store
+    # Follow settings edits for arm_camera, like the app does
+    threading.Thread(target=config_store.watch, daemon=True).start()
+    ShardWorker(replies).run(sys.stdin)
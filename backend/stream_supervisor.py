@@ -0,0 +1,264 @@
+import os
+from os_threads import os_subprocess, os_threading, os_time
+
+# Most ffmpeg processes run at once; further streams wait for a free slot
+MAX_PROCESSES = int(os.getenv("MAX_STREAM_PROCESSES", "32"))
+# Seconds before the first restart of a failed process, doubling up to MAX_BACKOFF
+RESTART_BACKOFF = 1
+MAX_BACKOFF = 30
+# A process that stays up this long has its backoff reset
+STABLE_SECONDS = 10
+# A process whose watched output file hasn't changed for this long is restarted
+STALL_SECONDS = 10
+# Seconds between supervisor passes and between CPU/RSS samples
+SUPERVISE_INTERVAL = 0.2
+SAMPLE_INTERVAL = 2
+# Seconds a stopped process gets to exit after SIGTERM before it is killed
+STOP_TIMEOUT = 5
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def read_process_usage(pid):
+    """
+    Read a process's total CPU seconds and resident memory from /proc.
+
+    Returns:
+        tuple: (cpu_seconds, rss_bytes), or None where /proc isn't available.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # The command name may contain spaces, so split after its closing parenthesis
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss_pages * PAGE_SIZE
+
+class StreamWorker:
+    """
+    One supervised ffmpeg process and its restart and resource history.
+
+    Args:
+        name (str): Unique name of the stream, e.g. 'preview:<ip>'.
+        command (list): Command line of the process.
+        watch_path (str): File the process keeps writing; if it stops changing
+            for STALL_SECONDS the process is considered stuck and restarted.
+    """
+
+    def __init__(self, name, command, watch_path=None):
+        self.name = name
+        self.command = command
+        self.watch_path = watch_path
+        self.process = None
+        self.started_at = None
+        self.next_start = 0.0
+        self.backoff = RESTART_BACKOFF
+        self.restarts = 0
+        self.last_exit = None
+        self.cpu_percent = None
+        self.rss_bytes = None
+        self.cpu_seconds = None
+        self.sampled_at = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stalled(self, now):
+        if self.watch_path is None or now - self.started_at < STALL_SECONDS:
+            return False
+        try:
+            modified = os.path.getmtime(self.watch_path)
+        except OSError:
+            # Nothing written since start
+            return True
+        return os_time.time() - modified > STALL_SECONDS
+
+    def sample(self, now):
+        usage = read_process_usage(self.process.pid)
+        if usage is None:
+            return
+        cpu_seconds, self.rss_bytes = usage
+        if self.cpu_seconds is not None and now > self.sampled_at:
+            self.cpu_percent = (cpu_seconds - self.cpu_seconds) / (now - self.sampled_at) * 100
+        self.cpu_seconds, self.sampled_at = cpu_seconds, now
+
+    def reset_sample(self):
+        self.cpu_percent = self.rss_bytes = self.cpu_seconds = self.sampled_at = None
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'pid': self.process.pid if self.running else None,
+            'running': self.running,
+            'restarts': self.restarts,
+            'last_exit': self.last_exit,
+            'cpu_percent': None if self.cpu_percent is None else round(self.cpu_percent, 1),
+            'rss_mb': None if self.rss_bytes is None else round(self.rss_bytes / 2**20, 1),
+        }
+
+class StreamSupervisor:
+    """
+    Owns the long-running ffmpeg processes of the camera streams.
+
+    Processes that exit or stall are restarted with exponential backoff, at
+    most max_processes run at once, and each one's CPU and RSS are sampled
+    every SAMPLE_INTERVAL seconds. All waiting and killing happens on the
+    supervisor's OS thread, so socket handlers only ever register or
+    unregister streams and return at once.
+
+    Args:
+        max_processes (int): Most processes allowed to run at the same time.
+    """
+
+    def __init__(self, max_processes=MAX_PROCESSES):
+        self.max_processes = max_processes
+        self.workers = {}
+        # Processes sent SIGTERM, as (process, kill deadline), until they are reaped
+        self.stopping = []
+        self.lock = os_threading.Lock()
+        self.wakeup = os_threading.Event()
+        self.thread = None
+        self.last_sample = 0.0
+
+    def ensure_running(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = os_threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def start(self, name, command, watch_path=None):
+        """
+        Register a stream and start its process as soon as a slot is free.
+
+        Args:
+            name (str): Unique name of the stream. A stream already running
+                under this name is left as it is.
+            command (list): Command line of the process.
+            watch_path (str): File whose modification time shows the process
+                is making progress.
+
+        Returns:
+            StreamWorker: The stream's worker.
+        """
+        self.ensure_running()
+        with self.lock:
+            worker = self.workers.get(name)
+            if worker is None:
+                worker = self.workers[name] = StreamWorker(name, command, watch_path)
+            # Start at once if there's room, so callers can rely on the process listening
+            now = os_time.monotonic()
+            if worker.process is None and now >= worker.next_start and self.running_count() < self.max_processes:
+                self.launch(worker, now)
+        return worker
+
+    def stop(self, name):
+        """
+        Unregister a stream and terminate its process.
+
+        Args:
+            name (str): Name of the stream.
+        """
+        with self.lock:
+            worker = self.workers.pop(name, None)
+            if worker is not None and worker.running:
+                self.terminate(worker.process)
+        self.wakeup.set()
+
+    def stop_all(self):
+        for name in list(self.workers):
+            self.stop(name)
+
+    def is_running(self, name):
+        worker = self.workers.get(name)
+        return worker is not None and worker.running
+
+    def running_count(self):
+        return sum(worker.running for worker in self.workers.values())
+
+    def launch(self, worker, now):
+        try:
+            worker.process = os_subprocess.Popen(worker.command, stdin=os_subprocess.DEVNULL)
+        except OSError as e:
+            print(f"Error starting stream {worker.name}: {e}", flush=True)
+            worker.process = None
+            self.schedule_restart(worker, now)
+            return
+        worker.started_at = now
+        worker.reset_sample()
+        print(f"Stream {worker.name} started (pid {worker.process.pid})", flush=True)
+
+    def terminate(self, process):
+        process.terminate()
+        self.stopping.append((process, os_time.monotonic() + STOP_TIMEOUT))
+
+    def schedule_restart(self, worker, now):
+        worker.restarts += 1
+        worker.next_start = now + worker.backoff
+        print(f"Stream {worker.name} restarting in {worker.backoff}s", flush=True)
+        worker.backoff = min(worker.backoff * 2, MAX_BACKOFF)
+
+    def supervise(self):
+        """
+        Reap stopped processes, restart failed or stalled ones and fill free slots.
+        """
+        now = os_time.monotonic()
+        with self.lock:
+            for process, deadline in list(self.stopping):
+                if process.poll() is not None:
+                    self.stopping.remove((process, deadline))
+                elif now >= deadline:
+                    process.kill()
+
+            for worker in self.workers.values():
+                if worker.process is None:
+                    continue
+                if worker.running and worker.stalled(now):
+                    print(f"Stream {worker.name} stalled, killing it", flush=True)
+                    worker.process.kill()
+                    worker.process.wait()
+                if not worker.running:
+                    worker.last_exit = worker.process.returncode
+                    print(f"Stream {worker.name} exited with code {worker.last_exit}", flush=True)
+                    worker.process = None
+                    worker.reset_sample()
+                    if now - worker.started_at >= STABLE_SECONDS:
+                        worker.backoff = RESTART_BACKOFF
+                    self.schedule_restart(worker, now)
+                elif now - worker.started_at >= STABLE_SECONDS:
+                    worker.backoff = RESTART_BACKOFF
+
+            # Streams waiting for a slot or a restart start in registration order
+            free = self.max_processes - self.running_count()
+            for worker in self.workers.values():
+                if free <= 0:
+                    break
+                if worker.process is None and now >= worker.next_start:
+                    self.launch(worker, now)
+                    free -= worker.running
+
+            if now - self.last_sample >= SAMPLE_INTERVAL:
+                self.last_sample = now
+                for worker in self.workers.values():
+                    if worker.running:
+                        worker.sample(now)
+
+    def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                self.supervise()
+            except Exception as e:
+                print(f"Error supervising streams: {e}", flush=True)
+            self.wakeup.wait(timeout=SUPERVISE_INTERVAL)
+
+    def stats(self):
+        """
+        Return the state and latest resource sample of every stream.
+
+        Returns:
+            list: name, pid, running, restarts, last_exit, cpu_percent and rss_mb per stream.
+        """
+        with self.lock:
+            return [worker.stats() for worker in self.workers.values()]
@@ -0,0 +1,318 @@
+import math
+import os
+import sqlite3
+import time
+import numpy as np
+from os_threads import os_threading
+
+# GoPro status ids sampled from /gopro/camera/state, by the name used in queries
+TELEMETRY_FIELDS = {
+    'battery_percent': '70',
+    'battery_bars': '2',
+    'system_hot': '6',
+    'too_cold': '85',
+    'sd_remaining_kb': '54',
+    'remaining_video_s': '35',
+    'encoding': '10',
+}
+# Minimum seconds between samples of one camera; faster state polls while recording are skipped
+TELEMETRY_INTERVAL = 5
+# Samples kept per camera: 24 hours at TELEMETRY_INTERVAL, 0.5 MB per camera with the fields above
+TELEMETRY_CAPACITY = 24 * 60 * 60 // TELEMETRY_INTERVAL
+# Default number of points per series returned by a query, and the most a query may ask for
+QUERY_BUCKETS = 300
+MAX_QUERY_BUCKETS = 2000
+
+# SQLite file receiving every sample, off when unset
+TELEMETRY_DB = os.getenv("TELEMETRY_DB")
+# Seconds between writes of buffered samples to the database
+TELEMETRY_FLUSH_INTERVAL = 10
+
+class TelemetryRing:
+    """
+    Fixed-size ring of timestamped samples for one camera, backed by numpy arrays.
+
+    Timestamps are float64 seconds since the epoch and values a float32 row
+    per sample, NaN where the camera didn't report a field. Once full, each
+    new sample overwrites the oldest.
+
+    Args:
+        capacity (int): Number of samples kept.
+        field_count (int): Number of values per sample.
+    """
+
+    def __init__(self, capacity, field_count):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((capacity, field_count), np.nan, dtype=np.float32)
+        self.capacity = capacity
+        # Index the next sample is written to, and number of samples held
+        self.head = 0
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+    @property
+    def last_time(self):
+        return self.times[self.head - 1] if self.count else None
+
+    def append(self, timestamp, row):
+        self.times[self.head] = timestamp
+        self.values[self.head] = row
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, start, end):
+        """
+        Return copies of the samples with start <= time < end, oldest first.
+
+        Returns:
+            tuple: (times, values) arrays.
+        """
+        oldest = (self.head - self.count) % self.capacity
+        # At most two contiguous runs: oldest..end of array, then 0..head
+        order = np.r_[oldest:oldest + self.count] % self.capacity
+        times = self.times[order]
+        first, last = np.searchsorted(times, [start, end])
+        return times[first:last], self.values[order[first:last]]
+
+def downsample(times, values, start, end, buckets):
+    """
+    Reduce samples to at most buckets points with the min, max and mean of each field.
+
+    Buckets without samples are left out, so gaps in the data stay visible.
+
+    Args:
+        times (np.ndarray): Sample times, ascending.
+        values (np.ndarray): One row of field values per sample, NaN where missing.
+        start (float): Start of the window.
+        end (float): End of the window.
+        buckets (int): Number of equal-width buckets the window is split into.
+
+    Returns:
+        tuple: (bucket start times, min, max, mean), each field a column.
+    """
+    width = (end - start) / buckets
+    bucket_index = np.minimum(((times - start) / width).astype(np.int64), buckets - 1)
+    # Index of the first sample of every non-empty bucket
+    boundaries = np.flatnonzero(np.r_[True, bucket_index[1:] != bucket_index[:-1]])
+    present = ~np.isnan(values)
+    counts = np.add.reduceat(present.astype(np.int64), boundaries, axis=0)
+    sums = np.add.reduceat(np.where(present, values, 0), boundaries, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return (start + bucket_index[boundaries] * width,
+            np.fmin.reduceat(values, boundaries, axis=0),
+            np.fmax.reduceat(values, boundaries, axis=0),
+            means)
+
+def to_number(value):
+    # Status values are numbers or booleans; anything else is treated as missing
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+def to_list(column):
+    # NaN isn't valid JSON; missing points become None
+    return [None if np.isnan(value) else round(float(value), 3) for value in column]
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def parse_query(query):
+    """
+    Validate a client's telemetry query into arguments for TelemetryRecorder.query.
+
+    Args:
+        query (dict): Optional 'ips', 'start', 'end', 'buckets' and 'fields'.
+
+    Returns:
+        dict: Keyword arguments for TelemetryRecorder.query.
+
+    Raises:
+        ValueError: If a value has the wrong type or is out of range.
+    """
+    if not isinstance(query, dict):
+        raise ValueError("Telemetry query must be an object")
+    for key in ('ips', 'fields'):
+        value = query.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            raise ValueError(f"'{key}' must be a list of strings")
+    for key in ('start', 'end'):
+        if query.get(key) is not None and not is_number(query[key]):
+            raise ValueError(f"'{key}' must be a number of seconds since the epoch")
+    if query.get('start') is not None and query.get('end') is not None and query['start'] >= query['end']:
+        raise ValueError("'start' must be before 'end'")
+    buckets = query.get('buckets', QUERY_BUCKETS)
+    if not isinstance(buckets, int) or isinstance(buckets, bool) or not 1 <= buckets <= MAX_QUERY_BUCKETS:
+        raise ValueError(f"'buckets' must be an integer from 1 to {MAX_QUERY_BUCKETS}")
+    return {'ips': query.get('ips'), 'start': query.get('start'), 'end': query.get('end'),
+            'buckets': buckets, 'fields': query.get('fields')}
+
+class TelemetryRecorder:
+    """
+    Samples the status fields of every camera's state into per-camera ring buffers.
+
+    Fed by the camera state cache, which already fetches /gopro/camera/state.
+    Memory is bounded by capacity per camera, and queries return min/max/mean
+    series downsampled to a fixed number of points, however long the window.
+    With a database path, samples are also written to SQLite in batches and
+    reloaded on start.
+
+    Args:
+        fields (dict): Field name to GoPro status id.
+        capacity (int): Samples kept per camera.
+        interval (float): Minimum seconds between samples of one camera.
+        db_path (str): SQLite file to persist samples to, or None.
+    """
+
+    def __init__(self, fields=TELEMETRY_FIELDS, capacity=TELEMETRY_CAPACITY, interval=TELEMETRY_INTERVAL,
+                 db_path=TELEMETRY_DB):
+        self.fields = list(fields)
+        self.status_ids = [fields[name] for name in self.fields]
+        self.capacity = capacity
+        self.interval = interval
+        self.rings = {}
+        self.lock = os_threading.Lock()
+        self.running = False
+        # Samples not yet written to the database, as (ip, time, row bytes)
+        self.unflushed = []
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS samples (ip TEXT, time REAL, data BLOB)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS samples_time ON samples (time)')
+            self.load()
+
+    def ring(self, ip):
+        if ip not in self.rings:
+            self.rings[ip] = TelemetryRing(self.capacity, len(self.fields))
+        return self.rings[ip]
+
+    def record_state(self, ip, state, timestamp=None):
+        """
+        Sample the status fields of a camera state. A state listener of CameraStateCache.
+
+        Args:
+            ip (str): The IP address of the GoPro.
+            state (dict): The camera's /gopro/camera/state response.
+            timestamp (float): Sample time in seconds since the epoch, defaults to now.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        status = state.get('status') or {}
+        row = np.array([to_number(status.get(status_id)) for status_id in self.status_ids], dtype=np.float32)
+        with self.lock:
+            ring = self.ring(ip)
+            if ring.count and timestamp - ring.last_time < self.interval:
+                return
+            ring.append(timestamp, row)
+            if self.db:
+                self.unflushed.append((ip, timestamp, row.tobytes()))
+
+    def latest(self, ip):
+        """
+        Return the most recent sample of a camera as {'time', <field>: value}, or None.
+        """
+        with self.lock:
+            ring = self.rings.get(ip)
+            if not ring or not ring.count:
+                return None
+            index = ring.head - 1
+            return {'time': float(ring.times[index]),
+                    **{name: value for name, value in zip(self.fields, to_list(ring.values[index]))}}
+
+    def select_fields(self, fields=None):
+        """
+        Return the recorded field names among those requested, in the recorder's order.
+
+        Args:
+            fields (list): Field names, defaults to all.
+        """
+        return list(self.fields) if fields is None else [name for name in self.fields if name in fields]
+
+    def query(self, ips=None, start=None, end=None, buckets=QUERY_BUCKETS, fields=None):
+        """
+        Return downsampled telemetry for a time window.
+
+        Args:
+            ips (list): Cameras to include, defaults to every camera with samples.
+            start (float): Window start in seconds since the epoch, defaults to an hour before end.
+            end (float): Window end, defaults to now.
+            buckets (int): Maximum points per series.
+            fields (list): Field names to include, defaults to all.
+
+        Returns:
+            dict: Per IP, 'time' with the start of each point and per field
+            'min', 'max' and 'mean' lists aligned with it.
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        names = self.select_fields(fields)
+        columns = [self.fields.index(name) for name in names]
+        with self.lock:
+            ips = list(self.rings) if ips is None else ips
+            windows = {ip: self.rings[ip].window(start, end) for ip in ips if ip in self.rings}
+
+        series = {}
+        for ip, (times, values) in windows.items():
+            if not len(times):
+                series[ip] = {'time': [], **{name: {'min': [], 'max': [], 'mean': []} for name in names}}
+                continue
+            bucket_times, minimum, maximum, mean = downsample(times, values[:, columns], start, end, buckets)
+            series[ip] = {'time': [round(float(t), 3) for t in bucket_times]}
+            for column, name in enumerate(names):
+                series[ip][name] = {'min': to_list(minimum[:, column]), 'max': to_list(maximum[:, column]),
+                                    'mean': to_list(mean[:, column])}
+        return series
+
+    def memory_bytes(self):
+        with self.lock:
+            return sum(ring.nbytes for ring in self.rings.values())
+
+    def load(self):
+        """
+        Fill the rings with the most recent samples stored in the database.
+        """
+        retention = self.capacity * self.interval
+        rows = self.db.execute('SELECT ip, time, data FROM samples WHERE time >= ? ORDER BY time',
+                               (time.time() - retention,)).fetchall()
+        with self.lock:
+            for ip, timestamp, blob in rows:
+                row = np.frombuffer(blob, dtype=np.float32)
+                if len(row) == len(self.fields):
+                    self.ring(ip).append(timestamp, row)
+        print(f"Loaded {len(rows)} telemetry samples for {len(self.rings)} cameras", flush=True)
+
+    def flush(self):
+        """
+        Write buffered samples to the database and drop ones older than the rings hold.
+
+        Returns:
+            int: Number of samples written.
+        """
+        if not self.db:
+            return 0
+        with self.lock:
+            rows, self.unflushed = self.unflushed, []
+        if rows:
+            with self.db:
+                self.db.executemany('INSERT INTO samples VALUES (?, ?, ?)', rows)
+                self.db.execute('DELETE FROM samples WHERE time < ?',
+                                (time.time() - self.capacity * self.interval,))
+        return len(rows)
+
+    def run(self, interval=TELEMETRY_FLUSH_INTERVAL):
+        """
+        Flush to the database every interval seconds until stop() is called. Meant to run as a background task.
+        """
+        self.running = True
+        while self.running:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error writing telemetry: {e}", flush=True)
+
+    def stop(self):
+        self.running = False
+        if self.db:
+            self.flush()
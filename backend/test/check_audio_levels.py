@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+RATE = 44100
+DURATION = 1
+
+def encode_int24(samples):
+    # Packed little-endian 24-bit samples, the way the recorder receives them
+    values = np.clip(np.round(samples * (1 << 23)), -(1 << 23), (1 << 23) - 1).astype('<i4')
+    return values.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+def check_meter(audio_utils):
+    meter = audio_utils.LevelMeter()
+    sine = 0.5 * np.sin(2 * np.pi * 1000 * np.arange(RATE // 10) / RATE)
+    meter.update(encode_int24(sine))
+    levels = meter.snapshot()
+    print(f"Half-scale sine: RMS {levels['rms_db']} dBFS, peak {levels['peak_db']} dBFS, "
+          f"clipped {levels['clipped']}, {len(levels['preview'])} preview points")
+    assert abs(levels['rms_db'] - 20 * np.log10(0.5 / 2 ** 0.5)) < 0.1 and abs(levels['peak_db'] + 6.0) < 0.1
+    assert levels['clipped'] == 0 and len(levels['preview']) == audio_utils.PREVIEW_POINTS
+    assert all(-0.51 < low <= high < 0.51 for low, high in levels['preview'])
+
+    # A snapshot resets the accumulators, so nothing new reads as silence
+    silent = meter.snapshot()
+    assert silent['rms_db'] is None and silent['peak_db'] is None and silent['clipped'] == 0
+
+    # Levels accumulate over every block since the last snapshot; only full-scale samples count as clipped
+    square = np.where(np.arange(1000) % 2, 1.0, -1.0)
+    meter.update(encode_int24(square))
+    meter.update(encode_int24(np.zeros(1000)))
+    clipped = meter.snapshot()
+    print(f"Full-scale square then silence: RMS {clipped['rms_db']} dBFS, peak {clipped['peak_db']} dBFS, "
+          f"clipped {clipped['clipped']}")
+    assert clipped['clipped'] == 1000 and clipped['peak_db'] == 0.0
+    assert abs(clipped['rms_db'] - 20 * np.log10(0.5 ** 0.5)) < 0.1
+    # The preview shows the latest block, which was silence
+    assert all(point == [0.0, 0.0] for point in clipped['preview'])
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": [], "gopro_settings": []}, f)
+
+    # app monkey-patches the standard library, so audio_utils is imported after it
+    import app
+    import audio_utils
+    audio_utils.AUDIO_DIR = work_dir
+    audio_utils.pyAud.speed = 1
+    try:
+        check_meter(audio_utils)
+
+        # While recording, every client gets each device's levels at the emit rate
+        client = app.socketio.test_client(app.app)
+        client.get_received()
+        client.emit('start_audio', [0, 1])
+        time.sleep(DURATION)
+        client.emit('stop_audio')
+        received = client.get_received()
+        events = [event['args'][0] for event in received if event['name'] == 'audio_levels']
+        last = [(d['device_index'], d['rms_db'], d['peak_db']) for d in events[-1]['devices']]
+        print(f"{len(events)} audio_levels events in {DURATION}s, last (device, RMS, peak): {last}")
+        assert len(events) >= DURATION / app.AUDIO_LEVELS_INTERVAL / 2
+        assert all(sorted(d['device_index'] for d in event['devices']) == [0, 1] for event in events)
+        # The fake devices produce full-range noise, about -4.8 dBFS RMS
+        devices = [d for event in events[1:] for d in event['devices']]
+        assert all(d['rms_db'] is not None and -6 < d['rms_db'] < -3.5 for d in devices)
+        assert all(len(d['preview']) == audio_utils.PREVIEW_POINTS for d in devices)
+
+        # The emitter stops with the recording
+        time.sleep(3 * app.AUDIO_LEVELS_INTERVAL)
+        assert not any(event['name'] == 'audio_levels' for event in client.get_received())
+        print("Audio levels OK")
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+import audio_utils
+
+# Minutes of synthetic 44.1 kHz audio to record, fed at SPEED times real time
+DURATION_MINUTES = int(os.getenv('DURATION_MINUTES', '120'))
+SPEED = float(os.getenv('SPEED', '100'))
+SAMPLES = 10
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+if __name__ == "__main__":
+    audio_utils.AUDIO_DIR = tempfile.mkdtemp()
+    audio_utils.pyAud.speed = SPEED
+    total_frames = DURATION_MINUTES * 60 * audio_utils.RATE
+
+    recorder = audio_utils.AudioRecorder()
+    recorder.start(0)
+
+    print(f"Recording {DURATION_MINUTES} minutes of synthetic audio at {SPEED:g}x")
+    for i in range(1, SAMPLES + 1):
+        while recorder.stream.frames_read < total_frames * i / SAMPLES:
+            time.sleep(0.05)
+        stats = recorder.stats()
+        print(f"  {recorder.stream.frames_read / audio_utils.RATE / 60:6.1f} min, RSS {rss_mb():6.1f} MB, "
+              f"dropped {stats['dropped_frames']}, overruns {stats['overruns']}")
+
+    start = time.perf_counter()
+    filepath = recorder.stop()
+    print(f"Stop latency: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"File size: {os.path.getsize(filepath) / 1024 / 1024:.1f} MB")
+    os.remove(filepath)
+    os.rmdir(audio_utils.AUDIO_DIR)
@@ -0,0 +1,45 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+import audio_utils
+
+# Rotate every 10 s of audio or 1 MB, whichever comes first, fed at 20x real time
+ROTATE_SECONDS = 10
+ROTATE_MEGABYTES = 1
+SPEED = 20
+DURATION = 3
+
+if __name__ == "__main__":
+    audio_utils.AUDIO_DIR = tempfile.mkdtemp()
+    audio_utils.pyAud.speed = SPEED
+
+    recorder = audio_utils.AudioRecorder('wav', rotate_seconds=ROTATE_SECONDS, rotate_megabytes=ROTATE_MEGABYTES)
+    recorder.start(0)
+    time.sleep(DURATION)
+    manifest_path = recorder.stop()
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    next_frame = 0
+    for segment in manifest['segments']:
+        with wave.open(os.path.join(audio_utils.AUDIO_DIR, segment['path'])) as wf:
+            frames = wf.getnframes()
+        print(f"{segment['path']}: start frame {segment['start_frame']:>8}, {frames:>7} frames")
+        assert segment['complete'] and segment['frames'] == frames
+        assert segment['start_frame'] == next_frame
+        next_frame += frames
+
+    assert manifest['complete'] and next_frame == recorder.frames_written
+    print(f"{len(manifest['segments'])} contiguous segments, {next_frame} frames total")
+    shutil.rmtree(audio_utils.AUDIO_DIR)
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from av_sync import align_clips, session_reference
+from session import MANIFEST_FILE
+
+# Minutes of synthetic reference audio; set to 60 to time an hour-long take
+DURATION_MINUTES = float(os.getenv('DURATION_MINUTES', '10'))
+RATE = 44100
+# Known start of each clip relative to the reference, in seconds
+OFFSETS = [12.345, 30.0, -4.2, 95.5]
+CLIP_FRACTION = 0.8
+# Segments the reference is also saved as, the way a rotating recording is
+SEGMENTS = 3
+
+def speech_like(seconds, rng):
+    # Noise gated by random syllable-length bursts, standing in for speech in the room
+    bursts = rng.random(int(seconds * 8)) ** 3
+    envelope = np.repeat(bursts, RATE // 8)[:int(seconds * RATE)]
+    return envelope * rng.standard_normal(len(envelope)) * 0.3
+
+def write_wav(path, samples):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+
+def write_segments(work_dir, samples):
+    # WAV segments next to a manifest in the format of audio_utils.SegmentManifest
+    size = -(-len(samples) // SEGMENTS)
+    segments = []
+    for i in range(SEGMENTS):
+        name = f'take_device0_{i:04d}.wav'
+        write_wav(os.path.join(work_dir, name), samples[i * size:(i + 1) * size])
+        segments.append({'path': name, 'start_frame': i * size,
+                         'frames': len(samples[i * size:(i + 1) * size]), 'complete': True})
+    manifest_path = os.path.join(work_dir, 'take_device0.json')
+    with open(manifest_path, 'w') as f:
+        json.dump({'device_index': 0, 'sample_rate': RATE, 'complete': True, 'segments': segments}, f)
+    return manifest_path
+
+def make_clip(path, reference, offset, seconds, rng):
+    # The camera hears the same room at a different gain, plus its own noise,
+    # and may start before the reference did
+    start = int(offset * RATE)
+    clip = np.zeros(int(seconds * RATE))
+    source = reference[max(start, 0):max(start, 0) + len(clip) - max(-start, 0)]
+    clip[max(-start, 0):max(-start, 0) + len(source)] = source * 0.5
+    clip += rng.standard_normal(len(clip)) * 0.02
+    wav_path = path + '.wav'
+    write_wav(wav_path, clip)
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-y', '-i', wav_path, '-c:a', 'aac', '-b:a', '96k', path], check=True)
+    os.remove(wav_path)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    work_dir = tempfile.mkdtemp()
+    try:
+        seconds = DURATION_MINUTES * 60
+        reference = speech_like(seconds, rng)
+        reference_path = os.path.join(work_dir, 'lavalier.wav')
+        write_wav(reference_path, reference)
+        manifest_path = write_segments(work_dir, reference)
+        clips = []
+        for i, offset in enumerate(OFFSETS):
+            clips.append(os.path.join(work_dir, f'GX01{i:04d}.MP4'))
+            make_clip(clips[-1], reference, offset, seconds * CLIP_FRACTION, rng)
+        del reference
+
+        started = time.monotonic()
+        results = align_clips(reference_path, clips)
+        elapsed = time.monotonic() - started
+
+        print(f"{len(clips)} clips of {seconds * CLIP_FRACTION / 60:.0f} min against a {DURATION_MINUTES:.0f} min reference "
+              f"in {elapsed:.2f}s")
+        for result, expected in zip(results, OFFSETS):
+            error_ms = (result['offset_seconds'] - expected) * 1000
+            print(f"  {os.path.basename(result['clip'])}: {result['offset_seconds']:+9.4f}s "
+                  f"(expected {expected:+9.4f}s, error {error_ms:+6.2f} ms, confidence {result['confidence']})")
+            assert abs(error_ms) < 10
+
+        # A session recorded with rotation names the segment manifest as its audio file
+        session_dir = os.path.join(work_dir, 'session')
+        os.makedirs(session_dir)
+        with open(os.path.join(session_dir, MANIFEST_FILE), 'w') as f:
+            f.write(json.dumps({'event': 'audio_stop', 'device_index': 0, 'filepath': manifest_path}) + '\n')
+        assert session_reference(session_dir) == manifest_path
+        segmented = align_clips(manifest_path, clips[:1])[0]
+        print(f"  against {SEGMENTS} rotated segments: {segmented['offset_seconds']:+9.4f}s")
+        assert abs(segmented['offset_seconds'] - results[0]['offset_seconds']) < 0.01
+    finally:
+        shutil.rmtree(work_dir)
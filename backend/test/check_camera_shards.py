@@ -0,0 +1,115 @@
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProClient, GoProFleet, arm_camera, stop_camera
+from health import OPEN
+from metrics import registry
+from shards import METRICS_RELAY_INTERVAL, ShardedFleet, partition, shard_of
+
+CAMERAS = 24
+SHARDS = 3
+SETTINGS = [{"display_name": "FPS", "setting": "3", "option": "5"}]
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(CAMERAS, latency=0.01, jitter=0.02)
+    ips = [camera.ip for camera in cameras]
+    fleet = ShardedFleet(GoProFleet(ips), SHARDS)
+    writes = []
+    fleet.write_listeners.append(writes.append)
+    try:
+        print(f"Cameras per shard: {sorted(len(part) for part in partition(ips, SHARDS).values())}")
+
+        statuses, ms = timed(fleet.status)
+        print(f"Status of {len(statuses)} cameras across {SHARDS} shards: {ms:.0f} ms")
+        assert [status['ip'] for status in statuses] == ips and all(s['status'] == 200 for s in statuses)
+
+        states, ms = timed(lambda: fleet.map(GoProClient.get_state))
+        print(f"State of every camera: {ms:.0f} ms")
+        assert all(states[ip] for ip in ips)
+
+        reconciled, ms = timed(lambda: fleet.reconcile_settings(SETTINGS))
+        print(f"Settings reconciled: {ms:.0f} ms, all ok: {all(r and r['ok'] for r in reconciled.values())}")
+
+        armed, ms = timed(lambda: dict(fleet.iter_results(arm_camera, ips, default=None)))
+        print(f"Armed: {ms:.0f} ms, {sum(1 for result in armed.values() if result)} cameras")
+
+        streamed = []
+        (fired, skew), ms = timed(lambda: fleet.synchronized_start(ips, on_result=streamed.append))
+        print(f"Synchronized start: {ms:.0f} ms, {sum(r['response'] == 200 for r in fired)} recording, "
+              f"send skew {skew['send_ms']:.1f} ms across shards, {len(streamed)} results streamed")
+        assert len(fired) == CAMERAS and all(r['response'] == 200 for r in fired)
+
+        stopped = fleet.map(stop_camera)
+        assert all(result['response'] == 200 for result in stopped.values())
+        print(f"Write notifications relayed from shards: {len(set(writes))} cameras")
+
+        # The shards' camera request metrics reach this process's registry, and the app times the sweeps
+        time.sleep(METRICS_RELAY_INTERVAL + 0.5)
+        snapshot = registry.snapshot()
+        status_series = {key.split(',')[0] for key in snapshot['gopro_request_seconds']
+                         if key.endswith(',webcam/status')}
+        print(f"Relayed request metrics: {len(snapshot['gopro_request_seconds'])} series, webcam/status for "
+              f"{len(status_series)} cameras; app-side sweeps: "
+              f"{ {op: s['count'] for op, s in snapshot['gopro_fleet_sweep_seconds'].items()} }")
+        assert status_series == set(ips)
+        assert snapshot['gopro_request_seconds'][f'{ips[0]},camera/shutter/start']['count'] == 1
+        assert snapshot['gopro_fleet_sweep_seconds']['status']['count'] == 1
+        assert snapshot['gopro_fleet_sweep_seconds']['synchronized_start']['count'] == 1
+
+        # A breaker tripped in this process, e.g. by a preview, shows up in the fleet's health
+        local = fleet.client(ips[1]).health
+        for _ in range(3):
+            local.record_failure()
+        health = {snapshot['ip']: snapshot for snapshot in fleet.health()}
+        print(f"Health of {ips[1]}: {health[ips[1]]['state']} (app process breaker {health[ips[1]]['app']['state']}), "
+              f"{health[ips[2]]['state']} for an untouched camera")
+        assert health[ips[1]]['state'] == OPEN and health[ips[2]]['state'] != OPEN
+        local.record_success('/gopro/webcam/status', 0.01)
+
+        # Lambdas can't be sent to a worker and run locally instead
+        local = fleet.map(lambda client: client.webcam_status())
+        assert set(local.values()) == {200}
+
+        # A shard that dies is restarted on the next call
+        fleet.shards[0].process.kill()
+        fleet.shards[0].process.wait()
+        statuses = fleet.status()
+        print(f"After killing shard 0: {sum(s['status'] == 200 for s in statuses)} cameras answered")
+        assert all(status['status'] == 200 for status in statuses)
+
+        # Requests in flight to a worker that is replaced before its reader sees it exit fail at once
+        slow_ip = ips[3]
+        shard = fleet.shards[shard_of(slow_ip, SHARDS)]
+        cameras[3].latency = 5
+        replies = queue.Queue()
+        shard.send({'op': 'call', 'method': 'status', 'ips': [slow_ip], 'kwargs': {'timeout': 5}}, replies)
+        time.sleep(0.2)
+        with shard.lock:
+            shard.process.kill()
+            shard.process.wait()
+            shard.start()
+        started = time.perf_counter()
+        index, message = replies.get(timeout=2)
+        print(f"Request to a replaced shard failed after {(time.perf_counter() - started) * 1000:.0f} ms: "
+              f"{message['error']}")
+        assert message['done'] and message['error'] == 'shard exited'
+        cameras[3].latency = 0.01
+
+        # Removed cameras are dropped on every shard
+        fleet.set_ips(ips[:CAMERAS // 2])
+        statuses = fleet.status()
+        print(f"After removing half the cameras: {len(statuses)} statuses, health of {len(fleet.health())} cameras")
+        assert len(statuses) == CAMERAS // 2
+    finally:
+        fleet.close()
+        stop_fake_gopros(cameras)
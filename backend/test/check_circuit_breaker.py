@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import health
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+
+# Longer open period so the status rounds below all fall within it
+health.OPEN_SECONDS = 3
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(4, latency=0.01, jitter=0.01)
+    # The last camera hangs like an unplugged one: every request runs into the timeout
+    dead = cameras[-1]
+    dead.latency = 5
+    try:
+        fleet = GoProFleet([camera.ip for camera in cameras])
+        dead_client = fleet.client(dead.ip)
+
+        for round_number in range(1, 7):
+            statuses, seconds = timed(fleet.status)
+            print(f"Status round {round_number}: {seconds * 1000:7.1f} ms, dead camera circuit "
+                  f"{dead_client.health.state}, statuses {[s['status'] for s in statuses]}")
+
+        calls = 1000
+        _, seconds = timed(lambda: [dead_client.webcam_status() for _ in range(calls)])
+        print(f"Call to open circuit: {seconds / calls * 1e6:.1f} us")
+
+        for _ in range(30):
+            fleet.client(cameras[0].ip).get_state()
+        snapshot = fleet.client(cameras[0].ip).health.snapshot()['latency']['/gopro/camera/state']
+        print(f"Healthy camera state requests: p50 {snapshot['p50_ms']} ms, p99 {snapshot['p99_ms']} ms, "
+              f"adaptive timeout {snapshot['timeout_ms']} ms (requested 5000 ms)")
+        assert snapshot['timeout_ms'] < 5000
+
+        # A slow write after a fast history keeps its full timeout instead of timing out
+        writer = fleet.client(cameras[1].ip)
+        for _ in range(30):
+            writer.set_setting({'setting': '3', 'option': '5'})
+        cameras[1].latency = 0.5
+        status = writer.set_setting({'setting': '2', 'option': '1'})
+        cameras[1].latency = 0.01
+        print(f"Slow setting write after 30 fast ones: {status}, circuit {writer.health.state}, "
+              f"timeout {writer.health.timeout('/gopro/camera/setting', 5)} s")
+        assert status == 200 and writer.health.consecutive_failures == 0
+
+        # Plug the camera back in; the next probe closes the circuit
+        dead.latency = 0.01
+        time.sleep(health.OPEN_SECONDS)
+        print(f"After recovery: status {dead_client.webcam_status()}, circuit {dead_client.health.state}")
+        assert dead_client.health.state == health.CLOSED
+    finally:
+        stop_fake_gopros(cameras)
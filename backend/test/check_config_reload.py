@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+work_dir = tempfile.mkdtemp()
+config_path = os.path.join(work_dir, 'gopro_config.json')
+os.environ['GOPRO_CONFIG_FILE'] = config_path
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+
+SETTINGS = [{"display_name": "FPS", "setting": "3", "option": "5"}]
+READS = 100000
+
+def write_config(text):
+    # Write to a temporary file and rename, like an editor saving, so the watcher never sees half a file
+    with open(config_path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(config_path + '.tmp', config_path)
+
+def write_cameras(cameras):
+    write_config(json.dumps({"gopros": [camera.ip for camera in cameras], "gopro_settings": SETTINGS}))
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(3)
+    write_cameras(cameras[:2])
+
+    import config
+    from gopro_utils import fleet
+    from camera_state import CameraStateCache
+
+    config.config_store.poll_interval = 0.1
+    changes = []
+    config.config_store.subscribe(lambda old, new: changes.append((len(old.gopros), len(new.gopros))))
+    cache = CameraStateCache(fleet, status_ttl=0.2, state_ttl=0.2)
+    config.config_store.subscribe(lambda old, new: cache.sync_cameras())
+    threading.Thread(target=config.config_store.watch, daemon=True).start()
+    threading.Thread(target=cache.run, daemon=True).start()
+    try:
+        print(f"Initial cameras: {len(fleet.ips)}")
+        assert wait_for(lambda: all(status['status'] == 200 for status in cache.get_status()))
+
+        write_cameras(cameras)
+        assert wait_for(lambda: len(fleet.ips) == 3)
+        assert wait_for(lambda: cache.get_status()[-1]['status'] == 200)
+        print(f"Camera added: fleet {len(fleet.ips)}, new camera polled with status {cache.get_status()[-1]['status']}")
+
+        write_config('{"gopros": [')
+        time.sleep(0.5)
+        print(f"Invalid edit ignored: fleet still {len(fleet.ips)} cameras")
+        assert len(fleet.ips) == 3
+
+        # An editor that deletes the file before writing the new one must not empty the rig
+        os.remove(config_path)
+        time.sleep(0.5)
+        print(f"Missing file ignored: fleet still {len(fleet.ips)} cameras, "
+              f"{len(fleet.clients)} pooled clients")
+        assert len(fleet.ips) == 3 and len(fleet.clients) == 3
+
+        write_cameras(cameras[1:])
+        assert wait_for(lambda: len(fleet.ips) == 2)
+        print(f"Camera removed: fleet {len(fleet.ips)}, pooled clients {len(fleet.clients)}, "
+              f"cached entries {len(cache.entries)}")
+        assert cameras[0].ip not in fleet.clients and cameras[0].ip not in cache.entries
+        print(f"Subscriber saw changes (old, new camera counts): {changes}")
+
+        started = time.perf_counter()
+        for _ in range(READS):
+            config.load_gopro_settings()
+        print(f"load_gopro_settings: {(time.perf_counter() - started) / READS * 1e6:.2f} us per call, no disk read")
+    finally:
+        config.config_store.stop()
+        cache.stop()
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+# Loopback stand-in for the 172.2X.1YZ.51 space; Linux answers on all of 127.0.0.0/8
+LOOPBACK_TEMPLATE = '127.2{x}.1{yz:02d}.51'
+SERIAL_SUFFIXES = [(1, 7), (4, 52), (9, 99)]
+# The fleet lists configured cameras before discovered ones, so the check brings its own config
+# rather than depending on whichever config file is next to it
+CONFIGURED = ['172.21.100.51']
+SETTINGS = [{"display_name": "FPS", "setting": "3", "option": "5"}]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def shown_settings(client):
+    client.emit('get_gopro_status')
+    return {event['args'][0]['ip']: event['args'][0]['settings'] for event in client.get_received()
+            if event['name'] == 'gopro_settings'}
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": CONFIGURED, "gopro_settings": SETTINGS}, f)
+
+    # app monkey-patches the standard library, so everything else is imported after it
+    import app
+    import discovery
+    import gopro_utils
+    from fake_gopro import FakeGoPro, stop_fake_gopros
+    # Short cache lifetime so an unplugged camera drops out within the check
+    discovery.DISCOVERY_TTL = 2
+
+    # Discovered cameras are listed without a port, so the fleet reaches them on the fake cameras' port
+    port = free_port()
+    gopro_utils.GOPRO_PORT = port
+    cameras = []
+    for x, yz in SERIAL_SUFFIXES:
+        camera = FakeGoPro(host=LOOPBACK_TEMPLATE.format(x=x, yz=yz), port=port, latency=0.01)
+        camera.start()
+        cameras.append(camera)
+    # A camera that accepts connections but never answers in time
+    hung = FakeGoPro(host=LOOPBACK_TEMPLATE.format(x=5, yz=0), port=port, latency=5)
+    hung.start()
+    try:
+        # The app's scanner probes the loopback space; the check sweeps it instead of the background loop
+        scanner = app.camera_discovery
+        scanner.candidates = discovery.candidate_ips(LOOPBACK_TEMPLATE)
+        scanner.port = port
+        scanner.running = True
+        client = app.socketio.test_client(app.app)
+
+        result = scanner.sweep()
+        print(f"Sweep of {result['probed']} addresses took {result['seconds']}s, found {result['found']}")
+        expected = sorted(camera.server.server_address[0] for camera in cameras)
+        assert result['found'] == expected
+        assert result['seconds'] < 3
+        print(f"Fleet after discovery: {app.fleet.ips}")
+        assert app.fleet.ips == CONFIGURED + expected
+
+        # Discovered cameras get settings entries like configured ones
+        deadline = time.monotonic() + 5
+        settings = shown_settings(client)
+        while not set(expected) <= set(settings) and time.monotonic() < deadline:
+            time.sleep(0.2)
+            settings = shown_settings(client)
+        print(f"Settings shown for: {sorted(settings)}")
+        assert set(expected) <= set(settings)
+        assert all(settings[ip][0]['option'] == 5 for ip in expected)
+
+        # Unplug one camera: it stays listed until its cache entry expires
+        stop_fake_gopros(cameras[:1])
+        result = scanner.sweep()
+        print(f"Camera unplugged: found {len(result['found'])}, still listed {len(result['cameras'])}")
+        assert len(result['cameras']) == 3
+        time.sleep(discovery.DISCOVERY_TTL)
+        result = scanner.sweep()
+        print(f"After expiry: listed {result['cameras']}, fleet {app.fleet.ips}")
+        assert app.fleet.ips == CONFIGURED + expected[1:]
+    finally:
+        app.camera_cache.stop()
+        stop_fake_gopros(cameras[1:] + [hung])
+        shutil.rmtree(work_dir)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+import audio_utils
+from config import parse_config
+
+# 2 s of input fed at 20x real time, encoded in 10 s segments, so the join has several to concatenate
+SEGMENT_SECONDS = 10
+SPEED = 20
+DURATION = 2
+
+def decoded_frames(path):
+    # Decoding the whole file also proves every joined segment is valid FLAC
+    pcm = subprocess.run(['ffmpeg', '-loglevel', 'error', '-i', path, '-f', 's32le', '-ac', '1', '-'],
+                         check=True, capture_output=True).stdout
+    return len(pcm) // 4
+
+if __name__ == "__main__":
+    audio_utils.AUDIO_DIR = tempfile.mkdtemp()
+    audio_utils.pyAud.speed = SPEED
+    try:
+        recorder = audio_utils.AudioRecorder('flac', segment_seconds=SEGMENT_SECONDS, encoder_workers=2)
+        recorder.start(0)
+        time.sleep(DURATION)
+        filepath = recorder.stop()
+        assert recorder.encode_job.done.wait(timeout=30), "Encoding did not finish"
+        assert recorder.encode_job.error is None, recorder.encode_job.error
+        result = recorder.encode_job.result
+        print(f"{recorder.segment_count} segments joined into {os.path.basename(filepath)}: "
+              f"{result['size']} bytes, compression ratio {result['compression_ratio']:.2f}")
+        assert recorder.segment_count > 1 and result['filepath'] == filepath
+
+        with open(filepath, 'rb') as f:
+            assert f.read(4) == b'fLaC'
+        frames = decoded_frames(filepath)
+        print(f"Decoded {frames} frames, recorded {recorder.frames_written}")
+        assert frames == recorder.frames_written
+        # Only the joined file is left behind
+        assert os.listdir(audio_utils.AUDIO_DIR) == [os.path.basename(filepath)]
+
+        # A mistyped format is a config error rather than a silent WAV recording,
+        # and so is rotation with FLAC, which the recorder would silently ignore
+        for audio in ({'format': 'flca'}, {'encoder_workers': 0}, {'rotate_seconds': '60'},
+                      {'format': 'flac', 'rotate_megabytes': 100}):
+            try:
+                parse_config({'audio': audio})
+                raise AssertionError(f"Invalid audio config accepted: {audio}")
+            except ValueError as e:
+                print(f"Rejected: {e}")
+        print("FLAC recording OK")
+    finally:
+        shutil.rmtree(audio_utils.AUDIO_DIR)
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+
+# Simulated round-trip time of a single camera request
+LATENCY = 0.05
+FLEET_SIZES = [1, 8, 32, 64]
+ROUNDS = 5
+
+def sequential_status(ips):
+    # The old behaviour: one fresh connection per camera, one camera at a time
+    for ip in ips:
+        requests.get(f'http://{ip}/gopro/webcam/status', timeout=1)
+
+def measure(func):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    return (time.perf_counter() - start) / ROUNDS
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(max(FLEET_SIZES), latency=LATENCY)
+    try:
+        print(f"{'cameras':>8} {'sequential (ms)':>16} {'fleet (ms)':>11}")
+        for size in FLEET_SIZES:
+            ips = [camera.ip for camera in cameras[:size]]
+            fleet = GoProFleet(ips)
+            fleet.status()  # Warm up the pooled connections
+            sequential = measure(lambda: sequential_status(ips))
+            parallel = measure(fleet.status)
+            print(f"{size:>8} {sequential * 1000:>16.1f} {parallel * 1000:>11.1f}")
+    finally:
+        stop_fake_gopros(cameras)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+from preview import PreviewManager
+
+CAMERAS = int(os.getenv('CAMERAS', '8'))
+DURATION = 10
+
+def make_test_clip(path):
+    # 10 s of 1080p H.264 test pattern with a keyframe every second, like the webcam stream
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc2=size=1920x1080:rate=30',
+        '-t', '10', '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '30', '-b:v', '4M', '-f', 'mpegts', path,
+    ], check=True)
+
+def start_synthetic_source(clip, port):
+    # Replays the clip in real time as an MPEG-TS UDP stream, standing in for the camera
+    return subprocess.Popen([
+        'ffmpeg', '-loglevel', 'error', '-re', '-stream_loop', '-1', '-i', clip,
+        '-c', 'copy', '-f', 'mpegts', f'udp://127.0.0.1:{port}?pkt_size=1316',
+    ], stdin=subprocess.DEVNULL)
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    clip = os.path.join(work_dir, 'source.ts')
+    make_test_clip(clip)
+
+    cameras = start_fake_gopros(CAMERAS)
+    fleet = GoProFleet([camera.ip for camera in cameras])
+    manager = PreviewManager(fleet, os.path.join(work_dir, 'hls'))
+    sources = []
+    try:
+        previews = manager.start_all(fleet.ips)
+        sources = [start_synthetic_source(clip, preview['port']) for preview in previews]
+        pids = {ip: manager.supervisor.workers[manager.stream_name(ip)].process.pid for ip in fleet.ips}
+        cpu_before = {ip: cpu_seconds(pid) for ip, pid in pids.items()}
+        time.sleep(DURATION)
+
+        for preview in previews:
+            camera_dir = os.path.join(manager.output_dir, os.path.dirname(preview['url'][len('/hls/'):]))
+            segments = [name for name in os.listdir(camera_dir) if name.endswith('.ts')]
+            cpu = cpu_seconds(pids[preview['ip']]) - cpu_before[preview['ip']]
+            print(f"{preview['ip']} port {preview['port']}: {len(segments)} segments on disk, "
+                  f"remux CPU {cpu / DURATION * 100:.1f}%")
+            assert os.path.exists(os.path.join(camera_dir, 'index.m3u8'))
+            assert 0 < len(segments) <= 6
+    finally:
+        for source in sources:
+            source.terminate()
+        manager.stop_all()
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
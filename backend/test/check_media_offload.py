@@ -0,0 +1,78 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+from metrics import CAMERA_REQUEST_SECONDS
+from offload import MediaOffloader
+
+CAMERAS = int(os.getenv('CAMERAS', '10'))
+FILES = 3
+FILE_MB = 4
+# Per-camera link speed, shared by all transfers from that camera
+BANDWIDTH_MB = 20
+
+def media_requests(cameras):
+    return sum(1 for camera in cameras for path, _ in camera.requests if path.startswith('/videos'))
+
+def offload(cameras, ips, files_per_camera):
+    work_dir = tempfile.mkdtemp()
+    offloader = MediaOffloader(GoProFleet([camera.ip for camera in cameras]), work_dir, files_per_camera)
+    started = time.monotonic()
+    summary = {}
+    for batch in ips:
+        summary.update(offloader.offload(batch))
+    return offloader, summary, time.monotonic() - started
+
+def verify(cameras, offloader):
+    for camera in cameras:
+        for media_path, data in camera.media.items():
+            entry = offloader.state[camera.ip][media_path]
+            assert entry['sha256'] == hashlib.sha256(data).hexdigest(), media_path
+            with open(entry['path'], 'rb') as f:
+                assert f.read() == data, media_path
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(CAMERAS, bandwidth=BANDWIDTH_MB * 2**20)
+    for camera in cameras:
+        for i in range(FILES):
+            camera.add_media(f'GX01{i:04d}.MP4', FILE_MB * 2**20)
+    total_mb = CAMERAS * FILES * FILE_MB
+    try:
+        ips = [camera.ip for camera in cameras]
+        offloader, _, seconds = offload(cameras, [[ip] for ip in ips], files_per_camera=1)
+        print(f"One file at a time: {total_mb} MB in {seconds:.2f}s ({total_mb / seconds:.0f} MB/s)")
+        shutil.rmtree(offloader.output_dir)
+
+        # Cut the first camera's link partway through a file to exercise resuming
+        cameras[0].drop_at = FILE_MB * 2**20 // 2
+        # The second camera also answers the resumed request from the wrong offset; it must start over
+        cameras[1].drop_at = FILE_MB * 2**20 // 2
+        cameras[1].range_shift = 4096
+        before = media_requests(cameras)
+        offloader, summary, seconds = offload(cameras, [ips], files_per_camera=2)
+        print(f"Parallel offload:   {total_mb} MB in {seconds:.2f}s ({total_mb / seconds:.0f} MB/s, "
+              f"link limit {CAMERAS * BANDWIDTH_MB} MB/s)")
+        verify(cameras, offloader)
+        print(f"  checksums verified, files done: {sum(s['files_done'] for s in summary.values())}, "
+              f"errors: {sum(len(s['errors']) for s in summary.values())}")
+        print(f"  media requests: {media_requests(cameras) - before} for {CAMERAS * FILES} files "
+              f"(1 resumed, 1 restarted)")
+        assert all(not s['errors'] and s['files_done'] == FILES for s in summary.values())
+        assert media_requests(cameras) - before == CAMERAS * FILES + 3
+        # Downloads go through the clients, so they show up in the camera metrics
+        media = CAMERA_REQUEST_SECONDS.snapshot()[f'{ips[0]},videos/DCIM']
+        print(f"  media request metrics for {ips[0]}: {media}")
+        assert media['count'] >= FILES
+
+        summary = offloader.offload(ips)
+        print(f"Second session: {sum(s['files_total'] for s in summary.values())} new files")
+        shutil.rmtree(offloader.output_dir)
+    finally:
+        stop_fake_gopros(cameras)
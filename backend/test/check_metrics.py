@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+
+CAMERAS = 4
+ROUNDS = 5
+OBSERVATIONS = 100000
+
+def scrape_value(text, line_start):
+    return next(float(line.split()[-1]) for line in text.splitlines() if line.startswith(line_start))
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+
+    # app monkey-patches the standard library, so the fake cameras are imported after it to share its hub
+    import app
+    import audio_utils
+    import metrics
+    from fake_gopro import start_fake_gopros, stop_fake_gopros
+    cameras = start_fake_gopros(CAMERAS, latency=0.01, jitter=0.02)
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": [camera.ip for camera in cameras], "gopro_settings": []}, f)
+    app.config_store.reload()
+    try:
+        client = app.socketio.test_client(app.app)
+        ips = [camera.ip for camera in cameras]
+        for _ in range(ROUNDS):
+            client.emit('get_gopro_status')
+            client.emit('start_gopros', ips)
+            client.emit('stop_gopros', ips)
+        client.get_received()
+        # A normal disconnect is timed once and is not a handler error
+        client.disconnect()
+
+        # An input overflow as reported by the audio driver
+        recorder = audio_utils.AudioRecorder()
+        recorder.device_index = 0
+        recorder.ring = audio_utils.RingBuffer(1024)
+        recorder.callback(b'\0' * 4096, 1024, None, fake_pyaudio.paInputOverflow)
+
+        # The callback runs on PortAudio's own thread; it must get through while a scrape holds the lock
+        callback_thread = audio_utils.os_threading.Thread(
+            target=recorder.callback, args=(b'\0' * 4096, 1024, None, fake_pyaudio.paInputOverflow))
+        with metrics.AUDIO_OVERRUNS.lock:
+            callback_thread.start()
+            audio_utils.os_time.sleep(0.1)
+        callback_thread.join(timeout=2)
+        assert not callback_thread.is_alive(), "Audio callback thread stuck on a metrics lock"
+
+        text = app.app.test_client().get('/metrics').data.decode()
+        snapshot = metrics.registry.snapshot()
+        shutter = snapshot['gopro_request_seconds']
+        for key in sorted(k for k in shutter if k.endswith('camera/shutter/start')):
+            print(f"shutter/start {key.split(',')[0]}: {shutter[key]['count']} requests, "
+                  f"p95 <= {shutter[key]['p95']} s")
+        print(f"Status sweeps: {snapshot['gopro_fleet_sweep_seconds']['status']}")
+        handlers = snapshot['socketio_handler_seconds']
+        for event in ('get_gopro_status', 'start_gopros', 'stop_gopros'):
+            print(f"Handler {event}: {handlers[event]['count']} calls, p95 <= {handlers[event]['p95']} s")
+        print(f"Audio overruns: {scrape_value(text, 'audio_overruns_total')}, dropped frames: "
+              f"{scrape_value(text, 'audio_dropped_frames_total')}")
+        print(f"Background tasks: {snapshot['background_tasks']}")
+        assert scrape_value(text, f'gopro_request_seconds_count{{camera="{ips[0]}",endpoint="camera/shutter/start"}}') == ROUNDS
+        assert handlers['start_gopros']['count'] == ROUNDS
+        print(f"Handler disconnect: {handlers['disconnect']['count']} calls, "
+              f"errors {snapshot['socketio_handler_errors_total']}")
+        assert handlers['disconnect']['count'] == 1
+        assert 'disconnect' not in snapshot['socketio_handler_errors_total']
+
+        histogram = metrics.CAMERA_REQUEST_SECONDS
+        started = time.perf_counter()
+        for _ in range(OBSERVATIONS):
+            histogram.observe(0.012, ips[0], 'webcam/status')
+        print(f"Histogram observe: {(time.perf_counter() - started) / OBSERVATIONS * 1e6:.2f} us per call")
+        started = time.perf_counter()
+        app.app.test_client().get('/metrics')
+        print(f"/metrics scrape: {(time.perf_counter() - started) * 1000:.1f} ms, {len(text.splitlines())} lines")
+    finally:
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
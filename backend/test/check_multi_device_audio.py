@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+import audio_utils
+
+DEVICES = int(os.getenv('DEVICES', '8'))
+# Seconds of wall time to record, with input fed at SPEED times real time
+DURATION = 5
+SPEED = 20
+
+if __name__ == "__main__":
+    audio_utils.AUDIO_DIR = tempfile.mkdtemp()
+    audio_utils.pyAud.device_count = DEVICES
+    audio_utils.pyAud.speed = SPEED
+
+    recorder = audio_utils.MultiDeviceRecorder()
+    recorder.start([device['index'] for device in audio_utils.get_audio_devices()])
+    time.sleep(DURATION)
+    stats = recorder.stats()
+    files = recorder.stop()
+
+    for result, device_stats in zip(files, stats):
+        print(f"device {result['device_index']}: start offset {result['start_offset'] * 1000:6.2f} ms, "
+              f"{result['frames'] / audio_utils.RATE:6.1f} s of audio, "
+              f"dropped {device_stats['dropped_frames']}, overruns {device_stats['overruns']}")
+        os.remove(result['filepath'])
+
+    # A device that fails to open leaves no file, manifest or writer behind, in every output mode
+    for options in ({}, {'rotate_seconds': 1}, {'output_format': 'flac'}):
+        failed = audio_utils.AudioRecorder(**options)
+        try:
+            failed.start(DEVICES)
+            raise AssertionError("Opening a missing device should fail")
+        except OSError as e:
+            print(f"Missing device with {options or 'defaults'}: {e}")
+        assert not failed.recording and os.listdir(audio_utils.AUDIO_DIR) == []
+    assert not recorder.start([DEVICES, DEVICES + 1]) and os.listdir(audio_utils.AUDIO_DIR) == []
+    os.rmdir(audio_utils.AUDIO_DIR)
+
+    assert all(device_stats['dropped_frames'] == 0 for device_stats in stats)
+    print(f"{DEVICES} devices recorded without dropped buffers")
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+CAMERAS = 4
+FILES = 2
+FILE_MB = 16
+# Seconds each 1 MB chunk takes to write, standing in for a slow USB disk
+SLOW_WRITE = 0.1
+# Seconds between ticks of the greenlet standing in for other sockets and the poller
+TICK = 0.01
+# Longest the hub may go without running the ticker while media is offloaded
+MAX_STALL = 0.1
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+    os.environ['MEDIA_DIR'] = os.path.join(work_dir, 'media')
+
+    # app monkey-patches the standard library, so the fake cameras are imported after it to share its hub
+    import app
+    import eventlet
+    import offload
+    from os_threads import os_threading, os_time
+    from fake_gopro import start_fake_gopros, stop_fake_gopros
+    cameras = start_fake_gopros(CAMERAS, latency=0.01)
+    ips = [camera.ip for camera in cameras]
+    for camera in cameras:
+        for i in range(FILES):
+            camera.add_media(f'GX01{i:04d}.MP4', FILE_MB * 2**20)
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": ips, "gopro_settings": []}, f)
+    app.config_store.reload()
+    # Record which OS thread every chunk is written on; greenlets all share the main one
+    hub_thread = os_threading.get_ident()
+    write_threads = set()
+    write_chunk = offload.write_chunk
+    def slow_write_chunk(f, hasher, chunk):
+        write_threads.add(os_threading.get_ident())
+        os_time.sleep(SLOW_WRITE)
+        write_chunk(f, hasher, chunk)
+    offload.write_chunk = slow_write_chunk
+    try:
+        client = app.socketio.test_client(app.app)
+        client.get_received()
+
+        ticks = []
+        def tick():
+            while True:
+                ticks.append(time.monotonic())
+                eventlet.sleep(TICK)
+        ticker = eventlet.spawn(tick)
+
+        started = time.monotonic()
+        client.emit('offload_media', ips)
+        received = []
+        while not any(event['name'] == 'offload_complete' for event in received):
+            assert time.monotonic() - started < 120, "Offload did not finish"
+            time.sleep(0.1)
+            received += client.get_received()
+        seconds = time.monotonic() - started
+        ticker.kill()
+
+        # Hashing and disk writes run off the hub, so other greenlets keep running while media streams in
+        gaps = [b - a for a, b in zip(ticks, ticks[1:]) if b > started]
+        total_mb = CAMERAS * FILES * FILE_MB
+        files = [event['args'][0] for event in received if event['name'] == 'offload_file']
+        progress = [event for event in received if event['name'] == 'offload_progress']
+        print(f"Offloaded {total_mb} MB with {SLOW_WRITE * 1000:.0f} ms chunk writes in {seconds:.2f}s, "
+              f"{len(progress)} progress events, longest hub stall {max(gaps) * 1000:.0f} ms, "
+              f"written on {len(write_threads)} OS threads")
+        assert len(files) == CAMERAS * FILES and not any('error' in result for result in files)
+        assert hub_thread not in write_threads
+        assert max(gaps) < MAX_STALL
+
+        for camera in cameras:
+            for media_path, data in camera.media.items():
+                result = next(r for r in files if r['ip'] == camera.ip and media_path.endswith(r['name']))
+                assert result['sha256'] == hashlib.sha256(data).hexdigest(), media_path
+        print("Offload events OK")
+    finally:
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+CAMERAS = 3
+# Extra seconds the first camera takes to answer, so its result should be streamed last
+SLOW_LATENCY = 0.5
+
+def record_responses(client):
+    return [event['args'][0] for event in client.get_received() if event['name'] == 'gopro_record_response']
+
+def check_streamed(events, ips, slow_ip):
+    # One non-final event per camera as it answers, then the aggregate of the same results
+    *streamed, final = events
+    assert final['final'] and not any(event['final'] for event in streamed)
+    assert all(len(event['responses']) == 1 for event in streamed)
+    order = [event['responses'][0]['ip'] for event in streamed]
+    assert sorted(order) == sorted(ips) and order[-1] == slow_ip, order
+    assert sorted(r['ip'] for r in final['responses']) == sorted(ips)
+    for event in streamed:
+        assert event['responses'][0] in final['responses']
+    return order
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+
+    # app monkey-patches the standard library, so the fake cameras are imported after it to share its hub
+    import app
+    from fake_gopro import start_fake_gopros, stop_fake_gopros
+    from session import load_manifest
+    cameras = start_fake_gopros(CAMERAS, latency=0.01, jitter=0.02)
+    ips = [camera.ip for camera in cameras]
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": ips, "gopro_settings": [{"display_name": "FPS", "setting": "3", "option": "5"}]}, f)
+    app.config_store.reload()
+    try:
+        client = app.socketio.test_client(app.app)
+        client.get_received()
+
+        # A take where no camera fires gets no session
+        for camera in cameras:
+            camera.failure_rate = 1.0
+        client.emit('start_gopros', ips)
+        final = record_responses(client)[-1]
+        print(f"Failed take: {[r['response'] for r in final['responses']]}, session {final['session_id']}")
+        assert final['final'] and final['session_id'] is None
+        assert all(r['response'] != 200 for r in final['responses'])
+        assert app.session_manager.current is None
+        assert not any(os.path.isdir(os.path.join(work_dir, name)) for name in os.listdir(work_dir))
+        for camera in cameras:
+            camera.failure_rate = 0.0
+        # Let the circuits that just opened let a probe through again
+        for ip in ips:
+            app.fleet.client(ip).health.open_until = 0
+
+        # A take where the cameras fire opens one, with a shutter_start per camera.
+        # Each camera's result is streamed as it answers, the slow one last though it is listed first
+        cameras[0].latency = SLOW_LATENCY
+        client.emit('start_gopros', ips)
+        events = record_responses(client)
+        final = events[-1]
+        print(f"Take: {[r['response'] for r in final['responses']]}, session {final['session_id']}")
+        print(f"Start streamed in order: {check_streamed(events, ips, cameras[0].ip)}")
+        assert final['session_id'] and all(r['response'] == 200 for r in final['responses'])
+        session = app.session_manager.current
+        client.emit('stop_gopros', ips)
+        print(f"Stop streamed in order: {check_streamed(record_responses(client), ips, cameras[0].ip)}")
+        cameras[0].latency = 0.01
+        assert app.session_manager.current is None and app.session_manager.flush()
+        events = load_manifest(session.path)
+        assert sorted(e['ip'] for e in events if e['event'] == 'shutter_start') == sorted(ips)
+        assert sorted(e['ip'] for e in events if e['event'] == 'shutter_stop') == sorted(ips)
+        print(f"Session {session.id}: {len(events)} events")
+    finally:
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import FakeGoPro, stop_fake_gopros
+from gopro_utils import GoProFleet, TIMEOUT_STATUS
+
+# Per-camera response latency in seconds; the last camera misses the deadline
+LATENCIES = [0.4, 0.05, 0.2, 3.0]
+DEADLINE = 1.0
+
+if __name__ == "__main__":
+    cameras = [FakeGoPro(latency=latency).start() for latency in LATENCIES]
+    try:
+        fleet = GoProFleet([camera.ip for camera in cameras])
+        latency_by_ip = {camera.ip: camera.latency for camera in cameras}
+
+        start = time.monotonic()
+        results = []
+        for ip, response in fleet.iter_results(lambda c: c.stop_record(), timeout=DEADLINE):
+            elapsed = time.monotonic() - start
+            results.append((ip, response))
+            print(f"{elapsed * 1000:7.1f} ms  {ip} (latency {latency_by_ip[ip]}s): {response}")
+
+        # Results arrive fastest camera first, and the slow camera is reported, not dropped
+        assert [latency_by_ip[ip] for ip, _ in results] == sorted(LATENCIES)
+        assert results[-1][1] == TIMEOUT_STATUS
+        assert all(response == 200 for _, response in results[:-1])
+        assert time.monotonic() - start < DEADLINE + 0.5
+        print("Streaming results OK")
+    finally:
+        stop_fake_gopros(cameras)
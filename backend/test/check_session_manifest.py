@@ -0,0 +1,67 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+import audio_utils
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+from session import SessionManager, load_manifest, track_offsets
+
+CAMERAS = 4
+DEVICES = 2
+RECORD_CALLS = 10000
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    audio_utils.AUDIO_DIR = work_dir
+    audio_utils.pyAud.device_count = DEVICES
+    audio_utils.pyAud.speed = 1
+    cameras = start_fake_gopros(CAMERAS, latency=0.005, jitter=0.01)
+    try:
+        fleet = GoProFleet([camera.ip for camera in cameras])
+        manager = SessionManager(work_dir)
+        recorder = audio_utils.MultiDeviceRecorder()
+
+        # Same order of calls as the start_audio / start_gopros / stop handlers in app.py
+        recorder.start(list(range(DEVICES)))
+        manager.begin('audio').record('audio_start', device_indexes=list(recorder.recorders),
+                                      requested=recorder.start_time)
+        time.sleep(0.5)
+        fired, _ = fleet.synchronized_start(fleet.ips)
+        session = manager.begin('cameras')
+        for response in fired:
+            session.record('shutter_start', **response)
+        time.sleep(1)
+        for result in recorder.stop():
+            session.record('audio_stop', device_index=result['device_index'], filepath=result['filepath'],
+                           first_sample=result['first_sample_time'], last_sample=result['last_sample_time'],
+                           frames=result['frames'], sample_rate=result['sample_rate'])
+
+        # Cost of recording an event on the start/stop path, while the session is open
+        started = time.perf_counter()
+        for _ in range(RECORD_CALLS):
+            session.record('benchmark', value=1)
+        per_call_us = (time.perf_counter() - started) / RECORD_CALLS * 1e6
+        manager.end('audio')
+        manager.end('cameras')
+        assert manager.flush()
+
+        events = load_manifest(session.path)
+        print(f"Session {session.id}: {len(events)} events in {session.path}")
+        assert sum(event['event'] == 'benchmark' for event in events) == RECORD_CALLS
+        assert events[-1]['event'] == 'session_stopped'
+        print(f"  events: {sorted(set(event['event'] for event in events) - {'benchmark'})}")
+        for track, offset in sorted(track_offsets(events).items(), key=lambda item: item[1]):
+            print(f"  {track:<24} starts at +{offset * 1000:8.2f} ms")
+        print(f"  record() cost: {per_call_us:.1f} us per event")
+        assert manager.current is None
+    finally:
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
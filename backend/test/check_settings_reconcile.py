@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+SETTINGS = [
+    {"display_name": "FPS", "setting": "3", "option": "8"},
+    {"display_name": "Video Resolution", "setting": "2", "option": "9"},
+    {"display_name": "Max Lens", "setting": "162", "option": "1"},
+]
+# The same settings with integer ids and options, which the config accepts too
+INTEGER_SETTINGS = [{**setting, "setting": int(setting["setting"]), "option": int(setting["option"])}
+                    for setting in SETTINGS]
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+
+    # app monkey-patches the standard library, so the fake cameras are imported after it to share its hub
+    import app
+    from fake_gopro import start_fake_gopros, stop_fake_gopros
+    from config import parse_config
+    from gopro_utils import NOMINAL_WRITE_SECONDS, GoProFleet, summarize_reconcile
+    cameras = start_fake_gopros(4, latency=0.1)
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": [camera.ip for camera in cameras], "gopro_settings": SETTINGS}, f)
+    app.config_store.reload()
+    try:
+        fleet = app.fleet
+
+        # First pass: only the FPS differs from the fake cameras' defaults
+        first = summarize_reconcile(fleet.reconcile_settings(SETTINGS).values())
+        print("First pass:", first)
+        assert first['written'] == len(cameras)
+
+        # Second pass: the rig is already configured, so nothing is written
+        second = summarize_reconcile(fleet.reconcile_settings(SETTINGS).values())
+        print("Second pass:", second)
+        assert second['written'] == 0
+        assert all(camera.count_requests('/gopro/camera/setting') == 1 for camera in cameras)
+
+        # A rig that is already configured still reports what skipping saved, before any write was timed
+        fresh_fleet = GoProFleet(fleet.ips)
+        fresh = summarize_reconcile(fresh_fleet.reconcile_settings(SETTINGS).values())
+        fresh_fleet.executor.shutdown()
+        print("Fresh fleet, nothing to write:", fresh)
+        assert fresh['written'] == 0
+        assert fresh['saved_ms'] == len(cameras) * len(SETTINGS) * NOMINAL_WRITE_SECONDS * 1000
+
+        # Integer ids reconcile the same way, and the interface shows the options they compare against
+        integer = summarize_reconcile(fleet.reconcile_settings(INTEGER_SETTINGS).values())
+        print("Integer ids:", integer)
+        assert integer['written'] == 0
+        with open(config_path, 'w') as f:
+            json.dump({"gopros": fleet.ips, "gopro_settings": INTEGER_SETTINGS}, f)
+        app.config_store.reload()
+        client = app.socketio.test_client(app.app)
+        client.emit('get_gopro_status')
+        shown = [event['args'][0] for event in client.get_received() if event['name'] == 'gopro_settings']
+        print(f"Shown for {shown[0]['ip']}: {[(s['setting'], s['option']) for s in shown[0]['settings']]}")
+        assert sorted(entry['ip'] for entry in shown) == sorted(fleet.ips)
+        assert all([s['option'] for s in entry['settings']] == [8, 9, 1] for entry in shown)
+
+        # A non-numeric option is a config error, not an arm failure
+        try:
+            parse_config({"gopro_settings": [{"setting": "3", "option": "sixty"}]})
+            raise AssertionError("Non-numeric option accepted")
+        except ValueError as e:
+            print(f"Rejected: {e}")
+        print("Settings reconcile OK")
+    finally:
+        app.camera_cache.stop()
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
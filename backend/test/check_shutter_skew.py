@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import RELEASE_TIMEOUT, GoProFleet
+
+CAMERAS = 8
+# Most the shutter requests may be spread over when they leave, in milliseconds
+MAX_SEND_SKEW_MS = 50
+
+def arm(client):
+    # Each camera takes a different amount of time to apply its settings
+    client.enable_usb()
+    return True
+
+def check_start(fleet, cameras, label):
+    started = time.monotonic()
+    responses, skew = fleet.synchronized_start(fleet.ips)
+    elapsed = time.monotonic() - started
+    print(f"{label}: reported skew {skew}, {elapsed * 1000:.0f} ms in total")
+
+    # Skew as observed by the cameras themselves, from each camera's latest shutter request
+    arrivals = [max(t for path, t in camera.requests if path == '/gopro/camera/shutter/start')
+                for camera in cameras]
+    print(f"{label}: camera-side arrival spread {(max(arrivals) - min(arrivals)) * 1000:.1f} ms")
+
+    assert sorted(r['ip'] for r in responses) == sorted(fleet.ips)
+    assert all(r['response'] == 200 for r in responses), responses
+    assert skew['send_ms'] < MAX_SEND_SKEW_MS, skew
+    # Every camera has a worker, so nobody waits out the barrier timeout
+    assert elapsed < RELEASE_TIMEOUT, elapsed
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(CAMERAS, latency=0.02, jitter=0.3)
+    try:
+        fleet = GoProFleet([camera.ip for camera in cameras])
+        fleet.map(arm)
+        check_start(fleet, cameras, "Default pool")
+
+        # More cameras than pool workers, with the pool busy with slow calls
+        small = GoProFleet(fleet.ips, max_workers=CAMERAS // 4)
+        for ip in small.ips:
+            small.executor.submit(time.sleep, 0.5)
+        check_start(small, cameras, f"{CAMERAS} cameras, {CAMERAS // 4} busy pool workers")
+    finally:
+        stop_fake_gopros(cameras)
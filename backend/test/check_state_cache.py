@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+from camera_state import CameraStateCache
+
+DURATION = 3
+
+def client_loop(cache, ips, stop):
+    # Mimics a browser tab asking for status as fast as it can
+    while not stop.is_set():
+        cache.get_status()
+        for ip in ips:
+            cache.get_settings(ip)
+        time.sleep(0.01)
+
+def camera_requests(cameras):
+    return sum(len(camera.requests) for camera in cameras)
+
+def run(cameras, clients):
+    fleet = GoProFleet([camera.ip for camera in cameras])
+    cache = CameraStateCache(fleet, status_ttl=1, state_ttl=2)
+    before = camera_requests(cameras)
+
+    stop = threading.Event()
+    threading.Thread(target=cache.run, daemon=True).start()
+    threads = [threading.Thread(target=client_loop, args=(cache, fleet.ips, stop)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    cache.stop()
+    for thread in threads:
+        thread.join()
+    return camera_requests(cameras) - before
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+def check_freshness(cameras):
+    fleet = GoProFleet([camera.ip for camera in cameras])
+    cache = CameraStateCache(fleet, status_ttl=0.3, state_ttl=5)
+    threading.Thread(target=cache.run, daemon=True).start()
+    try:
+        cache.get_status()
+        # Idle cameras are polled once per status TTL, no more and no less
+        idle = cameras[1]
+        before = idle.count_requests('/gopro/webcam/status')
+        time.sleep(1.5)
+        polls = idle.count_requests('/gopro/webcam/status') - before
+        print(f"Status polls of an idle camera in 1.5s with a 0.3s TTL: {polls}")
+        assert 3 <= polls <= 6
+
+        # A write invalidates the camera's state long before its 5s TTL runs out
+        camera = cameras[0]
+        fleet.client(camera.ip).set_setting({'setting': '3', 'option': '8'})
+        assert wait_for(lambda: cache.get_settings(camera.ip)['3'] == 8, timeout=1)
+        print("Settings refreshed right after a write")
+
+        # A camera that goes offline stops reporting its last settings
+        camera.failure_rate = 1.0
+        assert wait_for(lambda: cache.get_settings(camera.ip) is False)
+        print(f"Offline camera: status {cache.entry(camera.ip).status}, settings {cache.get_settings(camera.ip)}")
+        camera.failure_rate = 0.0
+    finally:
+        cache.stop()
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(4, latency=0.02)
+    try:
+        check_freshness(cameras)
+        for clients in [1, 10, 50]:
+            requests = run(cameras, clients)
+            print(f"{clients:>3} clients: {requests} camera requests in {DURATION}s")
+            # Camera traffic depends on the TTLs, not on the number of clients
+            assert requests < len(cameras) * 2 * (DURATION + 1)
+    finally:
+        stop_fake_gopros(cameras)
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+CAMERAS = 3
+# Shorter than the default TTLs so drift is seen within the check
+STATUS_TTL = 1
+STATE_TTL = 1
+# Seconds each phase is watched for
+PHASE = 3
+
+def status_polls(camera):
+    return camera.count_requests('/gopro/webcam/status')
+
+def deltas(client):
+    # Flattened per-camera deltas pushed to the monitor room
+    received = [event['args'][0] for event in client.get_received() if event['name'] == 'gopro_status_delta']
+    return [delta for batch in received for delta in batch]
+
+def fps(delta):
+    return next(s['option'] for s in delta['settings'] if s['setting'] == '3')
+
+def wait_for_delta(client, condition, timeout):
+    deadline = time.monotonic() + timeout
+    seen = []
+    while time.monotonic() < deadline:
+        seen += deltas(client)
+        matches = [delta for delta in seen if condition(delta)]
+        if matches:
+            return matches[0], time.monotonic() - (deadline - timeout)
+        time.sleep(0.05)
+    raise AssertionError(f"No matching delta within {timeout}s, saw {seen}")
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+
+    # app monkey-patches the standard library, so the fake cameras are imported after it to share its hub
+    import app
+    from camera_state import ACTIVE_TTL
+    from fake_gopro import start_fake_gopros, stop_fake_gopros
+    cameras = start_fake_gopros(CAMERAS, latency=0.01)
+    ips = [camera.ip for camera in cameras]
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": ips, "gopro_settings": [{"display_name": "FPS", "setting": "3", "option": "5"}]}, f)
+    app.config_store.reload()
+    app.camera_cache.status_ttl, app.camera_cache.state_ttl = STATUS_TTL, STATE_TTL
+    try:
+        client = app.socketio.test_client(app.app)
+        client.emit('subscribe_gopro_status')
+        baseline = next(event['args'][0] for event in client.get_received() if event['name'] == 'gopro_status')
+        print(f"Baseline: {[camera['status'] for camera in baseline]}")
+        assert sorted(camera['ip'] for camera in baseline) == sorted(ips)
+        # The first poll reports every camera once; after that an idle rig pushes nothing
+        time.sleep(1)
+        deltas(client)
+
+        before = [status_polls(camera) for camera in cameras]
+        time.sleep(PHASE)
+        idle_polls = [status_polls(c) - b for c, b in zip(cameras, before)]
+        idle_deltas = deltas(client)
+        print(f"Idle for {PHASE}s: status polls per camera {idle_polls}, deltas {idle_deltas}")
+        assert idle_deltas == [] and all(polls <= PHASE / STATUS_TTL + 1 for polls in idle_polls)
+
+        # A recording camera is pushed as recording and then polled at the active rate
+        app.fleet.client(cameras[0].ip).start_record()
+        before = [status_polls(camera) for camera in cameras]
+        delta, seconds = wait_for_delta(client, lambda d: d['ip'] == cameras[0].ip and d.get('recording'), STATE_TTL + 1)
+        print(f"Camera 0 recording: pushed after {seconds:.2f}s")
+        time.sleep(PHASE)
+        polls = [status_polls(c) - b for c, b in zip(cameras, before)]
+        print(f"  status polls per camera: {polls}")
+        assert polls[0] >= PHASE / ACTIVE_TTL - 1 and polls[0] > max(polls[1:])
+
+        # A setting changed on the camera itself is pushed as drift once its state is re-polled
+        cameras[2].settings[3] = 8
+        delta, seconds = wait_for_delta(client, lambda d: d['ip'] == cameras[2].ip and 'settings' in d, STATE_TTL + 2)
+        print(f"Camera 2 drifted: FPS option {fps(delta)}, pushed after {seconds:.2f}s")
+        assert fps(delta) == 8 and 'status' not in delta
+
+        # Resyncing writes the configured option back, and the write pushes it without waiting for the TTL
+        client.emit('update_all_gopro_settings', [cameras[2].ip])
+        delta, seconds = wait_for_delta(client, lambda d: d['ip'] == cameras[2].ip and 'settings' in d, STATE_TTL)
+        print(f"Camera 2 resynced: FPS option {fps(delta)}, pushed after {seconds:.2f}s")
+        assert fps(delta) == 5 and cameras[2].settings[3] == 5 and seconds < STATE_TTL
+
+        # Unsubscribed clients get nothing more
+        client.emit('unsubscribe_gopro_status')
+        cameras[1].settings[3] = 8
+        time.sleep(STATE_TTL + 1)
+        assert deltas(client) == []
+        print("Status monitor OK")
+    finally:
+        app.camera_cache.stop()
+        stop_fake_gopros(cameras)
+        shutil.rmtree(work_dir)
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stream_supervisor
+from stream_supervisor import StreamSupervisor
+
+# Shorter timings so restarts and stalls show up within a few seconds
+stream_supervisor.STALL_SECONDS = 2
+stream_supervisor.SAMPLE_INTERVAL = 1
+
+def python_process(code):
+    return [sys.executable, '-c', code]
+
+# Stand-ins for ffmpeg: one healthy writer, one that crashes, one that hangs without output
+HEALTHY = "import sys, time\nwhile True:\n    open(sys.argv[1], 'w').write(str(time.time())); sum(range(200000)); time.sleep(0.05)"
+CRASHING = "import time; time.sleep(0.3); raise SystemExit(1)"
+STUCK = "import time; time.sleep(3600)"
+
+def print_stats(supervisor):
+    for stats in supervisor.stats():
+        print(f"  {stats['name']:<10} running={stats['running']!s:<5} restarts={stats['restarts']} "
+              f"last_exit={stats['last_exit']} cpu={stats['cpu_percent']}% rss={stats['rss_mb']} MB")
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    healthy_path = os.path.join(work_dir, 'healthy')
+    supervisor = StreamSupervisor(max_processes=3)
+
+    supervisor.start('healthy', python_process(HEALTHY) + [healthy_path], watch_path=healthy_path)
+    supervisor.start('crashing', python_process(CRASHING))
+    supervisor.start('stuck', python_process(STUCK), watch_path=os.path.join(work_dir, 'stuck'))
+    # Over the cap, so it waits for a slot
+    queued = supervisor.start('queued', python_process(STUCK))
+    print(f"Queued stream started at once: {queued.running}")
+
+    time.sleep(6)
+    print("After 6s:")
+    print_stats(supervisor)
+    running = sum(stats['running'] for stats in supervisor.stats())
+    print(f"Running processes: {running} (cap {supervisor.max_processes})")
+    assert running <= supervisor.max_processes
+
+    # Stopping only signals the processes; the supervisor thread reaps them
+    started = time.monotonic()
+    supervisor.stop_all()
+    print(f"stop_all returned in {(time.monotonic() - started) * 1000:.1f} ms")
+    time.sleep(1)
+    print(f"Processes left after stop_all: {len(supervisor.stopping)}")
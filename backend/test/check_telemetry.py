@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera_state import CameraStateCache
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from gopro_utils import GoProFleet
+from telemetry import TELEMETRY_CAPACITY, TELEMETRY_INTERVAL, TelemetryRecorder
+
+CAMERAS = 24
+BUCKETS = 300
+
+def fake_state(sample, camera):
+    # Battery draining from 100% over the day, a hot spell mid-day, SD card filling up
+    return {'status': {'70': 100 - sample * 100 // TELEMETRY_CAPACITY, '2': 3, '6': int(8000 < sample < 9000),
+                       '54': 64_000_000 - sample * 3000 - camera, '10': sample % 2}}
+
+def fill(recorder, end):
+    start = end - TELEMETRY_CAPACITY * TELEMETRY_INTERVAL
+    for sample in range(TELEMETRY_CAPACITY):
+        for camera in range(CAMERAS):
+            recorder.record_state(f'10.0.0.{camera}', fake_state(sample, camera), start + sample * TELEMETRY_INTERVAL)
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    end = time.time()
+    try:
+        recorder = TelemetryRecorder(db_path=os.path.join(work_dir, 'telemetry.db'))
+        started = time.perf_counter()
+        fill(recorder, end)
+        seconds = time.perf_counter() - started
+        print(f"Recorded 24 h of samples for {CAMERAS} cameras: {CAMERAS * TELEMETRY_CAPACITY} samples in "
+              f"{seconds:.1f}s ({seconds / (CAMERAS * TELEMETRY_CAPACITY) * 1e6:.1f} us each)")
+        print(f"Ring buffer memory: {recorder.memory_bytes() / 2**20:.1f} MB")
+
+        # The same day for one camera as the list of status dicts the rings replace
+        tracemalloc.start()
+        as_dicts = [{'time': end, **fake_state(sample, 0)['status']} for sample in range(TELEMETRY_CAPACITY)]
+        dict_bytes = tracemalloc.get_traced_memory()[0] * CAMERAS
+        tracemalloc.stop()
+        print(f"Same data as lists of dicts: {dict_bytes / 2**20:.1f} MB")
+        del as_dicts
+
+        started = time.perf_counter()
+        day = recorder.query(start=end - 86400, end=end, buckets=BUCKETS)
+        print(f"Query 24 h x {CAMERAS} cameras into {BUCKETS} points: {(time.perf_counter() - started) * 1000:.0f} ms")
+        hour = recorder.query(['10.0.0.0'], start=end - 3600, end=end, fields=['battery_percent'])
+        battery = hour['10.0.0.0']['battery_percent']
+        # Only the requested fields come back
+        assert set(hour['10.0.0.0']) == {'time', 'battery_percent'}
+        assert recorder.select_fields(['sd_remaining_kb', 'battery_percent', 'unknown']) == \
+            ['battery_percent', 'sd_remaining_kb']
+        print(f"Last hour of camera 0: {len(hour['10.0.0.0']['time'])} points, battery "
+              f"{max(battery['max'])}% down to {min(battery['min'])}%")
+
+        # Check one bucket against the raw samples
+        ring = recorder.rings['10.0.0.5']
+        times, values = ring.window(end - 86400, end)
+        width = 86400 / BUCKETS
+        first_bucket = values[times < end - 86400 + width][:, recorder.fields.index('sd_remaining_kb')]
+        series = day['10.0.0.5']['sd_remaining_kb']
+        assert series['min'][0] == first_bucket.min() and series['max'][0] == first_bucket.max()
+        assert abs(series['mean'][0] - first_bucket.mean()) / first_bucket.mean() < 1e-6
+        assert day['10.0.0.5']['too_cold']['mean'][0] is None
+        assert len(day['10.0.0.5']['time']) == BUCKETS
+        print(f"Hot spell seen in system_hot max: {sum(v == 1 for v in day['10.0.0.0']['system_hot']['max'])} points")
+
+        written = recorder.flush()
+        size = os.path.getsize(os.path.join(work_dir, 'telemetry.db'))
+        print(f"Persisted {written} samples to SQLite: {size / 2**20:.1f} MB")
+        reloaded = TelemetryRecorder(db_path=os.path.join(work_dir, 'telemetry.db'))
+        # The oldest sample has aged out of the retention window by now, so compare the last 23 hours
+        assert reloaded.query(start=end - 82800, end=end) == recorder.query(start=end - 82800, end=end)
+        print("Reloaded recorder answers the same query identically")
+
+        # Fed by the state cache polling fake cameras
+        cameras = start_fake_gopros(2)
+        fleet = GoProFleet([camera.ip for camera in cameras])
+        cache = CameraStateCache(fleet, status_ttl=0.1, state_ttl=0.1)
+        live = TelemetryRecorder(interval=0.2, db_path=None)
+        cache.state_listeners.append(live.record_state)
+        threading.Thread(target=cache.run, daemon=True).start()
+        try:
+            for battery in (90, 80, 70):
+                cameras[0].battery = battery
+                time.sleep(0.5)
+            latest = live.latest(cameras[0].ip)
+            series = live.query([cameras[0].ip], start=time.time() - 10, buckets=5, fields=['battery_percent'])
+            print(f"Live camera: latest battery {latest['battery_percent']}%, "
+                  f"{live.rings[cameras[0].ip].count} samples, series {series[cameras[0].ip]['battery_percent']}")
+            assert latest['battery_percent'] == 70 and np.isclose(latest['sd_remaining_kb'], 64_000_000)
+        finally:
+            cache.stop()
+            stop_fake_gopros(cameras)
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_pyaudio
+sys.modules['pyaudio'] = fake_pyaudio
+
+# Seconds between ticks of the greenlet standing in for other sockets and the poller
+TICK = 0.01
+
+INVALID_QUERIES = [
+    {'buckets': 'many'},
+    {'buckets': 0},
+    {'buckets': 10 ** 9},
+    {'start': 'yesterday'},
+    {'start': 100, 'end': 50},
+    {'ips': '10.0.0.1'},
+    {'fields': [1, 2]},
+    [],
+]
+
+def telemetry_events(client):
+    return [(event['name'], event['args'][0]) for event in client.get_received()
+            if event['name'] in ('telemetry', 'telemetry_error')]
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    os.environ['GOPRO_CONFIG_FILE'] = config_path
+    os.environ['SESSIONS_DIR'] = work_dir
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": [], "gopro_settings": []}, f)
+
+    # app monkey-patches the standard library, so everything else is imported after it
+    import app
+    import eventlet
+    from check_telemetry import CAMERAS, fill
+    from telemetry import TelemetryRecorder
+    try:
+        end = time.time()
+        fill(app.telemetry_recorder, end)
+        client = app.socketio.test_client(app.app)
+        client.get_received()
+
+        for query in INVALID_QUERIES:
+            client.emit('get_telemetry', query)
+            (name, payload), = telemetry_events(client)
+            print(f"{query!r}: {name} {payload.get('error')}")
+            assert name == 'telemetry_error'
+
+        # The day-long query for every camera runs off the hub, so other greenlets keep running meanwhile
+        ticks = []
+        def tick():
+            while True:
+                ticks.append(time.monotonic())
+                eventlet.sleep(TICK)
+        ticker = eventlet.spawn(tick)
+        eventlet.sleep(0.1)
+        started = time.monotonic()
+        client.emit('get_telemetry', {'start': end - 86400, 'end': end, 'buckets': 300})
+        elapsed = time.monotonic() - started
+        ticker.kill()
+        gaps = [b - a for a, b in zip(ticks, ticks[1:]) if b > started]
+        (name, payload), = telemetry_events(client)
+        print(f"Query 24 h x {CAMERAS} cameras over Socket.IO: {elapsed * 1000:.0f} ms, "
+              f"longest hub stall meanwhile {max(gaps) * 1000:.0f} ms")
+        assert name == 'telemetry' and len(payload['series']) == CAMERAS
+        assert max(gaps) < max(elapsed / 2, 0.05)
+
+        # A subset of fields is all that is sent, in the fields list and in every series
+        client.emit('get_telemetry', {'fields': ['battery_percent', 'system_hot'], 'buckets': 10})
+        (name, payload), = telemetry_events(client)
+        print(f"Requested two fields: {payload['fields']}")
+        assert name == 'telemetry' and payload['fields'] == ['battery_percent', 'system_hot']
+        assert all(set(series) == {'time', 'battery_percent', 'system_hot'} for series in payload['series'].values())
+
+        # Stopping the recorder writes what was recorded since the last flush
+        db_path = os.path.join(work_dir, 'telemetry.db')
+        recorder = TelemetryRecorder(db_path=db_path)
+        for sample in range(10):
+            recorder.record_state('10.0.0.1', {'status': {'70': 50 + sample}}, end - 50 + sample * 5)
+        recorder.stop()
+        reloaded = TelemetryRecorder(db_path=db_path)
+        print(f"Samples after stop and reload: {reloaded.rings['10.0.0.1'].count}")
+        assert reloaded.rings['10.0.0.1'].count == 10
+        print("Telemetry events OK")
+    finally:
+        shutil.rmtree(work_dir)
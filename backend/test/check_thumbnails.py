@@ -0,0 +1,95 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thumbnails import ThumbnailService
+
+CAMERAS = int(os.getenv('CAMERAS', '16'))
+# Cameras with a viewer; the rest must not be decoded at all
+WATCHED = int(os.getenv('WATCHED', '12'))
+DURATION = 10
+CLIPS = 4
+
+def make_clip(path, index):
+    # One second of 1080p test pattern, standing in for an HLS segment. The
+    # remuxer writes MPEG-TS segments, but any container ffmpeg reads will do.
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y', '-f', 'lavfi',
+        '-i', f'testsrc2=size=1920x1080:rate=30,hue=h={index * 90}', '-t', '1',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '30', path,
+    ], check=True)
+
+class SyntheticPreviews:
+    """
+    Stands in for PreviewManager: each camera's playlist gains a new segment every second.
+    """
+
+    def __init__(self, work_dir, ips, clips):
+        self.work_dir = work_dir
+        self.ips = ips
+        self.clips = clips
+        self.running = True
+
+    def active(self):
+        return self.ips
+
+    def playlist_path(self, ip):
+        return os.path.join(self.work_dir, ip, 'index.m3u8')
+
+    def run(self):
+        sequence = 0
+        while self.running:
+            for ip in self.ips:
+                camera_dir = os.path.dirname(self.playlist_path(ip))
+                os.makedirs(camera_dir, exist_ok=True)
+                name = f'segment_{sequence:05d}.mp4'
+                shutil.copyfile(self.clips[sequence % len(self.clips)], os.path.join(camera_dir, name))
+                with open(self.playlist_path(ip), 'w') as f:
+                    f.write(f'#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXTINF:1.0,\n{name}\n')
+            sequence += 1
+            time.sleep(1)
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    clips = [os.path.join(work_dir, f'clip_{i}.mp4') for i in range(CLIPS)]
+    for i, clip in enumerate(clips):
+        make_clip(clip, i)
+
+    ips = [f'camera{i}' for i in range(CAMERAS)]
+    previews = SyntheticPreviews(work_dir, ips, clips)
+    threading.Thread(target=previews.run, daemon=True).start()
+
+    service = ThumbnailService(previews)
+    service.watch('viewer', ips[:WATCHED])
+    counts = {ip: 0 for ip in ips}
+    sizes = []
+    try:
+        # Mirrors emit_thumbnails in app.py, timing how long each pass holds the loop
+        longest_pass = 0.0
+        end = time.monotonic() + DURATION
+        while time.monotonic() < end:
+            started = time.monotonic()
+            service.schedule()
+            for thumbnail in service.take_fresh():
+                counts[thumbnail['ip']] += 1
+                sizes.append(len(thumbnail['jpeg']))
+            longest_pass = max(longest_pass, time.monotonic() - started)
+            time.sleep(0.1)
+    finally:
+        previews.running = False
+
+    watched = [counts[ip] / DURATION for ip in ips[:WATCHED]]
+    unwatched = sum(counts[ip] for ip in ips[WATCHED:])
+    print(f"{CAMERAS} cameras, {WATCHED} watched, {service.workers} decode processes")
+    print(f"  thumbnails/s per watched camera: min {min(watched):.2f}, max {max(watched):.2f}")
+    print(f"  thumbnails for unwatched cameras: {unwatched}")
+    print(f"  mean JPEG size: {sum(sizes) / max(len(sizes), 1) / 1024:.1f} KB")
+    print(f"  longest scheduling pass: {longest_pass * 1000:.1f} ms")
+    assert unwatched == 0
+    shutil.rmtree(work_dir)
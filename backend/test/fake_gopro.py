@@ -0,0 +1,232 @@
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for the GoPro HTTP API on :8080, used by the check scripts
+# to exercise the backend without cameras attached.
+
+MEDIA_PREFIX = '/videos/DCIM/'
+# Bytes written per send when serving media
+MEDIA_BLOCK = 64 * 1024
+
+class FakeGoProHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer headers and body into one write so keep-alive clients aren't held up by Nagle
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, code=200):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_media(self, camera, media_path):
+        data = camera.media.get(media_path)
+        if data is None:
+            self.send_json({'error': f'unknown media {media_path}'}, 404)
+            return
+        start = 0
+        byte_range = self.headers.get('Range')
+        if byte_range:
+            start = int(byte_range.split('=')[1].split('-')[0])
+            if camera.range_shift:
+                # Simulate a server answering a range from the wrong offset, once
+                start, camera.range_shift = max(start - camera.range_shift, 0), 0
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+
+        position = start
+        while position < len(data):
+            block = data[position:position + MEDIA_BLOCK]
+            camera.throttle(len(block))
+            if camera.drop_at is not None and position + len(block) > camera.drop_at:
+                # Simulate the link dropping partway through a transfer, once
+                camera.drop_at = None
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            try:
+                self.wfile.write(block)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up on the transfer
+                return
+            position += len(block)
+        self.wfile.flush()
+
+    def do_GET(self):
+        camera = self.server.camera
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        camera.requests.append((url.path, time.monotonic()))
+
+        delay = camera.latency + random.uniform(0, camera.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < camera.failure_rate:
+            self.send_json({'error': 'injected failure'}, 500)
+            return
+
+        if url.path.startswith(MEDIA_PREFIX):
+            self.send_media(camera, url.path[len(MEDIA_PREFIX):])
+            return
+
+        handler = camera.routes.get(url.path)
+        if handler is None:
+            self.send_json({'error': f'unknown path {url.path}'}, 404)
+            return
+        code, body = handler(params)
+        self.send_json(body, code)
+
+class FakeGoPro:
+    """
+    A fake GoPro HTTP server bound to a local address.
+
+    Args:
+        host (str): Address to bind to.
+        port (int): Port to bind to, 0 picks a free port.
+        latency (float): Seconds added to every response.
+        jitter (float): Maximum random seconds added on top of latency.
+        failure_rate (float): Fraction of requests answered with HTTP 500.
+        bandwidth (float): Bytes per second the camera's link serves media at,
+            shared by all its transfers. None means unlimited.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, failure_rate=0.0, bandwidth=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.bandwidth = bandwidth
+        self.link_free_at = 0.0
+        self.link_lock = threading.Lock()
+        # Media files as {'<folder>/<name>': bytes}
+        self.media = {}
+        # Byte offset at which the next media transfer is cut off, or None
+        self.drop_at = None
+        # Bytes the next ranged media response starts before the requested offset
+        self.range_shift = 0
+        self.settings = {2: 9, 3: 5, 162: 1}
+        self.recording = False
+        self.battery = 100
+        self.sd_remaining_kb = 64_000_000
+        self.webcam_status = 1
+        # Parameters of the last /gopro/webcam/start request
+        self.webcam_params = None
+        # (path, monotonic arrival time) of every request received
+        self.requests = []
+        self.routes = {
+            '/gopro/webcam/status': self.handle_webcam_status,
+            '/gopro/camera/state': self.handle_state,
+            '/gopro/camera/setting': self.handle_setting,
+            '/gopro/camera/control/wired_usb': self.handle_ok,
+            '/gopro/camera/shutter/start': self.handle_shutter_start,
+            '/gopro/camera/shutter/stop': self.handle_shutter_stop,
+            '/gopro/webcam/start': self.handle_webcam_start,
+            '/gopro/webcam/stop': self.handle_webcam_stop,
+            '/gopro/media/list': self.handle_media_list,
+        }
+
+        self.server = ThreadingHTTPServer((host, port), FakeGoProHandler)
+        self.server.daemon_threads = True
+        self.server.camera = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def ip(self):
+        host, port = self.server.server_address[:2]
+        return f'{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle_ok(self, params):
+        return 200, {}
+
+    def handle_webcam_status(self, params):
+        return 200, {'status': self.webcam_status, 'error': 0}
+
+    def handle_state(self, params):
+        return 200, {
+            'settings': {str(key): value for key, value in self.settings.items()},
+            'status': {'8': int(self.recording), '10': int(self.recording), '70': self.battery,
+                       '2': min(self.battery // 25, 3), '6': 0, '54': self.sd_remaining_kb},
+        }
+
+    def handle_setting(self, params):
+        self.settings[int(params['setting'])] = int(params['option'])
+        return 200, {}
+
+    def handle_shutter_start(self, params):
+        self.recording = True
+        return 200, {}
+
+    def handle_shutter_stop(self, params):
+        self.recording = False
+        return 200, {}
+
+    def handle_webcam_start(self, params):
+        self.webcam_params = params
+        self.webcam_status = 2
+        return 200, {'status': self.webcam_status, 'error': 0}
+
+    def handle_webcam_stop(self, params):
+        self.webcam_params = None
+        self.webcam_status = 1
+        return 200, {'status': self.webcam_status, 'error': 0}
+
+    def handle_media_list(self, params):
+        folders = {}
+        for media_path, data in self.media.items():
+            folder, name = media_path.split('/')
+            folders.setdefault(folder, []).append({'n': name, 'cre': '0', 'mod': '0', 's': str(len(data))})
+        return 200, {'id': '1', 'media': [{'d': folder, 'fs': files} for folder, files in folders.items()]}
+
+    def add_media(self, name, size, folder='100GOPRO'):
+        self.media[f'{folder}/{name}'] = os.urandom(size)
+
+    def throttle(self, size):
+        if not self.bandwidth:
+            return
+        with self.link_lock:
+            now = time.monotonic()
+            self.link_free_at = max(self.link_free_at, now) + size / self.bandwidth
+            wait = self.link_free_at - now
+        time.sleep(wait)
+
+    def count_requests(self, path):
+        return sum(1 for request_path, _ in self.requests if request_path == path)
+
+def start_fake_gopros(count, **kwargs):
+    return [FakeGoPro(**kwargs).start() for _ in range(count)]
+
+def stop_fake_gopros(cameras):
+    for camera in cameras:
+        camera.stop()
+
+if __name__ == "__main__":
+    cameras = start_fake_gopros(2)
+    print("Fake GoPros running on:", [camera.ip for camera in cameras])
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_fake_gopros(cameras)
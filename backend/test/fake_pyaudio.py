@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+
+# Minimal stand-in for the pyaudio module, used by the audio check scripts to
+# feed synthetic input without a sound card. Install it before importing
+# audio_utils with: sys.modules['pyaudio'] = fake_pyaudio
+
+paInt16 = 8
+paInt24 = 4
+paContinue = 0
+paComplete = 1
+paInputOverflow = 2
+
+SAMPLE_SIZES = {paInt16: 2, paInt24: 3}
+
+class FakeStream:
+    """
+    Input stream that returns noise as fast as it is read, or paced like a real device.
+
+    Args:
+        format (int): Sample format constant.
+        channels (int): Number of channels.
+        rate (int): Sample rate in Hz.
+        frames_per_buffer (int): Frames per read or callback.
+        speed (float): Pace input at this multiple of real time, or None to return immediately.
+        stream_callback (callable): PyAudio-style callback, run on its own thread.
+    """
+
+    def __init__(self, format, channels, rate, frames_per_buffer=1024, speed=None,
+                 stream_callback=None, **kwargs):
+        self.frame_bytes = SAMPLE_SIZES[format] * channels
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.speed = speed
+        self.frames_read = 0
+        self.active = True
+        self.noise = os.urandom(frames_per_buffer * self.frame_bytes)
+        self.started = time.monotonic()
+        self.callback = stream_callback
+        if stream_callback:
+            self.thread = threading.Thread(target=self.run_callback, daemon=True)
+            self.thread.start()
+
+    def next_buffer(self, frames):
+        if self.speed:
+            due = self.started + (self.frames_read + frames) / self.rate / self.speed
+            time.sleep(max(0, due - time.monotonic()))
+        self.frames_read += frames
+        if frames == self.frames_per_buffer:
+            return self.noise
+        return os.urandom(frames * self.frame_bytes)
+
+    def read(self, frames, exception_on_overflow=True):
+        return self.next_buffer(frames)
+
+    def run_callback(self):
+        while self.active:
+            data = self.next_buffer(self.frames_per_buffer)
+            time_info = {'input_buffer_adc_time': self.frames_read / self.rate,
+                         'current_time': time.monotonic()}
+            _, flag = self.callback(data, self.frames_per_buffer, time_info, 0)
+            if flag != paContinue:
+                break
+
+    def is_active(self):
+        return self.active
+
+    def stop_stream(self):
+        self.active = False
+        if self.callback:
+            self.thread.join()
+
+    def close(self):
+        self.active = False
+
+class PyAudio:
+    """
+    Fake PyAudio instance exposing a configurable number of input devices.
+    """
+
+    device_count = 2
+    speed = None
+
+    def get_device_count(self):
+        return self.device_count
+
+    def get_device_info_by_index(self, index):
+        return {'name': f'Fake input {index}', 'index': index, 'maxInputChannels': 1,
+                'defaultSampleRate': 44100.0}
+
+    def get_sample_size(self, format):
+        return SAMPLE_SIZES[format]
+
+    def open(self, format, channels, rate, input=True, input_device_index=None,
+             frames_per_buffer=1024, stream_callback=None, **kwargs):
+        if input_device_index is not None and not 0 <= input_device_index < self.device_count:
+            # What PortAudio reports for a device that doesn't exist
+            raise OSError(-9996, 'Invalid input device (no default output device)')
+        return FakeStream(format, channels, rate, frames_per_buffer=frames_per_buffer,
+                          speed=self.speed, stream_callback=stream_callback)
+
+    def terminate(self):
+        pass
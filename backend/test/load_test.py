@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+import socketio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_gopro import start_fake_gopros, stop_fake_gopros
+from stream_supervisor import read_process_usage
+
+# Directory the JSON results are written to by default
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_results')
+# Seconds between server CPU/RSS samples
+SAMPLE_INTERVAL = 0.5
+# Seconds to wait for the server to accept connections
+STARTUP_TIMEOUT = 30
+# Seconds a client waits for a handler to acknowledge an event
+CALL_TIMEOUT = 30
+
+# Runs the real app.py without the debug reloader, so the measured pid is the server itself
+SERVER_LAUNCHER = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+sys.path.insert(0, sys.argv[1] + '/test')
+if sys.argv[3] == 'fake':
+    import fake_pyaudio
+    sys.modules['pyaudio'] = fake_pyaudio
+import app
+app.socketio.run(app.app, host='127.0.0.1', port=int(sys.argv[2]), log_output=False)
+'''
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(work_dir, config_path, port, fake_audio):
+    """
+    Launch app.py in its own process against the fake cameras' config.
+
+    Returns:
+        subprocess.Popen: The server process, accepting connections.
+    """
+    env = dict(os.environ, GOPRO_CONFIG_FILE=config_path, SESSIONS_DIR=os.path.join(work_dir, 'sessions'),
+               HLS_DIR=os.path.join(work_dir, 'hls'), MEDIA_DIR=os.path.join(work_dir, 'media'))
+    log = open(os.path.join(work_dir, 'server.log'), 'w')
+    process = subprocess.Popen([sys.executable, '-c', SERVER_LAUNCHER, BACKEND_DIR, str(port),
+                                'fake' if fake_audio else 'real'],
+                               cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}, see {log.name}")
+        try:
+            requests.get(f'http://127.0.0.1:{port}/metrics', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Server did not start within {STARTUP_TIMEOUT}s")
+
+class ServerSampler:
+    """
+    Samples the server process's CPU and resident memory while the load runs.
+    """
+
+    def __init__(self, pid, interval=SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent = []
+        self.rss_bytes = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        last = read_process_usage(self.pid)
+        last_time = time.monotonic()
+        while self.running and last:
+            time.sleep(self.interval)
+            usage = read_process_usage(self.pid)
+            if usage is None:
+                return
+            now = time.monotonic()
+            self.cpu_percent.append((usage[0] - last[0]) / (now - last_time) * 100)
+            self.rss_bytes.append(usage[1])
+            last, last_time = usage, now
+
+    def summary(self):
+        if not self.cpu_percent:
+            return None
+        return {'cpu_percent_mean': round(float(np.mean(self.cpu_percent)), 1),
+                'cpu_percent_max': round(float(np.max(self.cpu_percent)), 1),
+                'rss_mb_max': round(max(self.rss_bytes) / 2**20, 1)}
+
+def run_client(url, ips, duration, record_every, latencies, errors, lock):
+    """
+    Issue events from one Socket.IO client until duration runs out, timing each until its handler acknowledges it.
+
+    Every iteration asks for the status; every record_every-th iteration also
+    starts and stops recording on all cameras.
+    """
+    client = socketio.Client(reconnection=False)
+    try:
+        client.connect(url, wait_timeout=CALL_TIMEOUT)
+    except Exception as e:
+        with lock:
+            errors['connect'] = errors.get('connect', 0) + 1
+        print(f"Client failed to connect: {e}", flush=True)
+        return
+
+    deadline = time.monotonic() + duration
+    iteration = 0
+    while time.monotonic() < deadline:
+        iteration += 1
+        calls = [('get_gopro_status', None)]
+        if record_every and iteration % record_every == 0:
+            calls += [('start_gopros', ips), ('stop_gopros', ips)]
+        for event, data in calls:
+            started = time.perf_counter()
+            try:
+                client.call(event, data, timeout=CALL_TIMEOUT)
+            except Exception:
+                with lock:
+                    errors[event] = errors.get(event, 0) + 1
+                continue
+            with lock:
+                latencies.setdefault(event, []).append(time.perf_counter() - started)
+    client.disconnect()
+
+def summarize(latencies, errors, duration):
+    events = {}
+    for event in sorted(set(latencies) | set(errors)):
+        values = np.array(latencies.get(event, [])) * 1000
+        events[event] = {
+            'count': len(values),
+            'errors': errors.get(event, 0),
+            'throughput_per_s': round(len(values) / duration, 1),
+            **({f'p{q}_ms': round(float(np.percentile(values, q)), 2) for q in (50, 95, 99)} if len(values) else {}),
+        }
+    return events
+
+def compare(result, baseline_path):
+    """
+    Print the change in throughput and p95 latency of each event against an earlier result.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"Compared with {baseline_path} ({baseline.get('commit', 'unknown')[:10]}):")
+    for event, current in result['events'].items():
+        previous = baseline['events'].get(event)
+        if not previous or 'p95_ms' not in previous or 'p95_ms' not in current:
+            continue
+        print(f"  {event:<18} throughput {previous['throughput_per_s']:>8} -> {current['throughput_per_s']:>8}/s, "
+              f"p95 {previous['p95_ms']:>8} -> {current['p95_ms']:>8} ms "
+              f"({(current['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%)")
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive app.py with many Socket.IO clients against a fleet of fake GoPros.")
+    parser.add_argument('--cameras', type=int, default=8, help="Number of fake GoPros")
+    parser.add_argument('--clients', type=int, default=10, help="Number of concurrent Socket.IO clients")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds each client issues events")
+    parser.add_argument('--latency', type=float, default=0.01, help="Fake camera response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Random extra camera latency, up to this many seconds")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of camera requests that fail")
+    parser.add_argument('--record-every', type=int, default=10,
+                        help="Start and stop recording every Nth status request per client, 0 to never record")
+    parser.add_argument('--fake-audio', action='store_true',
+                        help="Use fake audio devices; the default when PyAudio isn't installed")
+    parser.add_argument('--output', help="Result file, defaults to load_results/<timestamp>.json")
+    parser.add_argument('--baseline', help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    fake_audio = args.fake_audio or importlib.util.find_spec('pyaudio') is None
+    work_dir = tempfile.mkdtemp()
+    cameras = start_fake_gopros(args.cameras, latency=args.latency, jitter=args.jitter,
+                                failure_rate=args.failure_rate)
+    ips = [camera.ip for camera in cameras]
+    config_path = os.path.join(work_dir, 'gopro_config.json')
+    with open(config_path, 'w') as f:
+        json.dump({"gopros": ips, "gopro_settings": [{"display_name": "FPS", "setting": "3", "option": "5"}]}, f)
+
+    port = free_port()
+    server = start_server(work_dir, config_path, port, fake_audio)
+    sampler = ServerSampler(server.pid)
+    try:
+        print(f"Server pid {server.pid} on port {port}: {args.cameras} cameras, {args.clients} clients, "
+              f"{args.duration}s", flush=True)
+        latencies, errors, lock = {}, {}, threading.Lock()
+        clients = [threading.Thread(target=run_client, args=(f'http://127.0.0.1:{port}', ips, args.duration,
+                                                             args.record_every, latencies, errors, lock))
+                   for _ in range(args.clients)]
+        sampler.thread.start()
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+        sampler.running = False
+    finally:
+        # Cameras first, so the server's pooled connections aren't reset under the fakes' handlers
+        stop_fake_gopros(cameras)
+        server.terminate()
+        server.wait()
+
+    result = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'parameters': {**vars(args), 'fake_audio': fake_audio},
+        'elapsed_seconds': round(elapsed, 2),
+        'events': summarize(latencies, errors, elapsed),
+        'server': sampler.summary(),
+        'camera_requests': sum(camera.count_requests(path) for camera in cameras
+                               for path in ('/gopro/webcam/status', '/gopro/camera/state',
+                                            '/gopro/camera/shutter/start', '/gopro/camera/shutter/stop')),
+    }
+    shutil.rmtree(work_dir)
+
+    for event, stats in result['events'].items():
+        print(f"  {event:<18} {stats['count']:>6} calls, {stats['errors']} errors, "
+              f"{stats['throughput_per_s']:>7}/s, p50 {stats.get('p50_ms')} ms, p95 {stats.get('p95_ms')} ms, "
+              f"p99 {stats.get('p99_ms')} ms")
+    print(f"  server: {result['server']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{result['timestamp'].replace(':', '-')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+    if args.baseline:
+        compare(result, args.baseline)
+
+if __name__ == "__main__":
+    main()
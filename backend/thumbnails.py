@@ -0,0 +1,148 @@
+import os
+import ffmpeg
+from os_threads import os_queue, os_subprocess, os_threading, os_time
+
+# Seconds between thumbnails of the same camera
+THUMBNAIL_INTERVAL = 1
+# Width thumbnails are downscaled to, keeping the aspect ratio
+THUMBNAIL_WIDTH = 320
+# ffmpeg MJPEG quality, from 2 (best) to 31 (smallest)
+THUMBNAIL_QUALITY = 5
+# Number of ffmpeg decode processes run at once
+THUMBNAIL_WORKERS = 4
+
+def newest_segment(playlist_path):
+    """
+    Return the path of the last complete segment listed in an HLS playlist.
+
+    Args:
+        playlist_path (str): Path of the playlist.
+
+    Returns:
+        str: Path of the segment, or None if the playlist is missing or empty.
+    """
+    try:
+        with open(playlist_path) as f:
+            segments = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except OSError:
+        return None
+    if not segments:
+        return None
+    return os.path.join(os.path.dirname(playlist_path), segments[-1])
+
+def extract_thumbnail(segment_path, width=THUMBNAIL_WIDTH):
+    """
+    Decode the first keyframe of a video segment and return it as a downscaled JPEG.
+
+    Only keyframes are decoded, and every HLS segment starts with one, so
+    each thumbnail costs a single frame decode.
+
+    Args:
+        segment_path (str): Path of the video segment.
+        width (int): Width of the thumbnail in pixels.
+
+    Returns:
+        bytes: The JPEG image.
+    """
+    args = ffmpeg.input(segment_path, skip_frame='nokey').output(
+        'pipe:', vframes=1, vf=f'scale={width}:-2', format='image2pipe', vcodec='mjpeg',
+        **{'q:v': THUMBNAIL_QUALITY},
+    ).global_args('-loglevel', 'error', '-nostdin').compile()
+    return os_subprocess.run(args, check=True, capture_output=True).stdout
+
+class ThumbnailService:
+    """
+    Keeps an in-memory JPEG of the newest frame of each previewed camera.
+
+    Only cameras with at least one viewer are decoded, at most once every
+    interval seconds and only when a new HLS segment has been written. The
+    decodes run in a pool of ffmpeg processes fed by OS worker threads.
+
+    Args:
+        preview_manager (PreviewManager): Source of the cameras' HLS playlists.
+        interval (float): Seconds between thumbnails of the same camera.
+        workers (int): Number of ffmpeg decode processes run at once.
+    """
+
+    def __init__(self, preview_manager, interval=THUMBNAIL_INTERVAL, workers=THUMBNAIL_WORKERS):
+        self.preview_manager = preview_manager
+        self.interval = interval
+        self.workers = workers
+        # Viewer session ids per camera
+        self.viewers = {}
+        # Latest thumbnail per camera as {'jpeg', 'captured_at', 'segment'}
+        self.thumbnails = {}
+        self.last_scheduled = {}
+        self.pending = set()
+        # Cameras with a thumbnail not yet pushed to viewers
+        self.fresh = set()
+        self.lock = os_threading.Lock()
+        self.jobs = os_queue.Queue()
+        self.threads = []
+        self.running = False
+
+    def watch(self, sid, ips):
+        for ip in ips:
+            self.viewers.setdefault(ip, set()).add(sid)
+
+    def unwatch(self, sid, ips=None):
+        for ip in list(self.viewers) if ips is None else ips:
+            self.viewers.get(ip, set()).discard(sid)
+            if not self.viewers.get(ip):
+                self.viewers.pop(ip, None)
+
+    def watched(self):
+        return list(self.viewers)
+
+    def get(self, ip):
+        return self.thumbnails.get(ip)
+
+    def schedule(self):
+        """
+        Queue a decode for each watched, previewing camera that is due and has a new segment.
+        """
+        if not self.threads:
+            self.threads = [os_threading.Thread(target=self.work, daemon=True) for _ in range(self.workers)]
+            for thread in self.threads:
+                thread.start()
+
+        now = os_time.monotonic()
+        active = set(self.preview_manager.active())
+        for ip in self.watched():
+            if ip not in active or ip in self.pending or now - self.last_scheduled.get(ip, 0) < self.interval:
+                continue
+            segment = newest_segment(self.preview_manager.playlist_path(ip))
+            if segment is None or segment == self.thumbnails.get(ip, {}).get('segment'):
+                continue
+            self.last_scheduled[ip] = now
+            with self.lock:
+                self.pending.add(ip)
+            self.jobs.put((ip, segment))
+
+    def work(self):
+        while True:
+            ip, segment = self.jobs.get()
+            try:
+                jpeg = extract_thumbnail(segment)
+                if jpeg:
+                    with self.lock:
+                        self.thumbnails[ip] = {'jpeg': jpeg, 'captured_at': os_time.time(), 'segment': segment}
+                        self.fresh.add(ip)
+            except Exception as e:
+                # The segment may have been deleted by the remuxer before it was read
+                print(f"Error extracting thumbnail for {ip}: {e}", flush=True)
+            finally:
+                with self.lock:
+                    self.pending.discard(ip)
+
+    def take_fresh(self):
+        """
+        Return the thumbnails produced since the last call.
+
+        Returns:
+            list: {'ip', 'jpeg', 'captured_at'} per camera with a new thumbnail.
+        """
+        with self.lock:
+            fresh, self.fresh = self.fresh, set()
+            return [{'ip': ip, 'jpeg': self.thumbnails[ip]['jpeg'], 'captured_at': self.thumbnails[ip]['captured_at']}
+                    for ip in fresh]
@@ -20,6 +20,9 @@ function App() {
   const [timer, setTimer] = useState('00:00:00'); // Timer for audio recording
   const [audioFilePath, setAudioFilePath] = useState(''); // File path of the saved audio file
   const [finalTimer, setFinalTimer] = useState(''); // Final timer value when recording stops
+  const [audioLevels, setAudioLevels] = useState([]); // Live levels per recording device
+  const [isOffloading, setIsOffloading] = useState(false); // Media offload state
+  const [offloadProgress, setOffloadProgress] = useState({}); // Offload progress by IP
 
   useEffect(() => {
     // Fetch the webcam stream when the component is mounted
@@ -29,13 +32,18 @@ function App() {
   }, []);
 
   useEffect(() => {
-    // Fetch GoPro statuses periodically when not recording
-    if (!isRecording) {
-      const fetchStatus = () => socket.emit('get_gopro_status');
-      const intervalId = setInterval(fetchStatus, 2000);
-      return () => clearInterval(intervalId);
-    }
-  }, [isRecording]);
+    // Subscribe to server-pushed GoPro status updates, re-subscribing after reconnects
+    const subscribe = () => socket.emit('subscribe_gopro_status');
+    socket.on('connect', subscribe);
+    if (socket.connected) subscribe();
+    // The camera list or settings changed on the server, so fetch a fresh baseline
+    socket.on('config_updated', () => socket.emit('get_gopro_status'));
+    return () => {
+      socket.off('connect', subscribe);
+      socket.off('config_updated');
+      socket.emit('unsubscribe_gopro_status');
+    };
+  }, []);
 
   useEffect(() => {
     // Listen for GoPro status updates from the server
@@ -49,9 +57,33 @@ function App() {
     return () => socket.off('gopro_status');
   }, []);
 
+  useEffect(() => {
+    // Apply only the fields that changed for each GoPro
+    socket.on('gopro_status_delta', (deltas) => {
+      setGoproStatuses((prevStatuses) => prevStatuses.map((status) => {
+        const delta = deltas.find((d) => d.ip === status.ip);
+        if (!delta) return status;
+        if (delta.status !== undefined && delta.status !== 200) return { ...status, state: 'Disconnected' };
+        if (delta.recording !== undefined) return { ...status, state: delta.recording ? 'Recording' : 'Connected' };
+        if (delta.status === 200 && status.state === 'Disconnected') return { ...status, state: 'Connected' };
+        return status;
+      }));
+      const settingsDeltas = deltas.filter((d) => d.settings);
+      if (settingsDeltas.length) {
+        setGoproSettings((prevSettings) => {
+          const updated = { ...prevSettings };
+          settingsDeltas.forEach((d) => { updated[d.ip] = d.settings; });
+          return updated;
+        });
+      }
+    });
+    return () => socket.off('gopro_status_delta');
+  }, []);
+
   useEffect(() => {
     // Listen for GoPro recording response updates from the server
-    socket.on('gopro_record_response', (responses) => {
+    socket.on('gopro_record_response', (data) => {
+      const { responses } = data;
       const updatedStatuses = goproStatuses.map((status) => {
         const response = responses.find((resp) => resp.ip === status.ip);
         if (response) {
@@ -85,10 +117,36 @@ function App() {
     return () => socket.off('audio_devices');
   }, []);
 
+  useEffect(() => {
+    // Listen for live audio levels while recording
+    socket.on('audio_levels', (data) => setAudioLevels(data.devices));
+    return () => socket.off('audio_levels');
+  }, []);
+
   useEffect(() => {
     // Listen for audio file save events from the server
     socket.on('audio_saved', (data) => setAudioFilePath(data.filepath));
-    return () => socket.off('audio_saved');
+    // FLAC recordings are reported again once encoding has finished
+    socket.on('audio_encoded', (data) => data.filepath && setAudioFilePath(data.filepath));
+    return () => {
+      socket.off('audio_saved');
+      socket.off('audio_encoded');
+    };
+  }, []);
+
+  useEffect(() => {
+    // Listen for media offload progress from the server
+    socket.on('offload_progress', (data) => setOffloadProgress(data.cameras));
+    socket.on('offload_complete', (data) => {
+      setOffloadProgress(data.cameras);
+      setIsOffloading(false);
+    });
+    socket.on('offload_error', () => setIsOffloading(false));
+    return () => {
+      socket.off('offload_progress');
+      socket.off('offload_complete');
+      socket.off('offload_error');
+    };
   }, []);
 
   // Helper Functions
@@ -113,6 +171,7 @@ function App() {
   const stopRecordingAudio = () => {
     socket.emit('stop_audio');
     setIsRecordingAudio(false);
+    setAudioLevels([]);
     setFinalTimer(timer);
     setTimer('00:00:00');
   };
@@ -127,6 +186,11 @@ function App() {
     socket.emit('stop_gopros', selectedGopros);
   };
 
+  const offloadMedia = () => {
+    setIsOffloading(true);
+    socket.emit('offload_media', selectedGopros);
+  };
+
   const handleGoproSelection = (ip) => {
     setSelectedGopros((prevSelected) =>
       prevSelected.includes(ip)
@@ -166,6 +230,7 @@ function App() {
             timer={timer}
             finalTimer={finalTimer}
             audioFilePath={audioFilePath}
+            audioLevels={audioLevels}
             fetchSoundDevices={fetchSoundDevices}
             handleDeviceChange={handleDeviceChange}
             startRecordingAudio={startRecordingAudio}
@@ -178,6 +243,8 @@ function App() {
         startGopros={startGopros}
         stopGopros={stopGopros}
         updateAllGoproSettings={updateAllGoproSettings}
+        isOffloading={isOffloading}
+        offloadMedia={offloadMedia}
       />
       <div className="status-grid">
         {goproStatuses.map((status, index) => (
@@ -192,6 +259,16 @@ function App() {
             <span style={{ color: status.state === 'Recording' ? 'red' : 'black' }}>
               {status.state}
             </span>
+            {offloadProgress[status.ip] && (
+              <div>
+                Offload: {offloadProgress[status.ip].files_done}/{offloadProgress[status.ip].files_total} files,{' '}
+                {(offloadProgress[status.ip].bytes_done / 1048576).toFixed(0)}/
+                {(offloadProgress[status.ip].bytes_total / 1048576).toFixed(0)} MB
+                {offloadProgress[status.ip].errors.length > 0 && (
+                  <span style={{ color: 'red' }}> ({offloadProgress[status.ip].errors.length} errors)</span>
+                )}
+              </div>
+            )}
             {goproSettings[status.ip] && (
               <div>
                 <h3>Settings:</h3>
@@ -7,6 +7,7 @@ const AudioControls = ({
   timer,
   finalTimer,
   audioFilePath,
+  audioLevels,
   fetchSoundDevices,
   handleDeviceChange,
   startRecordingAudio,
@@ -35,6 +36,12 @@ const AudioControls = ({
               Recording: {timer}
             </button>
             <button onClick={stopRecordingAudio}>Stop Recording</button>
+            {audioLevels.map((level) => (
+              <p key={level.device_index} style={{ color: level.clipped ? 'red' : 'black' }}>
+                RMS {level.rms_db ?? '-inf'} dBFS, peak {level.peak_db ?? '-inf'} dBFS
+                {level.clipped > 0 && ` (${level.clipped} clipped)`}
+              </p>
+            ))}
           </div>
         )}
         {finalTimer && (
@@ -4,7 +4,9 @@ const GoproControls = ({
   isRecording,
   startGopros,
   stopGopros,
-  updateAllGoproSettings
+  updateAllGoproSettings,
+  isOffloading,
+  offloadMedia
 }) => (
   <div>
     {!isRecording ? (
@@ -18,6 +20,9 @@ const GoproControls = ({
     <button onClick={updateAllGoproSettings} disabled={isRecording}>
       Update All Settings
     </button>
+    <button onClick={offloadMedia} disabled={isRecording || isOffloading}>
+      {isOffloading ? 'Offloading...' : 'Offload Media'}
+    </button>
   </div>
 );
 